@@ -0,0 +1,102 @@
+"""
+Monthly DietLogs archives written by the compaction job (compaction.py).
+
+Once a month is older than the retention window, its DietLogs rows for a
+user are rolled into one DietLogArchives item keyed (userId, month). The
+rows are packed column by column (one list per attribute, in logTimestamp
+order), which keeps repeated values like foodId and mealType next to each
+other, then gzip-compressed into a single binary attribute. A month of
+history is then one item read instead of hundreds.
+"""
+
+import gzip
+import json
+import os
+from datetime import date as date_cls, timedelta
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Key
+
+from dynamodb_client import diet_log_archives_table
+from utils import get_today_iso_date
+
+# DietLogs rows are archived once their whole month is older than this
+DIET_LOG_RETENTION_DAYS = int(os.environ.get("DIET_LOG_RETENTION_DAYS", "90"))
+ARCHIVE_FORMAT = 1
+
+
+def archive_cutoff_month() -> str:
+    """First month ("YYYY-MM") that is still kept live; earlier months are archived."""
+    oldest_live_day = date_cls.fromisoformat(get_today_iso_date()) - timedelta(days=DIET_LOG_RETENTION_DAYS)
+    return oldest_live_day.isoformat()[:7]
+
+
+def pack_logs(rows) -> bytes:
+    """Columnar-pack and gzip DietLogs rows of one user (userId is the archive's key, so it is dropped)."""
+    rows = sorted(rows, key=lambda r: r["logTimestamp"])
+    names = sorted({name for row in rows for name in row} - {"userId"})
+    columns = {name: [row.get(name) for row in rows] for name in names}
+    # A missing attribute and a stored null both pack as null; remember the nulls
+    nulls = {
+        name: [idx for idx, row in enumerate(rows) if name in row and row[name] is None]
+        for name in names
+    }
+    nulls = {name: idxs for name, idxs in nulls.items() if idxs}
+    # Numbers come back from DynamoDB as Decimal; keep them exact as strings
+    decimal_columns = [
+        name for name, values in columns.items()
+        if any(v is not None for v in values) and all(v is None or isinstance(v, Decimal) for v in values)
+    ]
+    for name in decimal_columns:
+        columns[name] = [None if v is None else str(v) for v in columns[name]]
+    payload = {
+        "format": ARCHIVE_FORMAT,
+        "count": len(rows),
+        "columns": columns,
+        "decimal": decimal_columns,
+        "nulls": nulls,
+    }
+    return gzip.compress(json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8"))
+
+
+def unpack_logs(user_id: str, data) -> list:
+    """DietLogs rows from a pack_logs blob, in logTimestamp order."""
+    payload = json.loads(gzip.decompress(bytes(data)))
+    columns = payload["columns"]
+    for name in payload["decimal"]:
+        columns[name] = [None if v is None else Decimal(v) for v in columns[name]]
+    rows = []
+    for idx in range(payload["count"]):
+        row = {"userId": user_id}
+        for name, values in columns.items():
+            if values[idx] is not None:
+                row[name] = values[idx]
+        rows.append(row)
+    for name, idxs in payload["nulls"].items():
+        for idx in idxs:
+            rows[idx][name] = None
+    return rows
+
+
+def get_archive(user_id: str, month: str, consistent_read: bool = False):
+    resp = diet_log_archives_table.get_item(
+        Key={"userId": user_id, "month": month},
+        ConsistentRead=consistent_read,
+    )
+    return resp.get("Item")
+
+
+def load_archived_logs(user_id: str, first_month: str, last_month: str) -> list:
+    """Archived DietLogs rows of the user for months first_month..last_month (inclusive)."""
+    query_kwargs = {
+        "KeyConditionExpression": Key("userId").eq(user_id) & Key("month").between(first_month, last_month),
+    }
+    rows = []
+    while True:
+        resp = diet_log_archives_table.query(**query_kwargs)
+        for archive in resp.get("Items", []):
+            rows.extend(unpack_logs(user_id, archive["data"]))
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            return rows
+        query_kwargs["ExclusiveStartKey"] = last_key
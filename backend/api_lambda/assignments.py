@@ -0,0 +1,170 @@
+"""
+Shared user -> trainer assignment resolver with a per-container cache.
+
+Assignments change rarely but are looked up on every food log and for every
+summary in the nightly job. Lookups are cached (bounded LRU with TTL,
+including "no trainer" results). Writers update the local cache and bump a
+version stamp in the AppState table; other containers compare that stamp
+periodically and drop their cache when it moves.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from boto3.dynamodb.conditions import Attr, Key
+
+import metrics
+from dynamodb_client import app_state_table, trainer_assignments_table
+
+logger = logging.getLogger(__name__)
+
+ASSIGNMENT_CACHE_MAX_ENTRIES = int(os.environ.get("ASSIGNMENT_CACHE_MAX_ENTRIES", "5000"))
+ASSIGNMENT_CACHE_TTL_SECONDS = int(os.environ.get("ASSIGNMENT_CACHE_TTL_SECONDS", "300"))
+ASSIGNMENT_CACHE_NEGATIVE_TTL_SECONDS = int(os.environ.get("ASSIGNMENT_CACHE_NEGATIVE_TTL_SECONDS", "60"))
+ASSIGNMENT_VERSION_CHECK_SECONDS = int(os.environ.get("ASSIGNMENT_VERSION_CHECK_SECONDS", "10"))
+
+ASSIGNMENTS_VERSION_KEY = "trainer-assignments-version"
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # userId -> (trainerId or None, expires_at)
+_known_version = None
+_version_checked_at = 0.0
+
+
+def _read_version():
+    resp = app_state_table.get_item(
+        Key={"stateKey": ASSIGNMENTS_VERSION_KEY},
+        ProjectionExpression="#v",
+        ExpressionAttributeNames={"#v": "version"},
+    )
+    return int(resp.get("Item", {}).get("version", 0))
+
+
+def _bump_version():
+    """Increment the shared version stamp; return the new value."""
+    resp = app_state_table.update_item(
+        Key={"stateKey": ASSIGNMENTS_VERSION_KEY},
+        UpdateExpression="ADD #v :one",
+        ExpressionAttributeNames={"#v": "version"},
+        ExpressionAttributeValues={":one": 1},
+        ReturnValues="UPDATED_NEW",
+    )
+    return int(resp["Attributes"]["version"])
+
+
+def _check_version():
+    """Drop the cache if another container changed assignments since we last looked."""
+    global _known_version, _version_checked_at
+
+    now = time.monotonic()
+    with _lock:
+        if now - _version_checked_at < ASSIGNMENT_VERSION_CHECK_SECONDS:
+            return
+        _version_checked_at = now
+
+    version = _read_version()
+    with _lock:
+        if _known_version is not None and version != _known_version:
+            logger.info("Assignment version moved %s -> %s; dropping %s cached entries",
+                        _known_version, version, len(_cache))
+            _cache.clear()
+            metrics.increment("assignment_cache.stale_flush")
+        _known_version = version
+
+
+def _store(user_id: str, trainer_id):
+    ttl = ASSIGNMENT_CACHE_TTL_SECONDS if trainer_id else ASSIGNMENT_CACHE_NEGATIVE_TTL_SECONDS
+    _cache[user_id] = (trainer_id, time.monotonic() + ttl)
+    _cache.move_to_end(user_id)
+    while len(_cache) > ASSIGNMENT_CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+
+
+def _load_active_trainer(user_id: str):
+    """Query this user's assignment rows and return the active trainerId, if any."""
+    resp = trainer_assignments_table.query(
+        KeyConditionExpression=Key("userId").eq(user_id),
+        FilterExpression=Attr("status").eq("active"),
+        ProjectionExpression="trainerId",
+    )
+    items = resp.get("Items", [])
+    return items[0].get("trainerId") if items else None
+
+
+def resolve_trainer_for_user(user_id: str):
+    """Return the active trainerId for a user, or None if the user has no trainer."""
+    _check_version()
+
+    with _lock:
+        cached = _cache.get(user_id)
+        if cached is not None and cached[1] > time.monotonic():
+            _cache.move_to_end(user_id)
+            metrics.increment("assignment_cache.hit" if cached[0] else "assignment_cache.negative_hit")
+            return cached[0]
+
+    metrics.increment("assignment_cache.miss")
+    trainer_id = _load_active_trainer(user_id)
+    with _lock:
+        _store(user_id, trainer_id)
+    return trainer_id
+
+
+def _record_changes(changes):
+    """One version bump for a set of (userId, trainerId or None) changes."""
+    global _known_version
+
+    version = _bump_version()
+    with _lock:
+        # If anyone else bumped in between, our cache may be stale too
+        if _known_version is not None and version != _known_version + 1:
+            _cache.clear()
+            metrics.increment("assignment_cache.stale_flush")
+        _known_version = version
+        for user_id, trainer_id in changes:
+            _store(user_id, trainer_id)
+    metrics.increment("assignment_cache.invalidation")
+
+
+def _record_change(user_id: str, trainer_id):
+    _record_changes([(user_id, trainer_id)])
+
+
+def record_assignment(user_id: str, trainer_id: str):
+    """Called after a user is assigned so the cache and version stamp follow."""
+    _record_change(user_id, trainer_id)
+
+
+def record_assignments(pairs):
+    """Called after a bulk assignment of (userId, trainerId) pairs."""
+    if pairs:
+        _record_changes(pairs)
+
+
+def record_unassignment(user_id: str):
+    """Called after a user's trainer is removed."""
+    _record_change(user_id, None)
+
+
+def _hit_rate(counters):
+    hits = counters.get("assignment_cache.hit", 0) + counters.get("assignment_cache.negative_hit", 0)
+    total = hits + counters.get("assignment_cache.miss", 0)
+    return hits / total if total else 0.0
+
+
+def get_assignment_cache_stats():
+    """Hit-rate and size figures for the assignment cache in this container."""
+    counters = metrics.snapshot()
+    with _lock:
+        size = len(_cache)
+    return {
+        "entries": size,
+        "version": _known_version,
+        "hits": counters.get("assignment_cache.hit", 0),
+        "negativeHits": counters.get("assignment_cache.negative_hit", 0),
+        "misses": counters.get("assignment_cache.miss", 0),
+        "staleFlushes": counters.get("assignment_cache.stale_flush", 0),
+        "hitRate": _hit_rate(counters),
+    }
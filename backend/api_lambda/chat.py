@@ -1,16 +1,138 @@
 from datetime import datetime, timezone
+import base64
+import json
+import logging
+import os
 
 from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
 
-from dynamodb_client import messages_table
+from dynamodb_client import messages_table, conversation_index_table
 
-from utils import _now_iso
+from utils import _now_iso, projection_kwargs
+
+logger = logging.getLogger(__name__)
+
+# "none": one Messages partition per conversation (default)
+# "monthly": one partition per conversation and month, so partitions stay bounded
+MESSAGE_PARTITIONING = os.environ.get("MESSAGE_PARTITIONING", "none")
+# Most month buckets a single monthly read will query before returning a cursor
+MESSAGE_MAX_BUCKETS_PER_READ = int(os.environ.get("MESSAGE_MAX_BUCKETS_PER_READ", "12"))
+# Monthly reads finish with the pre-bucketing user#trainer partition, which
+# still holds history until scripts/migrate_message_buckets.py has moved it.
+# Safe to turn off once the migration has run after the switch to "monthly".
+MESSAGE_LEGACY_FALLBACK = os.environ.get("MESSAGE_LEGACY_FALLBACK", "true").lower() == "true"
+
+# GSI on ConversationIndex (hash: trainerId, range: lastMessageAt) for the inbox
+CONVERSATION_RECENCY_INDEX = "trainer-recency-index"
+PREVIEW_LENGTH = 120
+INBOX_MAX_LIMIT = 100
+# Per-trainer ConversationIndex row holding unreadByTrainer summed over all
+# conversations. It has no lastMessageAt, so the recency index never returns it.
+UNREAD_TOTALS_ID = "#totals"
+
+# Which side has not seen a message yet, by sender
+_UNREAD_ATTR_FOR_SENDER = {
+    "user": "unreadByTrainer",
+    "system": "unreadByTrainer",
+    "trainer": "unreadByUser",
+}
+_UNREAD_ATTR_FOR_READER = {
+    "trainer": "unreadByTrainer",
+    "user": "unreadByUser",
+}
+
+# Attributes a client may request via `fields=` on GET /messages
+MESSAGE_FIELDS = {
+    "conversationId", "timestamp", "userId", "trainerId", "senderRole", "type", "message", "createdAt",
+}
 
 
 def _conversation_id(user_id: str, trainer_id: str) -> str:
     return f"{user_id}#{trainer_id}"
 
 
+def _bucket_of(timestamp: str) -> str:
+    """Month bucket (YYYY-MM) of an ISO timestamp."""
+    return timestamp[:7]
+
+
+def _previous_bucket(bucket: str) -> str:
+    year, month = int(bucket[:4]), int(bucket[5:7])
+    if month == 1:
+        return f"{year - 1}-12"
+    return f"{year}-{month - 1:02d}"
+
+
+def _partition_key(conv_id: str, timestamp: str) -> str:
+    """Messages partition a new message goes to under the current scheme."""
+    if MESSAGE_PARTITIONING == "monthly":
+        return f"{conv_id}#{_bucket_of(timestamp)}"
+    return conv_id
+
+
+def _encode_cursor(data: dict) -> str:
+    raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    """Decode an opaque GET /messages cursor; None if it is not one of ours."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _update_conversation_index(item: dict):
+    """
+    Record a new message in the ConversationIndex row for its conversation:
+    last message preview and time, plus the recipient's unread counter.
+    The preview only moves forward in time, so a late write for an older
+    message still counts as unread but does not replace a newer preview.
+    """
+    key = {"trainerId": item["trainerId"], "conversationId": _conversation_id(item["userId"], item["trainerId"])}
+    unread_attr = _UNREAD_ATTR_FOR_SENDER[item["senderRole"]]
+    try:
+        conversation_index_table.update_item(
+            Key=key,
+            UpdateExpression=(
+                "SET userId = :u, lastMessageAt = :ts, lastMessagePreview = :p, lastSenderRole = :r, "
+                "firstBucket = if_not_exists(firstBucket, :b) "
+                f"ADD {unread_attr} :one"
+            ),
+            ConditionExpression="attribute_not_exists(lastMessageAt) OR lastMessageAt <= :ts",
+            ExpressionAttributeValues={
+                ":u": item["userId"],
+                ":ts": item["timestamp"],
+                ":p": item["message"][:PREVIEW_LENGTH],
+                ":r": item["senderRole"],
+                ":b": _bucket_of(item["timestamp"]),
+                ":one": 1,
+            },
+        )
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        conversation_index_table.update_item(
+            Key=key,
+            UpdateExpression=f"ADD {unread_attr} :one",
+            ExpressionAttributeValues={":one": 1},
+        )
+    if unread_attr == "unreadByTrainer":
+        _add_trainer_unread(item["trainerId"], 1)
+
+
+def _add_trainer_unread(trainer_id: str, delta: int):
+    """Move the trainer's total unread counter by `delta`."""
+    conversation_index_table.update_item(
+        Key={"trainerId": trainer_id, "conversationId": UNREAD_TOTALS_ID},
+        UpdateExpression="ADD unreadByTrainer :d",
+        ExpressionAttributeValues={":d": delta},
+    )
+
+
 def send_message(body: dict):
     """
     Send a message between user and trainer.
@@ -41,7 +163,7 @@ def send_message(body: dict):
     timestamp = _now_iso()
 
     item = {
-        "conversationId": conv_id,
+        "conversationId": _partition_key(conv_id, timestamp),
         "timestamp": timestamp,
         "userId": user_id,
         "trainerId": trainer_id,
@@ -51,25 +173,134 @@ def send_message(body: dict):
     }
 
     messages_table.put_item(Item=item)
+    _update_conversation_index(item)
 
     return 201, {"message": "Message sent", "item": item}
 
 
-def get_conversation(user_id: str, trainer_id: str, limit: int = 50):
+def get_conversation(user_id: str, trainer_id: str, limit: int = 50, fields=None, cursor=None,
+                     newest_first: bool = False):
     """
-    Get messages for a conversation (ordered by time ascending).
+    Get messages for a conversation. Returns (messages, next_cursor).
+    - "none" partitioning: oldest first and the cursor continues forward,
+      unless `newest_first`: then the newest `limit` messages (returned in
+      time order) and the cursor continues with older ones
+    - "monthly" partitioning: always the newest `limit` messages (returned in
+      time order); the cursor continues with older ones, across month buckets
+    `fields` limits the attributes read and returned.
     """
 
     conv_id = _conversation_id(user_id, trainer_id)
+    if MESSAGE_PARTITIONING == "monthly":
+        return _get_bucketed_conversation(user_id, trainer_id, conv_id, limit, fields, cursor)
 
-    resp = messages_table.query(
-        KeyConditionExpression=Key("conversationId").eq(conv_id),
-        Limit=limit,
-        ScanIndexForward=True,  # oldest first
-    )
+    # A cursor from a newest-first page keeps walking back in time
+    newest_first = newest_first or bool(cursor and cursor.get("d") == "older")
+    query_kwargs = {
+        "KeyConditionExpression": Key("conversationId").eq(conv_id),
+        "Limit": limit,
+        "ScanIndexForward": not newest_first,
+        **projection_kwargs(fields),
+    }
+    if cursor and cursor.get("k"):
+        query_kwargs["ExclusiveStartKey"] = {"conversationId": conv_id, "timestamp": cursor["k"]}
+    resp = messages_table.query(**query_kwargs)
 
     items = resp.get("Items", [])
-    return items
+    last_key = resp.get("LastEvaluatedKey")
+    next_cursor = None
+    if last_key:
+        next_cursor = _encode_cursor({"k": last_key["timestamp"], **({"d": "older"} if newest_first else {})})
+    if newest_first:
+        items.reverse()  # time order for display
+    return items, next_cursor
+
+
+def _first_bucket(user_id: str, trainer_id: str) -> str:
+    """Oldest month bucket of a conversation, from its ConversationIndex row."""
+    resp = conversation_index_table.get_item(
+        Key={"trainerId": trainer_id, "conversationId": _conversation_id(user_id, trainer_id)},
+        ProjectionExpression="firstBucket",
+    )
+    # No row: no message was ever indexed, so only the current month can hold any
+    return resp.get("Item", {}).get("firstBucket") or _bucket_of(_now_iso())
+
+
+def _get_bucketed_conversation(user_id, trainer_id, conv_id, limit, fields, cursor):
+    """
+    Walk month buckets newest-first until `limit` messages are collected.
+    Each call queries at most MESSAGE_MAX_BUCKETS_PER_READ buckets and never
+    goes below the conversation's first bucket, so the cost stays bounded
+    however old the conversation is. Past the first bucket the walk ends in
+    the legacy (unbucketed) partition, see MESSAGE_LEGACY_FALLBACK.
+    """
+    cursor = cursor or {}
+    items = []
+    if cursor.get("l"):
+        # Buckets already exhausted by an earlier page
+        return _get_legacy_messages(conv_id, limit, fields, cursor.get("k"), items)
+
+    bucket = cursor.get("b") or _bucket_of(_now_iso())
+    first = cursor.get("f") or _first_bucket(user_id, trainer_id)
+    start_key = cursor.get("k")
+
+    buckets_read = 0
+    while bucket >= first and len(items) < limit and buckets_read < MESSAGE_MAX_BUCKETS_PER_READ:
+        partition = f"{conv_id}#{bucket}"
+        query_kwargs = {
+            "KeyConditionExpression": Key("conversationId").eq(partition),
+            "Limit": limit - len(items),
+            "ScanIndexForward": False,  # newest first
+            **projection_kwargs(fields),
+        }
+        if start_key:
+            query_kwargs["ExclusiveStartKey"] = {"conversationId": partition, "timestamp": start_key}
+        resp = messages_table.query(**query_kwargs)
+        items.extend(resp.get("Items", []))
+        buckets_read += 1
+
+        last_key = resp.get("LastEvaluatedKey")
+        if last_key:
+            # Bucket not exhausted (we hit the limit); resume inside it
+            start_key = last_key["timestamp"]
+        else:
+            bucket = _previous_bucket(bucket)
+            start_key = None
+
+    if bucket >= first:
+        next_cursor = _encode_cursor({"b": bucket, "f": first, **({"k": start_key} if start_key else {})})
+        items.reverse()  # time order for display
+        return items, next_cursor
+    return _get_legacy_messages(conv_id, limit, fields, None, items)
+
+
+def _get_legacy_messages(conv_id, limit, fields, start_key, items):
+    """
+    Finish a monthly read from the legacy user#trainer partition, appending
+    to the newest-first `items` already collected. Returns (messages, next_cursor).
+    """
+    next_cursor = None
+    if MESSAGE_LEGACY_FALLBACK:
+        if len(items) < limit:
+            query_kwargs = {
+                "KeyConditionExpression": Key("conversationId").eq(conv_id),
+                "Limit": limit - len(items),
+                "ScanIndexForward": False,  # newest first
+                **projection_kwargs(fields),
+            }
+            if start_key:
+                query_kwargs["ExclusiveStartKey"] = {"conversationId": conv_id, "timestamp": start_key}
+            resp = messages_table.query(**query_kwargs)
+            items.extend(resp.get("Items", []))
+            last_key = resp.get("LastEvaluatedKey")
+            if last_key:
+                next_cursor = _encode_cursor({"l": 1, "k": last_key["timestamp"]})
+        else:
+            # Page filled by the buckets; the legacy partition may still hold older messages
+            next_cursor = _encode_cursor({"l": 1})
+    items.reverse()  # time order for display
+    return items, next_cursor
+
 
 def create_system_daily_summary_message(user_id: str, trainer_id: str, summary_item: dict):
     """
@@ -94,7 +325,7 @@ def create_system_daily_summary_message(user_id: str, trainer_id: str, summary_i
     )
 
     item = {
-        "conversationId": conv_id,
+        "conversationId": _partition_key(conv_id, timestamp),
         "timestamp": timestamp,
         "userId": user_id,
         "trainerId": trainer_id,
@@ -105,6 +336,73 @@ def create_system_daily_summary_message(user_id: str, trainer_id: str, summary_i
     }
 
     messages_table.put_item(Item=item)
+    _update_conversation_index(item)
 
     return item
 
+
+def get_trainer_inbox(trainer_id: str, limit: int = 50):
+    """
+    Return a trainer's conversations, most recent first, with the last
+    message preview and unread counts, plus the trainer's unread total
+    across all conversations. Returns (conversations, unread_count).
+    """
+    limit = max(1, min(limit, INBOX_MAX_LIMIT))
+    resp = conversation_index_table.query(
+        IndexName=CONVERSATION_RECENCY_INDEX,
+        KeyConditionExpression=Key("trainerId").eq(trainer_id),
+        ScanIndexForward=False,  # newest first
+        Limit=limit,
+    )
+    conversations = resp.get("Items", [])
+    for conv in conversations:
+        conv.setdefault("unreadByTrainer", 0)
+        conv.setdefault("unreadByUser", 0)
+
+    if not resp.get("LastEvaluatedKey"):
+        # The page holds every conversation, so its sum is exact
+        return conversations, sum(int(c["unreadByTrainer"]) for c in conversations)
+    totals = conversation_index_table.get_item(
+        Key={"trainerId": trainer_id, "conversationId": UNREAD_TOTALS_ID},
+    ).get("Item") or {}
+    # A mark-read can land between a message's two counter updates; never report below zero
+    return conversations, max(0, int(totals.get("unreadByTrainer", 0)))
+
+
+def mark_conversation_read(body: dict):
+    """
+    Reset the reader's unread counter for a conversation.
+    Body: {"userId": "...", "trainerId": "...", "readerRole": "user" | "trainer"}
+    """
+    user_id = body.get("userId")
+    trainer_id = body.get("trainerId")
+    reader_role = body.get("readerRole")
+
+    if not user_id or not trainer_id:
+        return 400, {"error": "userId and trainerId are required"}
+    if reader_role not in _UNREAD_ATTR_FOR_READER:
+        return 400, {"error": "readerRole must be 'user' or 'trainer'"}
+
+    unread_attr = _UNREAD_ATTR_FOR_READER[reader_role]
+    try:
+        resp = conversation_index_table.update_item(
+            Key={"trainerId": trainer_id, "conversationId": _conversation_id(user_id, trainer_id)},
+            UpdateExpression=f"SET {unread_attr} = :zero",
+            ConditionExpression="attribute_exists(conversationId)",
+            ExpressionAttributeValues={":zero": 0},
+            ReturnValues="UPDATED_OLD",
+        )
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        # No messages yet; nothing to mark
+        logger.debug("No conversation index row for user_id=%s trainer_id=%s", user_id, trainer_id)
+        return 200, {"message": "Conversation marked as read"}
+
+    # Take back exactly what this reset cleared, so concurrent resets cannot double-count
+    cleared = int(resp.get("Attributes", {}).get(unread_attr, 0))
+    if reader_role == "trainer" and cleared:
+        _add_trainer_unread(trainer_id, -cleared)
+
+    return 200, {"message": "Conversation marked as read"}
+
@@ -0,0 +1,232 @@
+"""
+Scheduled job that rolls old DietLogs rows into monthly archives.
+
+For every user, rows in months before archive_cutoff_month() are grouped
+by month and written as one DietLogArchives item each (see archives.py),
+then deleted from DietLogs in batches. Summaries are already final for
+those days and are left alone.
+
+The archive is written before any row is deleted and merges with an
+archive left by an earlier, interrupted run, so a crash at any point only
+means the next run finishes the month. In stream mode every row is first
+marked `archived`, so summary_stream.py ignores the REMOVE records and
+the day totals stay as they are.
+
+Like the daily summary job, users are processed in chunks with the cursor
+saved in AppState, and the job re-invokes itself when it runs out of time.
+"""
+
+import json
+import logging
+import os
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+import metrics
+from archives import archive_cutoff_month, get_archive, pack_logs, unpack_logs
+from diet_logs import DIET_LOG_WRITE_MODE
+from dynamodb_client import app_state_table, diet_log_archives_table, diet_logs_table, users_table
+from utils import _now_iso
+
+logger = logging.getLogger(__name__)
+
+lambda_client = boto3.client("lambda")
+
+COMPACTION_CHUNK_SIZE = int(os.environ.get("COMPACTION_CHUNK_SIZE", "50"))
+# Hand off to a fresh invocation when less than this much time is left
+COMPACTION_HANDOFF_MS = int(os.environ.get("COMPACTION_HANDOFF_MS", "30000"))
+COMPACTION_MAX_HANDOFFS = int(os.environ.get("COMPACTION_MAX_HANDOFFS", "50"))
+# Stay clear of DynamoDB's 400 KB item limit; larger months stay live
+ARCHIVE_MAX_BYTES = int(os.environ.get("ARCHIVE_MAX_BYTES", "350000"))
+
+
+def _job_key(cutoff: str) -> str:
+    return f"compaction#{cutoff}"
+
+
+def _load_job(cutoff: str):
+    resp = app_state_table.get_item(Key={"stateKey": _job_key(cutoff)}, ConsistentRead=True)
+    return resp.get("Item") or {}
+
+
+def _save_job(cutoff: str, job: dict):
+    app_state_table.put_item(Item={**job, "stateKey": _job_key(cutoff), "updatedAt": _now_iso()})
+
+
+def _old_logs_by_month(user_id: str, cutoff: str) -> dict:
+    """The user's live DietLogs rows before the cutoff month, grouped by "YYYY-MM"."""
+    query_kwargs = {
+        # Sort keys start with the ISO date, so this is everything before the cutoff month
+        "KeyConditionExpression": Key("userId").eq(user_id) & Key("logTimestamp").lt(cutoff),
+        "ConsistentRead": True,
+    }
+    months = {}
+    while True:
+        resp = diet_logs_table.query(**query_kwargs)
+        for item in resp.get("Items", []):
+            months.setdefault(item["logTimestamp"][:7], []).append(item)
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            return months
+        query_kwargs["ExclusiveStartKey"] = last_key
+
+
+def _write_archive(user_id: str, month: str, rows) -> bool:
+    """
+    Write (or extend) the month's archive with `rows`. Returns False if the
+    month is too large to archive or the archive changed underneath us.
+    """
+    existing = get_archive(user_id, month, consistent_read=True)
+    merged = {}
+    if existing:
+        for row in unpack_logs(user_id, existing["data"]):
+            merged[row["logTimestamp"]] = row
+    for row in rows:
+        merged[row["logTimestamp"]] = {k: v for k, v in row.items() if k != "archived"}
+
+    data = pack_logs(merged.values())
+    if len(data) > ARCHIVE_MAX_BYTES:
+        logger.warning("Archive for user_id=%s month=%s would be %s bytes; keeping rows live",
+                       user_id, month, len(data))
+        metrics.increment("compaction.month_too_large")
+        return False
+
+    version = int(existing.get("version", 0)) if existing else 0
+    if existing:
+        condition = {
+            "ConditionExpression": "#v = :v",
+            "ExpressionAttributeNames": {"#v": "version"},
+            "ExpressionAttributeValues": {":v": version},
+        }
+    else:
+        condition = {"ConditionExpression": "attribute_not_exists(#m)", "ExpressionAttributeNames": {"#m": "month"}}
+    try:
+        diet_log_archives_table.put_item(
+            Item={
+                "userId": user_id,
+                "month": month,
+                "entryCount": len(merged),
+                "data": data,
+                "version": version + 1,
+                "archivedAt": _now_iso(),
+            },
+            **condition,
+        )
+        return True
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        logger.warning("Archive for user_id=%s month=%s changed concurrently; leaving rows live", user_id, month)
+        metrics.increment("compaction.archive_conflict")
+        return False
+
+
+def _mark_archived(rows):
+    """Stream mode: tag rows so the REMOVE records their deletion produces are ignored."""
+    for row in rows:
+        if row.get("archived"):
+            continue
+        try:
+            diet_logs_table.update_item(
+                Key={"userId": row["userId"], "logTimestamp": row["logTimestamp"]},
+                UpdateExpression="SET archived = :t",
+                ConditionExpression="attribute_exists(logTimestamp)",
+                ExpressionAttributeValues={":t": True},
+            )
+        except ClientError as exc:
+            # Already gone (an earlier run deleted it); nothing to tag
+            if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+
+def compact_user(user_id: str, cutoff: str) -> int:
+    """Archive and delete the user's rows before the cutoff month. Returns rows archived."""
+    archived = 0
+    for month, rows in sorted(_old_logs_by_month(user_id, cutoff).items()):
+        if not _write_archive(user_id, month, rows):
+            continue
+        if DIET_LOG_WRITE_MODE == "stream":
+            _mark_archived(rows)
+        with diet_logs_table.batch_writer() as batch:
+            for row in rows:
+                batch.delete_item(Key={"userId": row["userId"], "logTimestamp": row["logTimestamp"]})
+        archived += len(rows)
+        metrics.increment("compaction.months_archived")
+        logger.info("Archived %s logs for user_id=%s month=%s", len(rows), user_id, month)
+    metrics.increment("compaction.rows_archived", archived)
+    return archived
+
+
+def _hand_off(context, cutoff: str, handoffs: int):
+    """Continue the job in a fresh asynchronous invocation of this function."""
+    lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType="Event",
+        Payload=json.dumps({"cutoff": cutoff, "handoffs": handoffs + 1}).encode("utf-8"),
+    )
+
+
+def lambda_handler(event, context):
+    """
+    Entry point triggered by EventBridge to archive months past retention.
+    Users are read from the Users table in chunks of COMPACTION_CHUNK_SIZE;
+    the cursor is saved after every chunk so the job can resume or hand off.
+    """
+    event = event or {}
+    # Resumed runs carry the cutoff so a handoff across a month boundary keeps it
+    cutoff = event.get("cutoff") or archive_cutoff_month()
+    handoffs = int(event.get("handoffs", 0))
+
+    job = _load_job(cutoff)
+    if job.get("status") == "done":
+        logger.info("Compaction for cutoff %s already completed; nothing to do", cutoff)
+        return {"status": "already-done", "cutoff": cutoff}
+
+    # Counters come back from DynamoDB as Decimal; the return value must be JSON
+    job["users"] = int(job.get("users", 0))
+    job["archived"] = int(job.get("archived", 0))
+    job["status"] = "running"
+
+    while True:
+        remaining = context.get_remaining_time_in_millis() if context else None
+        if remaining is not None and remaining < COMPACTION_HANDOFF_MS:
+            _save_job(cutoff, job)
+            if handoffs >= COMPACTION_MAX_HANDOFFS:
+                logger.error("Compaction for cutoff %s hit the handoff limit; stopping at cursor %s",
+                             cutoff, job.get("cursor"))
+                metrics.maybe_emit(force=True)
+                return {"status": "stalled", "cutoff": cutoff}
+            logger.info("Handing off compaction for cutoff %s with %sms left (users=%s)",
+                        cutoff, remaining, job["users"])
+            _hand_off(context, cutoff, handoffs)
+            metrics.increment("compaction.handoff")
+            metrics.maybe_emit(force=True)
+            return {"status": "handed-off", "cutoff": cutoff, "users": job["users"]}
+
+        scan_kwargs = {
+            "ProjectionExpression": "userId, #r",
+            "ExpressionAttributeNames": {"#r": "role"},
+            "Limit": COMPACTION_CHUNK_SIZE,
+        }
+        if job.get("cursor"):
+            scan_kwargs["ExclusiveStartKey"] = job["cursor"]
+        resp = users_table.scan(**scan_kwargs)
+
+        for user in resp.get("Items", []):
+            if user.get("role", "user") == "user":
+                job["archived"] += compact_user(user["userId"], cutoff)
+            job["users"] += 1
+
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            job.pop("cursor", None)
+            job["status"] = "done"
+            _save_job(cutoff, job)
+            break
+        job["cursor"] = last_key
+        _save_job(cutoff, job)
+
+    metrics.maybe_emit(force=True)
+    return {"status": "ok", "cutoff": cutoff, "users": job["users"], "archived": job["archived"]}
@@ -1,15 +1,31 @@
 from datetime import datetime, timezone, timedelta
 import json
+import logging
 import os
 
 import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
 
-from dynamodb_client import daily_summaries_table, trainer_assignments_table
-from utils import _to_serializable
+import metrics
+
+from dynamodb_client import daily_summaries_table, app_state_table
+from assignments import resolve_trainer_for_user
+from utils import _to_serializable, _now_iso
 from notifications import TRAINER_NOTIFICATIONS_TOPIC_ARN # reuse SNS config
 from chat import create_system_daily_summary_message
 
+logger = logging.getLogger(__name__)
+
 sns = boto3.client("sns")
+lambda_client = boto3.client("lambda")
+
+# GSI on DailySummaries (hash: date, range: userId) so a day is a query, not a scan
+DAILY_SUMMARIES_DATE_INDEX = "date-index"
+DAILY_SUMMARY_CHUNK_SIZE = int(os.environ.get("DAILY_SUMMARY_CHUNK_SIZE", "100"))
+# Hand off to a fresh invocation when less than this much time is left
+DAILY_SUMMARY_HANDOFF_MS = int(os.environ.get("DAILY_SUMMARY_HANDOFF_MS", "8000"))
+DAILY_SUMMARY_MAX_HANDOFFS = int(os.environ.get("DAILY_SUMMARY_MAX_HANDOFFS", "50"))
 
 
 def _yesterday_date_iso():
@@ -20,60 +36,153 @@ def _yesterday_date_iso():
     return yesterday.isoformat()
 
 
-def _find_trainer_for_user(user_id: str):
-    """Scan assignments to discover the active trainer for a user."""
-    # Same as in notifications.py; you can refactor later if you like
-    resp = trainer_assignments_table.scan()
-    items = resp.get("Items", [])
-    for it in items:
-        if it.get("userId") == user_id and it.get("status") == "active":
-            return it.get("trainerId")
-    return None
+def _job_key(target_date: str) -> str:
+    return f"daily-summary#{target_date}"
+
+
+def _load_job(target_date: str):
+    resp = app_state_table.get_item(Key={"stateKey": _job_key(target_date)}, ConsistentRead=True)
+    return resp.get("Item") or {}
+
+
+def _save_job(target_date: str, job: dict):
+    app_state_table.put_item(Item={**job, "stateKey": _job_key(target_date), "updatedAt": _now_iso()})
+
+
+def _claim_summary(user_id: str, target_date: str) -> bool:
+    """
+    Mark the summary as sent before publishing it. A retried or overlapping
+    run finds the marker and skips the user, so trainers never get duplicates
+    (a crash between claim and publish drops that one summary instead).
+    """
+    try:
+        daily_summaries_table.update_item(
+            Key={"userId": user_id, "date": target_date},
+            UpdateExpression="SET trainerSummarySentAt = :now",
+            ConditionExpression="attribute_not_exists(trainerSummarySentAt)",
+            ExpressionAttributeValues={":now": _now_iso()},
+        )
+        return True
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def _send_summary(item: dict, target_date: str):
+    """Publish one user's summary to their trainer. Returns True if something was sent."""
+    user_id = item.get("userId")
+    if not user_id or item.get("trainerSummarySentAt"):
+        return False
+
+    trainer_id = resolve_trainer_for_user(user_id)
+    if not trainer_id:
+        # No trainer for user; skip
+        return False
+
+    if not _claim_summary(user_id, target_date):
+        metrics.increment("daily_summary.duplicate_skipped")
+        return False
+
+    msg = {
+        "type": "DAILY_SUMMARY",
+        "userId": user_id,
+        "trainerId": trainer_id,
+        "date": target_date,
+        "totalCalories": item.get("totalCalories"),
+        "totalProtein": item.get("totalProtein"),
+        "totalCarbs": item.get("totalCarbs"),
+        "totalFat": item.get("totalFat"),
+        "entryCount": item.get("entryCount"),
+    }
+
+    sns.publish(
+        TopicArn=TRAINER_NOTIFICATIONS_TOPIC_ARN,
+        Message=json.dumps(_to_serializable(msg)),
+        Subject=f"Daily Summary for user {user_id} on {target_date}",
+    )
+
+    create_system_daily_summary_message(user_id, trainer_id, item)
+    return True
+
+
+def _hand_off(context, target_date: str, handoffs: int):
+    """Continue the job in a fresh asynchronous invocation of this function."""
+    lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType="Event",
+        Payload=json.dumps({"date": target_date, "handoffs": handoffs + 1}).encode("utf-8"),
+    )
 
 
 def lambda_handler(event, context):
-    """Entry point triggered by EventBridge to broadcast yesterday's summaries."""
+    """
+    Entry point triggered by EventBridge to broadcast yesterday's summaries.
+
+    Work is done in chunks of DAILY_SUMMARY_CHUNK_SIZE from the date index.
+    The cursor is persisted in AppState after every chunk and each summary
+    carries a sent marker, so the job can be retried or resumed safely. When
+    the invocation is close to its timeout it re-invokes itself with the
+    same date and picks up from the saved cursor.
+    """
     if not TRAINER_NOTIFICATIONS_TOPIC_ARN:
         # No topic configured; nothing to do
         return {"status": "no-topic"}
 
-    target_date = _yesterday_date_iso()
-
-    # Scan daily summaries and filter by date == target_date
-    resp = daily_summaries_table.scan()
-    items = resp.get("Items", [])
-
-    for item in items:
-        if item.get("date") != target_date:
-            continue
-
-        user_id = item.get("userId")
-        if not user_id:
-            continue
-
-        trainer_id = _find_trainer_for_user(user_id)
-        if not trainer_id:
-            # No trainer for user; skip
-            continue
-
-        msg = {
-            "type": "DAILY_SUMMARY",
-            "userId": user_id,
-            "trainerId": trainer_id,
-            "date": target_date,
-            "totalCalories": item.get("totalCalories"),
-            "totalProtein": item.get("totalProtein"),
-            "totalCarbs": item.get("totalCarbs"),
-            "totalFat": item.get("totalFat"),
-            "entryCount": item.get("entryCount"),
+    event = event or {}
+    # Resumed runs carry the date so a handoff after midnight keeps the same day
+    target_date = event.get("date") or _yesterday_date_iso()
+    handoffs = int(event.get("handoffs", 0))
+
+    job = _load_job(target_date)
+    if job.get("status") == "done":
+        logger.info("Daily summary job for %s already completed; nothing to do", target_date)
+        return {"status": "already-done", "date": target_date}
+
+    # Counters come back from DynamoDB as Decimal; the return value must be JSON
+    job["processed"] = int(job.get("processed", 0))
+    job["sent"] = int(job.get("sent", 0))
+    job["status"] = "running"
+
+    while True:
+        remaining = context.get_remaining_time_in_millis() if context else None
+        if remaining is not None and remaining < DAILY_SUMMARY_HANDOFF_MS:
+            _save_job(target_date, job)
+            if handoffs >= DAILY_SUMMARY_MAX_HANDOFFS:
+                logger.error("Daily summary job for %s hit the handoff limit; stopping at cursor %s",
+                             target_date, job.get("cursor"))
+                metrics.maybe_emit(force=True)
+                return {"status": "stalled", "date": target_date}
+            logger.info("Handing off daily summary job for %s with %sms left (processed=%s)",
+                        target_date, remaining, job["processed"])
+            _hand_off(context, target_date, handoffs)
+            metrics.increment("daily_summary.handoff")
+            metrics.maybe_emit(force=True)
+            return {"status": "handed-off", "date": target_date, "processed": job["processed"]}
+
+        query_kwargs = {
+            "IndexName": DAILY_SUMMARIES_DATE_INDEX,
+            "KeyConditionExpression": Key("date").eq(target_date),
+            "Limit": DAILY_SUMMARY_CHUNK_SIZE,
         }
-
-        sns.publish(
-            TopicArn=TRAINER_NOTIFICATIONS_TOPIC_ARN,
-            Message=json.dumps(_to_serializable(msg)),
-            Subject=f"Daily Summary for user {user_id} on {target_date}",
-        )
-        
-        create_system_daily_summary_message(user_id, trainer_id, item)
-
-    return {"status": "ok", "date": target_date}
+        if job.get("cursor"):
+            query_kwargs["ExclusiveStartKey"] = job["cursor"]
+        resp = daily_summaries_table.query(**query_kwargs)
+
+        for item in resp.get("Items", []):
+            if _send_summary(item, target_date):
+                job["sent"] += 1
+                metrics.increment("daily_summary.sent")
+            job["processed"] += 1
+
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            job.pop("cursor", None)
+            job["status"] = "done"
+            _save_job(target_date, job)
+            break
+        job["cursor"] = last_key
+        _save_job(target_date, job)
+
+    metrics.maybe_emit(force=True)
+    return {"status": "ok", "date": target_date, "processed": job["processed"], "sent": job["sent"]}
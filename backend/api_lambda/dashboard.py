@@ -0,0 +1,79 @@
+"""
+GET /dashboard/today: the client home screen in one request.
+
+The home screen used to call /summary/today, /diet-logs/today and
+/messages one after another. Here the reads run concurrently on a small
+thread pool kept for the life of the container, so latency is close to
+the slowest read instead of the sum. The summary and logs start right
+away; the conversation page waits only for the trainer lookup, which is
+usually an assignment cache hit.
+
+Each task runs in a copy of the request's context, so the request
+deadline (deadlines.py) still bounds AWS calls made on pool threads.
+"""
+
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from assignments import resolve_trainer_for_user
+from chat import get_conversation
+from diet_logs import get_today_logs
+from summaries import get_today_summary
+from utils import get_today_iso_date
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_MAX_WORKERS = int(os.environ.get("DASHBOARD_MAX_WORKERS", "3"))
+# Messages in the dashboard's conversation page
+DASHBOARD_MESSAGES_LIMIT = int(os.environ.get("DASHBOARD_MESSAGES_LIMIT", "20"))
+
+_executor = ThreadPoolExecutor(max_workers=DASHBOARD_MAX_WORKERS, thread_name_prefix="dashboard")
+
+
+def _submit(fn, *args):
+    # A context can only be entered by one thread at a time, so copy per task
+    return _executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _trainer_and_messages(user_id: str):
+    trainer_id = resolve_trainer_for_user(user_id)
+    if not trainer_id:
+        return None, [], None
+    # The latest page; its cursor continues with older messages on GET /messages
+    messages, next_cursor = get_conversation(user_id, trainer_id, limit=DASHBOARD_MESSAGES_LIMIT, newest_first=True)
+    return trainer_id, messages, next_cursor
+
+
+def get_today_dashboard(user_id: str):
+    """
+    Today's summary (with targets and progress), today's logs and the
+    conversation page with the active trainer, read concurrently.
+    An error in any read fails the whole request, as the separate calls would.
+    """
+    started = time.monotonic()
+
+    summary_future = _submit(get_today_summary, user_id)
+    logs_future = _submit(get_today_logs, user_id)
+    chat_future = _submit(_trainer_and_messages, user_id)
+
+    summary = summary_future.result()
+    logs = logs_future.result()
+    trainer_id, messages, next_cursor = chat_future.result()
+
+    elapsed_ms = (time.monotonic() - started) * 1000.0
+    metrics.increment("dashboard.requests")
+    logger.debug("Built dashboard for user_id=%s in %.1fms", user_id, elapsed_ms)
+
+    return {
+        "userId": user_id,
+        "date": get_today_iso_date(),
+        "trainerId": trainer_id,
+        "summary": summary,
+        "items": logs,
+        "messages": messages,
+        "nextCursor": next_cursor,
+    }
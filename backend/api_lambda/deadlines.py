@@ -0,0 +1,144 @@
+"""
+Per-request deadlines derived from the Lambda's remaining invocation time.
+
+`start(context)` records a deadline a safety margin before the hard kill.
+AWS clients passed to `instrument` check it before every call and every
+retry attempt, and raise DeadlineExceeded instead of starting work that
+cannot finish. The check only applies until the request's first write
+succeeds: after that the writes that depend on it (summary, index, next
+batch row) must land, or the client would get a retryable 503 for a
+change that is already committed. botocore only supports timeouts per client, so
+CLIENT_CONFIG caps each attempt and the deadline check bounds the total.
+"""
+
+import contextlib
+import contextvars
+import os
+import time
+
+from botocore.config import Config
+
+import metrics
+
+# Kept back from the Lambda timeout so a 503 can be built and returned
+REQUEST_DEADLINE_MARGIN_MS = int(os.environ.get("REQUEST_DEADLINE_MARGIN_MS", "500"))
+# Requests arriving with less budget than this are shed immediately
+MIN_REQUEST_BUDGET_MS = int(os.environ.get("MIN_REQUEST_BUDGET_MS", "250"))
+# An AWS call is not started with less budget than this
+MIN_CALL_BUDGET_MS = int(os.environ.get("MIN_CALL_BUDGET_MS", "50"))
+# Optional work (notifications, cache warming) needs at least this much left
+OPTIONAL_WORK_MIN_BUDGET_MS = int(os.environ.get("OPTIONAL_WORK_MIN_BUDGET_MS", "1000"))
+
+CLIENT_CONFIG = Config(
+    connect_timeout=float(os.environ.get("AWS_CONNECT_TIMEOUT_SECONDS", "1")),
+    read_timeout=float(os.environ.get("AWS_READ_TIMEOUT_SECONDS", "2")),
+    retries={"max_attempts": int(os.environ.get("AWS_MAX_ATTEMPTS", "3")), "mode": "standard"},
+)
+
+# Operations that change state; once one succeeds the request is committed
+WRITE_OPERATIONS = frozenset({
+    "PutItem", "UpdateItem", "DeleteItem", "BatchWriteItem", "TransactWriteItems", "Publish",
+})
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+# Per-request {"committed": bool}; a dict so pool threads running a copied
+# context (dashboard.py) share it with the request
+_request_state = contextvars.ContextVar("request_state", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request's time budget is too small to start more work."""
+
+
+def start(context):
+    """Set the deadline for the current request; returns a token for `reset`."""
+    deadline = None
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        budget_ms = context.get_remaining_time_in_millis() - REQUEST_DEADLINE_MARGIN_MS
+        deadline = time.monotonic() + budget_ms / 1000.0
+    return _deadline.set(deadline), _request_state.set({"committed": False})
+
+
+def reset(token):
+    deadline_token, state_token = token
+    _deadline.reset(deadline_token)
+    _request_state.reset(state_token)
+
+
+def remaining_ms():
+    """Milliseconds left before the deadline, or None when no deadline is set."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return (deadline - time.monotonic()) * 1000.0
+
+
+def has_budget(min_ms: float) -> bool:
+    """True when there is no deadline or at least `min_ms` remains."""
+    remaining = remaining_ms()
+    return remaining is None or remaining >= min_ms
+
+
+def committed() -> bool:
+    """True once the current request has completed a write."""
+    state = _request_state.get()
+    return bool(state and state["committed"])
+
+
+def record_success(operation: str):
+    """Note a completed AWS call; a write commits the request."""
+    state = _request_state.get()
+    if state is not None and operation in WRITE_OPERATIONS:
+        state["committed"] = True
+
+
+@contextlib.contextmanager
+def uncommitted():
+    """
+    Writes made inside this block do not commit the request. For bookkeeping
+    writes (rate-limit counters) that happen before the request's real work,
+    so that work can still be shed.
+    """
+    state = _request_state.get()
+    was_committed = bool(state and state["committed"])
+    try:
+        yield
+    finally:
+        if state is not None:
+            state["committed"] = was_committed
+
+
+def check(operation: str = "operation"):
+    """
+    Raise DeadlineExceeded if there is not enough budget left to start
+    `operation`. Never raises once the request has committed a write.
+    """
+    if committed():
+        return
+    remaining = remaining_ms()
+    if remaining is not None and remaining < MIN_CALL_BUDGET_MS:
+        metrics.increment("deadline.exceeded")
+        raise DeadlineExceeded(f"{operation} skipped with {max(remaining, 0):.0f}ms left")
+
+
+def _before_call(model=None, **kwargs):
+    check(getattr(model, "name", "aws-call"))
+
+
+def _before_send(request=None, **kwargs):
+    # Emitted once per HTTP attempt, so retries stop when the budget is gone
+    check("aws-attempt")
+
+
+def _after_call(http_response=None, model=None, **kwargs):
+    # Also emitted for error responses; only a successful write commits
+    if http_response is not None and http_response.status_code < 300:
+        record_success(getattr(model, "name", ""))
+
+
+def instrument(client):
+    """Make a boto3 client honour the current request deadline."""
+    client.meta.events.register("before-call", _before_call)
+    client.meta.events.register("before-send", _before_send)
+    client.meta.events.register("after-call", _after_call)
+    return client
@@ -1,15 +1,41 @@
 import logging
+import os
+from datetime import date as date_cls, timedelta
 from decimal import Decimal, ROUND_HALF_UP
 
 from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
 
-from dynamodb_client import diet_logs_table, foods_table
-from summaries import update_daily_summary
-from utils import get_today_iso_date, get_current_timestamp_iso
+from dynamodb_client import (
+    diet_logs_table,
+    foods_table,
+    ddb_client,
+    to_attribute_values,
+    DIET_LOGS_TABLE_NAME,
+)
+from summaries import (
+    update_daily_summary,
+    build_summary_increment,
+    get_summary,
+    meal_subtotals,
+    merge_meal_subtotals,
+    MACRO_TOTALS,
+)
+from utils import get_today_iso_date, get_current_timestamp_iso, projection_kwargs, _now_iso
+from archives import archive_cutoff_month, load_archived_logs
 from notifications import notify_trainer_user_logged_food
+from recent_foods import record_recent_food
+from trends import invalidate_trends
 
 logger = logging.getLogger(__name__)
 
+# "separate": put the log, then read-modify-write the summary (default)
+# "transactional": log insert + summary increment in one TransactWriteItems call
+# "stream": only the log is written; summary_stream.py applies the summary from the DietLogs stream
+DIET_LOG_WRITE_MODE = os.environ.get("DIET_LOG_WRITE_MODE", "separate")
+TRANSACTION_MAX_ATTEMPTS = 3
+MAX_HISTORY_DAYS = 366
+
 
 def _to_decimal(value, default="0"):
     """Convert a value to Decimal with a safe default."""
@@ -22,6 +48,151 @@ def _round_currency(value: Decimal) -> Decimal:
     """Quantize a Decimal to two places using bankers-friendly rounding."""
     return value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
+def compute_macros(food: dict, quantity: Decimal) -> dict:
+    """Macros for `quantity` grams of a Foods item, rounded to two places."""
+    grams_per_unit = _to_decimal(food.get("gramsPerUnit", 100))
+    factor = quantity / grams_per_unit if grams_per_unit > 0 else Decimal("0")
+    return {
+        "calories": _round_currency(_to_decimal(food.get("caloriesPerUnit", 0)) * factor),
+        "protein": _round_currency(_to_decimal(food.get("proteinPerUnit", 0)) * factor),
+        "carbs": _round_currency(_to_decimal(food.get("carbsPerUnit", 0)) * factor),
+        "fat": _round_currency(_to_decimal(food.get("fatPerUnit", 0)) * factor),
+    }
+
+
+def sum_macros(items) -> dict:
+    """Total calories/protein/carbs/fat over a list of log rows (or components)."""
+    totals = {"calories": Decimal("0"), "protein": Decimal("0"), "carbs": Decimal("0"), "fat": Decimal("0")}
+    for item in items:
+        for key in totals:
+            totals[key] += _to_decimal(item.get(key))
+    return totals
+
+
+def _summary_update_action(increment: dict) -> dict:
+    """TransactWriteItems Update entry for a build_summary_increment result."""
+    return {
+        "Update": {
+            "TableName": increment["TableName"],
+            "Key": to_attribute_values(increment["Key"]),
+            "UpdateExpression": increment["UpdateExpression"],
+            "ExpressionAttributeValues": to_attribute_values(increment["ExpressionAttributeValues"]),
+        }
+    }
+
+
+def _transact(transact_items, user_id: str):
+    """Run TransactWriteItems, retrying only when it lost a conflict with another transaction."""
+    for attempt in range(1, TRANSACTION_MAX_ATTEMPTS + 1):
+        try:
+            ddb_client.transact_write_items(TransactItems=transact_items)
+            return
+        except ClientError as exc:
+            reasons = exc.response.get("CancellationReasons") or []
+            conflicted = any(r.get("Code") == "TransactionConflict" for r in reasons)
+            if not conflicted or attempt == TRANSACTION_MAX_ATTEMPTS:
+                raise
+            logger.info(
+                "Diet log transaction conflicted for user_id=%s (attempt %s); retrying",
+                user_id,
+                attempt,
+            )
+
+
+def _write_logs_and_summary(items):
+    """
+    Insert the DietLogs rows and increment the DailySummaries row in a single
+    transaction, so a failure can never leave the totals out of step with the
+    logs. Returns the updated summary via a consistent read (transactions do
+    not return item attributes).
+    """
+    first = items[0]
+    increment = build_summary_increment(
+        user_id=first["userId"],
+        date=first["date"],
+        entry_count=len(items),
+        meals=meal_subtotals(items),
+        **sum_macros(items),
+    )
+    transact_items = [
+        {
+            "Put": {
+                "TableName": DIET_LOGS_TABLE_NAME,
+                "Item": to_attribute_values(item),
+                "ConditionExpression": "attribute_not_exists(logTimestamp)",
+            }
+        }
+        for item in items
+    ]
+    transact_items.append(_summary_update_action(increment))
+    _transact(transact_items, first["userId"])
+
+    return get_summary(first["userId"], first["date"], consistent_read=True)
+
+
+def _put_logs(items):
+    if len(items) == 1:
+        diet_logs_table.put_item(Item=items[0])
+    else:
+        with diet_logs_table.batch_writer() as batch:
+            for item in items:
+                batch.put_item(Item=item)
+
+
+def _with_change(summary: dict, totals: dict, entries: int, meals: dict) -> dict:
+    """Summary (from get_summary) with macro totals, an entry count and meal subtotals added on top."""
+    for key, total in totals.items():
+        attr = MACRO_TOTALS[key]
+        summary[attr] = _to_decimal(summary.get(attr)) + total
+    summary["entryCount"] = int(summary.get("entryCount", 0)) + entries
+    for meal, values in meals.items():
+        breakdown = summary["meals"].setdefault(meal, {})
+        for key, value in values.items():
+            attr = MACRO_TOTALS.get(key, key)
+            breakdown[attr] = breakdown.get(attr, 0) + value
+    return summary
+
+
+def _projected_summary(items):
+    """
+    Stream mode: the summary row is updated later by summary_stream.py, so
+    return the current row with these entries added on top.
+    """
+    first = items[0]
+    return _with_change(
+        get_summary(first["userId"], first["date"]), sum_macros(items), len(items), meal_subtotals(items)
+    )
+
+
+def save_log_entries(items):
+    """
+    Persist DietLogs rows for one user and date, applying their combined
+    macros to the daily summary as a single increment. Returns the summary.
+    """
+    first = items[0]
+    if DIET_LOG_WRITE_MODE == "transactional":
+        # Save log entries and bump the summary atomically
+        summary = _write_logs_and_summary(items)
+    elif DIET_LOG_WRITE_MODE == "stream":
+        # DietLogs is the source of truth; the stream consumer folds the summary
+        _put_logs(items)
+        summary = _projected_summary(items)
+    else:
+        # Save log entries
+        _put_logs(items)
+
+        # Update daily summary
+        summary = update_daily_summary(
+            user_id=first["userId"],
+            date=first["date"],
+            entry_count=len(items),
+            meals=meal_subtotals(items),
+            **sum_macros(items),
+        )
+    invalidate_trends(first["userId"], first["date"])
+    return summary
+
+
 def log_diet_entry(body: dict):
     """
     Log a food entry for a user, and update daily summary.
@@ -71,19 +242,12 @@ def log_diet_entry(body: dict):
         logger.warning("Food not found for food_id=%s", food_id)
         return 404, {"error": f"Food with id '{food_id}' not found"}
 
-    grams_per_unit = _to_decimal(food.get("gramsPerUnit", 100))
-    calories_per_unit = _to_decimal(food.get("caloriesPerUnit", 0))
-    protein_per_unit = _to_decimal(food.get("proteinPerUnit", 0))
-    carbs_per_unit = _to_decimal(food.get("carbsPerUnit", 0))
-    fat_per_unit = _to_decimal(food.get("fatPerUnit", 0))
-
     # 2) Compute macros for the given quantity
-    factor = quantity / grams_per_unit if grams_per_unit > 0 else Decimal("0")
-
-    calories = _round_currency(calories_per_unit * factor)
-    protein = _round_currency(protein_per_unit * factor)
-    carbs = _round_currency(carbs_per_unit * factor)
-    fat = _round_currency(fat_per_unit * factor)
+    macros = compute_macros(food, quantity)
+    calories = macros["calories"]
+    protein = macros["protein"]
+    carbs = macros["carbs"]
+    fat = macros["fat"]
     logger.debug(
         "Computed macros for user_id=%s food_id=%s: calories=%s protein=%s carbs=%s fat=%s",
         user_id,
@@ -95,7 +259,8 @@ def log_diet_entry(body: dict):
     )
 
     log_timestamp = get_current_timestamp_iso()
-    date = get_today_iso_date()
+    # Same instant as the timestamp, so the sort key always starts with the date
+    date = log_timestamp[:10]
 
     # 3) Build DietLogs item with computed macros
     item = {
@@ -113,38 +278,239 @@ def log_diet_entry(body: dict):
         "mealType": meal_type,
     }
 
-    # Save log entry
-    diet_logs_table.put_item(Item=item)
-
-    # 4) Update daily summary
-    summary = update_daily_summary(
-        user_id=user_id,
-        date=date,
-        calories=calories,
-        protein=protein,
-        carbs=carbs,
-        fat=fat,
-    )
+    # 4) Save the log entry and update the daily summary
+    summary = save_log_entries([item])
+    record_recent_food(item)
     notify_trainer_user_logged_food(user_id, item, summary)
 
     logger.info("Diet log created for user_id=%s food_id=%s timestamp=%s", user_id, food_id, log_timestamp)
     return 201, {"log": item, "updatedSummary": summary}
 
 
-def get_today_logs(user_id: str):
+def _change_log(old: dict, new):
+    """
+    Replace (`new` is a dict) or delete (`new` is None) a DietLogs row and
+    apply the exact macro difference to its summary row; no other log of the
+    user is read. The log write is conditioned on the revision the caller
+    read, so two concurrent edits cannot both apply a delta. Returns the
+    updated summary, or None if the row changed or vanished meanwhile.
+    """
+    user_id, date = old["userId"], old["date"]
+    key = {"userId": user_id, "logTimestamp": old["logTimestamp"]}
+    if "revision" in old:
+        condition = "attribute_exists(logTimestamp) AND #rev = :rev"
+        values = {":rev": old["revision"]}
+    else:
+        condition = "attribute_exists(logTimestamp) AND attribute_not_exists(#rev)"
+        values = {}
+    names = {"#rev": "revision"}
+
+    old_macros = sum_macros([old])
+    new_macros = sum_macros([new]) if new is not None else sum_macros([])
+    delta = {k: new_macros[k] - old_macros[k] for k in old_macros}
+    entries = 0 if new is not None else -1
+    # A mealType edit moves the entry between meal subtotals
+    meal_delta = merge_meal_subtotals(meal_subtotals([old], sign=-1), meal_subtotals([new] if new is not None else []))
+    meal_delta = {meal: values for meal, values in meal_delta.items() if any(values.values())}
+    summary_changes = entries != 0 or any(delta.values()) or bool(meal_delta)
+
+    try:
+        if DIET_LOG_WRITE_MODE == "stream" or not summary_changes:
+            # Stream mode: the consumer applies the MODIFY/REMOVE itself
+            kwargs = {"ConditionExpression": condition, "ExpressionAttributeNames": names}
+            if values:
+                kwargs["ExpressionAttributeValues"] = values
+            if new is not None:
+                diet_logs_table.put_item(Item=new, **kwargs)
+            else:
+                diet_logs_table.delete_item(Key=key, **kwargs)
+        else:
+            # Atomic in every write mode: the log change and its delta land together
+            log_action = {
+                "TableName": DIET_LOGS_TABLE_NAME,
+                "ConditionExpression": condition,
+                "ExpressionAttributeNames": names,
+            }
+            if values:
+                log_action["ExpressionAttributeValues"] = to_attribute_values(values)
+            if new is not None:
+                log_action["Item"] = to_attribute_values(new)
+                action = {"Put": log_action}
+            else:
+                log_action["Key"] = to_attribute_values(key)
+                action = {"Delete": log_action}
+            increment = build_summary_increment(
+                user_id=user_id, date=date, entry_count=entries, meals=meal_delta, **delta
+            )
+            _transact([action, _summary_update_action(increment)], user_id)
+    except ClientError as exc:
+        code = exc.response["Error"]["Code"]
+        reasons = exc.response.get("CancellationReasons") or []
+        if code == "ConditionalCheckFailedException" or (
+            code == "TransactionCanceledException" and reasons and reasons[0].get("Code") == "ConditionalCheckFailed"
+        ):
+            return None
+        raise
+
+    invalidate_trends(user_id, date)
+    if DIET_LOG_WRITE_MODE == "stream":
+        return _with_change(get_summary(user_id, date), delta, entries, meal_delta)
+    return get_summary(user_id, date, consistent_read=True)
+
+
+def _load_log(user_id: str, log_timestamp: str):
+    resp = diet_logs_table.get_item(
+        Key={"userId": user_id, "logTimestamp": log_timestamp},
+        ConsistentRead=True,
+    )
+    return resp.get("Item")
+
+
+def update_diet_log(body: dict):
+    """
+    Correct a logged entry in place.
+    Expected body:
+    {
+      "userId": "...",
+      "logTimestamp": "...",   # identifies the entry
+      "quantity": 120,         # optional; macros are recomputed from Foods
+      "mealType": "dinner"     # optional
+    }
+    """
+    user_id = body.get("userId")
+    log_timestamp = body.get("logTimestamp")
+    if not user_id or not log_timestamp:
+        return 400, {"error": "userId and logTimestamp are required"}
+    if "quantity" not in body and "mealType" not in body:
+        return 400, {"error": "nothing to update; provide quantity and/or mealType"}
+    if (body.get("unit") or "g") != "g":
+        return 400, {"error": "For now only grams as unit is supported"}
+
+    quantity = None
+    if "quantity" in body:
+        try:
+            quantity = _to_decimal(body.get("quantity"))
+        except (TypeError, ValueError, ArithmeticError):
+            return 400, {"error": "quantity must be a number"}
+        if not quantity.is_finite():
+            return 400, {"error": "quantity must be a finite number"}
+        if quantity <= 0:
+            return 400, {"error": "quantity must be positive"}
+
+    if log_timestamp[:7] < archive_cutoff_month():
+        return 409, {"error": "log entry is archived and can no longer be changed"}
+
+    old = _load_log(user_id, log_timestamp)
+    if not old:
+        return 404, {"error": "log entry not found"}
+
+    new = dict(old)
+    if quantity is not None:
+        resp = foods_table.get_item(Key={"foodId": old.get("foodId")})
+        food = resp.get("Item")
+        if not food:
+            return 404, {"error": f"Food with id '{old.get('foodId')}' not found"}
+        # Same computation and rounding as log_diet_entry
+        new.update(compute_macros(food, quantity))
+        new["quantity"] = quantity
+    if "mealType" in body:
+        new["mealType"] = body.get("mealType")
+    new["revision"] = int(old.get("revision", 0)) + 1
+    new["updatedAt"] = _now_iso()
+
+    summary = _change_log(old, new)
+    if summary is None:
+        return 409, {"error": "log entry was changed or deleted concurrently; reload and retry"}
+
+    logger.info("Diet log updated for user_id=%s timestamp=%s", user_id, log_timestamp)
+    return 200, {"log": new, "updatedSummary": summary}
+
+
+def delete_diet_log(user_id: str, log_timestamp: str):
+    """Delete a logged entry and take its macros back out of the daily summary."""
+    if not user_id or not log_timestamp:
+        return 400, {"error": "userId and logTimestamp are required"}
+    if log_timestamp[:7] < archive_cutoff_month():
+        return 409, {"error": "log entry is archived and can no longer be changed"}
+
+    old = _load_log(user_id, log_timestamp)
+    if not old:
+        return 404, {"error": "log entry not found"}
+
+    summary = _change_log(old, None)
+    if summary is None:
+        return 409, {"error": "log entry was changed or deleted concurrently; reload and retry"}
+
+    logger.info("Diet log deleted for user_id=%s timestamp=%s", user_id, log_timestamp)
+    return 200, {"deleted": {"userId": user_id, "logTimestamp": log_timestamp}, "updatedSummary": summary}
+
+
+# Attributes a client may request via `fields=` on /diet-logs/today
+DIET_LOG_FIELDS = {
+    "userId", "logTimestamp", "date", "foodId", "foodName", "quantity", "unit",
+    "calories", "protein", "carbs", "fat", "mealType", "updatedAt",
+}
+
+
+def get_today_logs(user_id: str, fields=None):
     """
     Return today's logs for a user.
-    Query by userId and filter by date in code.
+    logTimestamp is an ISO timestamp, so today's entries are a begins_with range
+    on the sort key rather than the user's whole history. `fields` limits the
+    attributes read and returned.
     """
 
     date = get_today_iso_date()
 
-    # Query all logs for this user
-    resp = diet_logs_table.query(
-        KeyConditionExpression=Key("userId").eq(user_id)
-    )
+    query_kwargs = {
+        "KeyConditionExpression": Key("userId").eq(user_id) & Key("logTimestamp").begins_with(date),
+        **projection_kwargs(fields),
+    }
+    today_items = []
+    while True:
+        resp = diet_logs_table.query(**query_kwargs)
+        today_items.extend(resp.get("Items", []))
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        query_kwargs["ExclusiveStartKey"] = last_key
 
-    items = resp.get("Items", [])
-    today_items = [it for it in items if it.get("date") == date]
     logger.debug("Fetched %s diet logs for user_id=%s date=%s", len(today_items), user_id, date)
     return today_items
+
+
+def get_log_history(user_id: str, start: str, end: str, fields=None):
+    """
+    A user's logs from `start` to `end` (ISO dates, inclusive), oldest first.
+    Months already compacted come from their archive (one item per month)
+    and are merged with live rows; a row present in both (a compaction
+    interrupted before its deletes) is returned once, from DietLogs.
+    """
+    rows = {}
+    if start[:7] < archive_cutoff_month():
+        for row in load_archived_logs(user_id, start[:7], end[:7]):
+            if start <= row["logTimestamp"][:10] <= end:
+                rows[row["logTimestamp"]] = row
+
+    # Timestamps start with the date, so anything on `end` sorts before the next day
+    next_day = (date_cls.fromisoformat(end) + timedelta(days=1)).isoformat()
+    query_fields = sorted(set(fields) | {"logTimestamp"}) if fields else None
+    query_kwargs = {
+        "KeyConditionExpression": Key("userId").eq(user_id) & Key("logTimestamp").between(start, next_day),
+        **projection_kwargs(query_fields),
+    }
+    while True:
+        resp = diet_logs_table.query(**query_kwargs)
+        for row in resp.get("Items", []):
+            row.pop("archived", None)
+            rows[row["logTimestamp"]] = row
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        query_kwargs["ExclusiveStartKey"] = last_key
+
+    items = [rows[ts] for ts in sorted(rows)]
+    if fields:
+        items = [{k: row[k] for k in fields if k in row} for row in items]
+    logger.debug("Fetched %s diet logs for user_id=%s from %s to %s", len(items), user_id, start, end)
+    return items
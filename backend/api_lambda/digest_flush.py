@@ -0,0 +1,22 @@
+import logging
+
+import metrics
+from notifications import TRAINER_NOTIFICATIONS_TOPIC_ARN, flush_due_digests
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def lambda_handler(event, context):
+    """Entry point triggered by EventBridge to publish trainer notification digests."""
+    if not TRAINER_NOTIFICATIONS_TOPIC_ARN:
+        # No topic configured; nothing to do
+        return {"status": "no-topic"}
+
+    # Manual invocations can pass {"force": true} to flush open windows too
+    force = bool((event or {}).get("force"))
+    digests, events = flush_due_digests(force=force)
+    logger.info("Published %s trainer digests covering %s food logs", digests, events)
+
+    metrics.maybe_emit(force=True)
+    return {"status": "ok", "digests": digests, "events": events}
@@ -1,8 +1,37 @@
-"""Centralized DynamoDB table handles used across Lambda modules."""
+"""
+Centralized DynamoDB table handles used across Lambda modules.
+
+STORAGE_BACKEND picks what backs them: "dynamodb" (default) or "sqlite"
+for a single node (sqlite_store.py). Both expose the same boto3 resource
+interface, so domain modules do not know which one they talk to.
+"""
+
+import logging
+import os
 
 import boto3
+from boto3.dynamodb.types import TypeSerializer
+
+from deadlines import CLIENT_CONFIG, instrument
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "dynamodb")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "diet_logging.sqlite3")
 
-dynamodb = boto3.resource("dynamodb")
+if STORAGE_BACKEND == "sqlite":
+    from sqlite_store import SQLiteResource
+
+    dynamodb = SQLiteResource(SQLITE_PATH)
+    if os.environ.get("DIET_LOG_WRITE_MODE") == "stream":
+        logger.warning("DIET_LOG_WRITE_MODE=stream needs DynamoDB Streams; summaries will not update on sqlite")
+else:
+    dynamodb = boto3.resource("dynamodb", config=CLIENT_CONFIG)
+    instrument(dynamodb.meta.client)
+
+# Low-level client for calls the Table resource does not expose (transactions)
+ddb_client = dynamodb.meta.client
+_serializer = TypeSerializer()
 
 # For now we hardcode table names to match Terraform
 USERS_TABLE_NAME = "Users"
@@ -12,6 +41,14 @@ FOODS_TABLE_NAME = "Foods"
 TRAINERS_TABLE_NAME = "Trainers"
 TRAINER_ASSIGNMENTS_TABLE_NAME = "TrainerAssignments"
 MESSAGES_TABLE_NAME = "Messages"
+APP_STATE_TABLE_NAME = "AppState"
+NOTIFICATION_DIGESTS_TABLE_NAME = "NotificationDigests"
+SAVED_MEALS_TABLE_NAME = "SavedMeals"
+MEAL_FOODS_TABLE_NAME = "MealFoods"
+CONVERSATION_INDEX_TABLE_NAME = "ConversationIndex"
+RATE_LIMITS_TABLE_NAME = "RateLimits"
+RECENT_FOODS_TABLE_NAME = "RecentFoods"
+DIET_LOG_ARCHIVES_TABLE_NAME = "DietLogArchives"
 
 users_table = dynamodb.Table(USERS_TABLE_NAME)
 diet_logs_table = dynamodb.Table(DIET_LOGS_TABLE_NAME)
@@ -20,3 +57,16 @@ foods_table = dynamodb.Table(FOODS_TABLE_NAME)
 trainers_table = dynamodb.Table(TRAINERS_TABLE_NAME)
 trainer_assignments_table = dynamodb.Table(TRAINER_ASSIGNMENTS_TABLE_NAME)
 messages_table = dynamodb.Table(MESSAGES_TABLE_NAME)
+app_state_table = dynamodb.Table(APP_STATE_TABLE_NAME)
+notification_digests_table = dynamodb.Table(NOTIFICATION_DIGESTS_TABLE_NAME)
+saved_meals_table = dynamodb.Table(SAVED_MEALS_TABLE_NAME)
+meal_foods_table = dynamodb.Table(MEAL_FOODS_TABLE_NAME)
+conversation_index_table = dynamodb.Table(CONVERSATION_INDEX_TABLE_NAME)
+rate_limits_table = dynamodb.Table(RATE_LIMITS_TABLE_NAME)
+recent_foods_table = dynamodb.Table(RECENT_FOODS_TABLE_NAME)
+diet_log_archives_table = dynamodb.Table(DIET_LOG_ARCHIVES_TABLE_NAME)
+
+
+def to_attribute_values(values: dict) -> dict:
+    """Serialize plain Python values into low-level DynamoDB attribute values."""
+    return {k: _serializer.serialize(v) for k, v in values.items()}
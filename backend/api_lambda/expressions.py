@@ -0,0 +1,416 @@
+"""
+DynamoDB expression engine shared by the non-DynamoDB storage backends.
+
+Parses and evaluates condition, key condition, update and projection
+expressions (strings or boto3 condition objects) against plain items, the
+way DynamoDB does for the subset of the language this app uses. Used by
+sqlite_store and by the in-memory stand-ins in scripts/local_dynamo.py, so
+domain code behaves the same on every backend.
+"""
+
+import re
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+MISSING = object()
+
+
+def client_error(code, message, operation):
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+def copy_value(value):
+    """Round-trip through the DynamoDB type system (validates types, returns Decimals)."""
+    return _deserializer.deserialize(_serializer.serialize(value))
+
+
+def copy_item(item):
+    return {k: copy_value(v) for k, v in item.items()}
+
+
+# ---------------------------------------------------------------------------
+# Expression parsing / evaluation
+# ---------------------------------------------------------------------------
+
+_TOKEN_RE = re.compile(
+    r"\s*(?:(?P<num>\d+)|(?P<name>#?[A-Za-z_][A-Za-z0-9_]*)|(?P<value>:[A-Za-z0-9_]+)"
+    r"|(?P<op><>|<=|>=|[=<>(),.\[\]+\-]))"
+)
+_KEYWORDS = {"AND", "OR", "NOT", "BETWEEN", "IN", "SET", "ADD", "REMOVE", "DELETE"}
+
+# DynamoDB reserved words that show up as attribute names in this app; using
+# them unescaped is a ValidationException against the real service.
+_RESERVED = set(
+    "ACTION COUNT DATA DATE DAY HOUR ITEM ITEMS KEY KEYS LIMIT MONTH NAME NAMES ORDER "
+    "PERCENT RANGE REGION SOURCE STATE STATUS STREAM TEXT TIME TIMESTAMP TOKEN TOTAL TTL "
+    "TYPE UNIT USER USERS VALUE VALUES WINDOW YEAR ZONE".split()
+)
+
+
+def _tokenize(expression):
+    tokens = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = _TOKEN_RE.match(expression, pos)
+        if not match or match.end() == pos:
+            raise client_error("ValidationException", f"Invalid expression: {expression!r}", "Expression")
+        pos = match.end()
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "name" and text.upper() in _KEYWORDS:
+            tokens.append(("kw", text.upper()))
+        else:
+            tokens.append((kind, text))
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser for condition and update expressions."""
+
+    def __init__(self, expression, names, values):
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset=0):
+        idx = self.pos + offset
+        return self.tokens[idx] if idx < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, text=None):
+        tok = self.peek()
+        if (kind and tok[0] != kind) or (text and tok[1] != text):
+            raise client_error("ValidationException", f"Unexpected token {tok!r}", "Expression")
+        self.pos += 1
+        return tok
+
+    def at_end(self):
+        return self.pos >= len(self.tokens)
+
+    # -- operands -----------------------------------------------------------
+
+    def path(self):
+        kind, text = self.take("name")
+        if not text.startswith("#") and text.upper() in _RESERVED:
+            raise client_error(
+                "ValidationException",
+                f"Attribute name is a reserved keyword; reserved keyword: {text}",
+                "Expression",
+            )
+        segments = [self.names[text] if text.startswith("#") else text]
+        while True:
+            kind, text = self.peek()
+            if text == ".":
+                self.take()
+                _, seg = self.take("name")
+                segments.append(self.names[seg] if seg.startswith("#") else seg)
+            elif text == "[":
+                self.take()
+                _, idx = self.take("num")
+                self.take("op", "]")
+                segments.append(int(idx))
+            else:
+                return ("path", segments)
+
+    def operand(self):
+        kind, text = self.peek()
+        if kind == "value":
+            self.take()
+            return ("value", self.values[text])
+        if kind == "name" and self.peek(1)[1] == "(":
+            func = text.lower()
+            self.take()
+            self.take("op", "(")
+            args = [self.operand()]
+            while self.peek()[1] == ",":
+                self.take()
+                args.append(self.operand())
+            self.take("op", ")")
+            return ("func", func, args)
+        if kind == "name":
+            return self.path()
+        raise client_error("ValidationException", f"Unexpected operand {text!r}", "Expression")
+
+    # -- conditions ---------------------------------------------------------
+
+    def condition(self):
+        node = self.conjunction()
+        while self.peek() == ("kw", "OR"):
+            self.take()
+            node = ("or", node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.peek() == ("kw", "AND"):
+            self.take()
+            node = ("and", node, self.negation())
+        return node
+
+    def negation(self):
+        if self.peek() == ("kw", "NOT"):
+            self.take()
+            return ("not", self.negation())
+        if self.peek()[1] == "(":
+            self.take()
+            node = self.condition()
+            self.take("op", ")")
+            return node
+        left = self.operand()
+        kind, text = self.peek()
+        if kind == "op" and text in ("=", "<>", "<", "<=", ">", ">="):
+            self.take()
+            return ("cmp", text, left, self.operand())
+        if (kind, text) == ("kw", "BETWEEN"):
+            self.take()
+            low = self.operand()
+            self.take("kw", "AND")
+            return ("between", left, low, self.operand())
+        if (kind, text) == ("kw", "IN"):
+            self.take()
+            self.take("op", "(")
+            options = [self.operand()]
+            while self.peek()[1] == ",":
+                self.take()
+                options.append(self.operand())
+            self.take("op", ")")
+            return ("in", left, options)
+        if left[0] == "func":
+            return ("bool", left)
+        raise client_error("ValidationException", f"Incomplete condition near {text!r}", "Expression")
+
+    # -- updates ------------------------------------------------------------
+
+    def update(self):
+        actions = []
+        while not self.at_end():
+            _, clause = self.take("kw")
+            while True:
+                if clause == "SET":
+                    target = self.path()
+                    self.take("op", "=")
+                    value = self.operand()
+                    if self.peek()[1] in ("+", "-"):
+                        _, sign = self.take()
+                        value = ("arith", sign, value, self.operand())
+                    actions.append(("SET", target, value))
+                elif clause == "REMOVE":
+                    actions.append(("REMOVE", self.path(), None))
+                else:
+                    target = self.path()
+                    actions.append((clause, target, self.operand()))
+                if self.peek()[1] != ",":
+                    break
+                self.take()
+        return actions
+
+
+def _get_path(item, segments):
+    current = item
+    for seg in segments:
+        if isinstance(seg, int):
+            if not isinstance(current, list) or seg >= len(current):
+                return MISSING
+            current = current[seg]
+        else:
+            if not isinstance(current, dict) or seg not in current:
+                return MISSING
+            current = current[seg]
+    return current
+
+
+def _set_path(item, segments, value):
+    parent = _get_path(item, segments[:-1]) if len(segments) > 1 else item
+    last = segments[-1]
+    if isinstance(last, int) and isinstance(parent, list):
+        if last >= len(parent):
+            parent.append(value)
+        else:
+            parent[last] = value
+    elif isinstance(last, str) and isinstance(parent, dict):
+        parent[last] = value
+    else:
+        raise client_error(
+            "ValidationException",
+            "The document path provided in the update expression is invalid for update",
+            "UpdateItem",
+        )
+
+
+def _remove_path(item, segments):
+    parent = _get_path(item, segments[:-1]) if len(segments) > 1 else item
+    last = segments[-1]
+    if isinstance(parent, dict):
+        parent.pop(last, None)
+    elif isinstance(parent, list) and isinstance(last, int) and last < len(parent):
+        parent.pop(last)
+
+
+def _eval_operand(node, item):
+    kind = node[0]
+    if kind == "value":
+        return node[1]
+    if kind == "path":
+        return _get_path(item, node[1])
+    if kind == "arith":
+        _, sign, left, right = node
+        lval, rval = _eval_operand(left, item), _eval_operand(right, item)
+        if not isinstance(lval, Decimal) or not isinstance(rval, Decimal):
+            raise client_error("ValidationException", "An operand in the update expression has an incorrect data type", "UpdateItem")
+        return lval + rval if sign == "+" else lval - rval
+    # functions
+    _, func, args = node
+    if func == "if_not_exists":
+        current = _eval_operand(args[0], item)
+        return _eval_operand(args[1], item) if current is MISSING else current
+    if func == "list_append":
+        return list(_eval_operand(args[0], item)) + list(_eval_operand(args[1], item))
+    if func == "size":
+        value = _eval_operand(args[0], item)
+        return MISSING if value is MISSING else Decimal(len(value))
+    if func == "attribute_exists":
+        return _eval_operand(args[0], item) is not MISSING
+    if func == "attribute_not_exists":
+        return _eval_operand(args[0], item) is MISSING
+    if func == "begins_with":
+        value, prefix = _eval_operand(args[0], item), _eval_operand(args[1], item)
+        return isinstance(value, (str, bytes)) and type(value) is type(prefix) and value.startswith(prefix)
+    if func == "contains":
+        value, needle = _eval_operand(args[0], item), _eval_operand(args[1], item)
+        if isinstance(value, str):
+            return isinstance(needle, str) and needle in value
+        return isinstance(value, (list, set)) and needle in value
+    raise client_error("ValidationException", f"Unsupported function {func}", "Expression")
+
+
+def _compare(op, left, right):
+    if left is MISSING or right is MISSING:
+        return op == "<>" and left is not right
+    if isinstance(left, Decimal) != isinstance(right, Decimal):
+        return op == "<>"
+    try:
+        return {
+            "=": left == right,
+            "<>": left != right,
+            "<": left < right,
+            "<=": left <= right,
+            ">": left > right,
+            ">=": left >= right,
+        }[op]
+    except TypeError:
+        return False
+
+
+def _eval_condition(node, item):
+    kind = node[0]
+    if kind == "or":
+        return _eval_condition(node[1], item) or _eval_condition(node[2], item)
+    if kind == "and":
+        return _eval_condition(node[1], item) and _eval_condition(node[2], item)
+    if kind == "not":
+        return not _eval_condition(node[1], item)
+    if kind == "cmp":
+        return _compare(node[1], _eval_operand(node[2], item), _eval_operand(node[3], item))
+    if kind == "between":
+        value = _eval_operand(node[1], item)
+        return _compare(">=", value, _eval_operand(node[2], item)) and _compare("<=", value, _eval_operand(node[3], item))
+    if kind == "in":
+        value = _eval_operand(node[1], item)
+        return any(_compare("=", value, _eval_operand(opt, item)) for opt in node[2])
+    return bool(_eval_operand(node[1], item))
+
+
+def normalize(expression, names, values, is_key_condition=False):
+    """Turn a boto3 condition object into (string, names, values) like boto3 does."""
+    names = dict(names or {})
+    values = dict(values or {})
+    if isinstance(expression, ConditionBase):
+        built = ConditionExpressionBuilder().build_expression(expression, is_key_condition=is_key_condition)
+        names.update(built.attribute_name_placeholders)
+        values.update(built.attribute_value_placeholders)
+        expression = built.condition_expression
+    return expression, names, values
+
+
+def parse_condition(expression, names=None, values=None, is_key_condition=False):
+    """
+    Parse a condition into its syntax tree, e.g. ("and", left, right),
+    ("cmp", "=", ("path", ["userId"]), ("value", "u1")) or
+    ("bool", ("func", "begins_with", [path, value])).
+    """
+    expression, names, values = normalize(expression, names, values, is_key_condition)
+    values = {k: copy_value(v) for k, v in values.items()}
+    return _Parser(expression, names, values).condition()
+
+
+def evaluate_parsed(node, item):
+    """Evaluate a tree from parse_condition against an item."""
+    return _eval_condition(node, item if item is not None else {})
+
+
+def evaluate_condition(expression, item, names=None, values=None, is_key_condition=False):
+    """Evaluate a condition (string or boto3 condition object) against an item."""
+    if expression is None:
+        return True
+    return evaluate_parsed(parse_condition(expression, names, values, is_key_condition), item)
+
+
+def apply_update(item, expression, names=None, values=None):
+    """Apply an UpdateExpression to `item` in place; return the top-level names touched."""
+    values = {k: copy_value(v) for k, v in (values or {}).items()}
+    actions = _Parser(expression, names, values).update()
+    original = copy_item(item)
+    touched = set()
+    for clause, target, operand in actions:
+        segments = target[1]
+        touched.add(segments[0])
+        if clause == "SET":
+            _set_path(item, segments, copy_value(_eval_operand(operand, original)))
+        elif clause == "REMOVE":
+            _remove_path(item, segments)
+        elif clause == "ADD":
+            delta = _eval_operand(operand, original)
+            current = _get_path(item, segments)
+            if current is MISSING:
+                _set_path(item, segments, delta)
+            elif isinstance(current, set):
+                _set_path(item, segments, current | delta)
+            else:
+                _set_path(item, segments, current + delta)
+        elif clause == "DELETE":
+            current = _get_path(item, segments)
+            if isinstance(current, set):
+                remaining = current - _eval_operand(operand, original)
+                if remaining:
+                    _set_path(item, segments, remaining)
+                else:
+                    _remove_path(item, segments)
+    return touched
+
+
+def project(item, expression, names=None):
+    """Apply a ProjectionExpression to an item."""
+    if not expression:
+        return item
+    result = {}
+    for raw in expression.split(","):
+        parser = _Parser(raw, names, {})
+        segments = parser.path()[1]
+        value = _get_path(item, segments)
+        if value is MISSING:
+            continue
+        if len(segments) == 1:
+            result[segments[0]] = value
+        else:
+            # Rebuild the nested shape for nested projections
+            cursor = result
+            for seg in segments[:-1]:
+                cursor = cursor.setdefault(seg, {})
+            cursor[segments[-1]] = value
+    return result
@@ -0,0 +1,228 @@
+"""
+Prebuilt, memory-mapped food search index.
+
+scripts/build_food_index.py compiles the Foods table into a single binary
+file that ships inside the Lambda package. The file is opened with mmap,
+so a cold container only pages in what a query touches instead of
+scanning the table.
+
+Layout (little-endian, FORMAT_VERSION):
+  header     magic, format version, catalog version, counts, section offsets
+  foods      per food: foodId, name, defaultUnit as (offset, length) into strings
+  nutrients  one float64 column per NUMERIC_FIELDS entry, one value per food
+  tokens     sorted; per token: (offset, length) into strings, postings offset, count
+  postings   uint32 food ordinals, ascending
+  strings    UTF-8 blob
+Foods are stored in name order, so ascending postings are already name-sorted.
+
+This module is stdlib-only so the build script can import it.
+"""
+
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+FOOD_INDEX_PATH = os.environ.get(
+    "FOOD_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "food_index.bin")
+)
+# AppState stamp bumped on every catalog change; baked into the artifact at build time
+FOOD_CATALOG_VERSION_KEY = "food-catalog-version"
+
+MAGIC = b"FIDX"
+FORMAT_VERSION = 1
+NUMERIC_FIELDS = ("gramsPerUnit", "caloriesPerUnit", "proteinPerUnit", "carbsPerUnit", "fatPerUnit")
+
+# magic, format version, reserved, catalog version, foods, tokens,
+# then offsets of the foods, nutrients, tokens, postings and strings sections
+_HEADER = struct.Struct("<4sHHQIIIIIII")
+_FOOD = struct.Struct("<IHIHIH")
+_TOKEN = struct.Struct("<IHII")
+_POSTING = struct.Struct("<I")
+_NUMBER = struct.Struct("<d")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+_open_lock = threading.Lock()
+_opened = {}  # path -> FoodIndex or None (missing/unreadable)
+
+
+def tokenize(text: str):
+    """Lowercase alphanumeric words; foodIds like chicken_breast split too."""
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+def _number(value: float) -> Decimal:
+    # Match what DynamoDB hands back: whole numbers without a trailing .0
+    if value.is_integer():
+        return Decimal(int(value))
+    return Decimal(repr(value))
+
+
+def write_index(path: str, foods, catalog_version: int):
+    """Compile Foods items into an index file at `path` (written atomically)."""
+    foods = sorted(foods, key=lambda f: (str(f.get("name", "")).lower(), str(f.get("foodId", ""))))
+    strings = bytearray()
+
+    def intern(text):
+        data = str(text or "").encode("utf-8")
+        offset = len(strings)
+        strings.extend(data)
+        return offset, len(data)
+
+    food_rows = bytearray()
+    postings_by_token = {}
+    for ordinal, food in enumerate(foods):
+        id_ref = intern(food.get("foodId"))
+        name_ref = intern(food.get("name"))
+        unit_ref = intern(food.get("defaultUnit"))
+        food_rows.extend(_FOOD.pack(*id_ref, *name_ref, *unit_ref))
+        for token in set(tokenize(food.get("name", "")) + tokenize(food.get("foodId", ""))):
+            postings_by_token.setdefault(token, []).append(ordinal)
+
+    nutrients = bytearray()
+    for field in NUMERIC_FIELDS:
+        for food in foods:
+            nutrients.extend(_NUMBER.pack(float(food.get(field) or 0)))
+
+    token_rows = bytearray()
+    postings = bytearray()
+    for token in sorted(postings_by_token):
+        ordinals = postings_by_token[token]
+        token_rows.extend(_TOKEN.pack(*intern(token), len(postings) // _POSTING.size, len(ordinals)))
+        postings.extend(struct.pack(f"<{len(ordinals)}I", *ordinals))
+
+    foods_off = _HEADER.size
+    nutrients_off = foods_off + len(food_rows)
+    tokens_off = nutrients_off + len(nutrients)
+    postings_off = tokens_off + len(token_rows)
+    strings_off = postings_off + len(postings)
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, 0, int(catalog_version), len(foods), len(postings_by_token),
+        foods_off, nutrients_off, tokens_off, postings_off, strings_off,
+    )
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as fh:
+        for section in (header, food_rows, nutrients, token_rows, postings, strings):
+            fh.write(section)
+    os.replace(tmp_path, path)
+    return {"foods": len(foods), "tokens": len(postings_by_token), "bytes": strings_off + len(strings)}
+
+
+class FoodIndex:
+    """Read-only view over an index file; every lookup reads straight from the mapping."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, format_version, _, self.catalog_version, self.food_count, self.token_count,
+         self._foods_off, self._nutrients_off, self._tokens_off, self._postings_off,
+         self._strings_off) = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"unsupported food index format {magic!r} v{format_version}")
+
+    def _string(self, offset: int, length: int) -> bytes:
+        start = self._strings_off + offset
+        return self._mm[start:start + length]
+
+    def _token(self, i: int):
+        tok_off, tok_len, post_idx, post_count = _TOKEN.unpack_from(self._mm, self._tokens_off + i * _TOKEN.size)
+        return self._string(tok_off, tok_len), post_idx, post_count
+
+    def _names(self, ordinal: int):
+        id_off, id_len, name_off, name_len, _, _ = _FOOD.unpack_from(self._mm, self._foods_off + ordinal * _FOOD.size)
+        return self._string(id_off, id_len).decode("utf-8"), self._string(name_off, name_len).decode("utf-8")
+
+    def food(self, ordinal: int) -> dict:
+        """Rebuild the Foods item for an ordinal."""
+        row = _FOOD.unpack_from(self._mm, self._foods_off + ordinal * _FOOD.size)
+        item = {
+            "foodId": self._string(row[0], row[1]).decode("utf-8"),
+            "name": self._string(row[2], row[3]).decode("utf-8"),
+        }
+        if row[5]:
+            item["defaultUnit"] = self._string(row[4], row[5]).decode("utf-8")
+        for col, field in enumerate(NUMERIC_FIELDS):
+            offset = self._nutrients_off + (col * self.food_count + ordinal) * _NUMBER.size
+            item[field] = _number(_NUMBER.unpack_from(self._mm, offset)[0])
+        return item
+
+    def _prefix_postings(self, term: bytes) -> set:
+        """Ordinals of foods with any token starting with `term` (binary search + scan)."""
+        lo, hi = 0, self.token_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._token(mid)[0] < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        ordinals = set()
+        for i in range(lo, self.token_count):
+            token, post_idx, post_count = self._token(i)
+            if not token.startswith(term):
+                break
+            start = self._postings_off + post_idx * _POSTING.size
+            ordinals.update(struct.unpack_from(f"<{post_count}I", self._mm, start))
+        return ordinals
+
+    def search(self, query: str, limit: int):
+        """
+        Same filtering and ordering as the table scan in foods.search_foods,
+        when the index can prove the answer. Postings only cover matches that
+        start at a word, so only foods whose name or foodId starts with the
+        query are certain to be found; those rank first in the scan too. When
+        there are at least `limit` of them the page is exact. Otherwise (or
+        when the query has no indexable words) returns None, so the caller
+        falls back to the scan for mid-word matches like "ice" in "rice".
+        """
+        q = query.lower()
+        terms = tokenize(q)
+        if not terms:
+            return None
+
+        candidates = None
+        for term in terms:
+            ordinals = self._prefix_postings(term.encode("utf-8"))
+            candidates = ordinals if candidates is None else candidates & ordinals
+            if not candidates:
+                return None
+
+        starts = []
+        for ordinal in sorted(candidates):
+            food_id, name = self._names(ordinal)
+            if name.lower().startswith(q) or food_id.lower().startswith(q):
+                starts.append(ordinal)
+                if len(starts) == limit:
+                    return [self.food(o) for o in starts]
+        return None
+
+    def catalog_entries(self):
+        """(foodId, name, foodId.lower(), name.lower()) for every food, for autocomplete."""
+        entries = []
+        for ordinal in range(self.food_count):
+            food_id, name = self._names(ordinal)
+            entries.append((food_id, name, food_id.lower(), name.lower()))
+        return entries
+
+
+def open_index(path: str = FOOD_INDEX_PATH):
+    """The index at `path`, opened once per container; None if missing or unreadable."""
+    with _open_lock:
+        if path not in _opened:
+            try:
+                _opened[path] = FoodIndex(path)
+                logger.info("Opened food index %s (catalog version %s, %s foods)",
+                            path, _opened[path].catalog_version, _opened[path].food_count)
+            except FileNotFoundError:
+                _opened[path] = None
+            except (OSError, ValueError, struct.error) as exc:
+                logger.warning("Ignoring unreadable food index %s: %s", path, exc)
+                _opened[path] = None
+        return _opened[path]
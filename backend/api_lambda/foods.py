@@ -1,13 +1,95 @@
-from dynamodb_client import foods_table
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+import os
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+import metrics
+from dynamodb_client import foods_table, app_state_table
+from food_index import open_index, FOOD_CATALOG_VERSION_KEY
+from meals import recompute_meals_for_food
 import logging
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Autocomplete tuning (per container)
+FOOD_SUGGEST_LIMIT = int(os.environ.get("FOOD_SUGGEST_LIMIT", "10"))
+FOOD_SUGGEST_CACHE_SIZE = int(os.environ.get("FOOD_SUGGEST_CACHE_SIZE", "256"))
+FOOD_SUGGEST_MAX_CANDIDATES = int(os.environ.get("FOOD_SUGGEST_MAX_CANDIDATES", "200"))
+FOOD_CATALOG_TTL_SECONDS = int(os.environ.get("FOOD_CATALOG_TTL_SECONDS", "300"))
+# How often the packaged index is checked against the live catalog version
+FOOD_INDEX_VERSION_CHECK_SECONDS = int(os.environ.get("FOOD_INDEX_VERSION_CHECK_SECONDS", "60"))
+
+_catalog_lock = threading.Lock()
+_catalog = None  # list of (foodId, name, foodId.lower(), name.lower())
+_catalog_loaded_at = 0.0
+
+# prefix -> (candidates, complete); candidates are catalog tuples in ranked order
+_suggest_cache = OrderedDict()
+
+_live_version = None
+_live_version_checked_at = 0.0
+
+# Attributes PUT /foods may change; the macro ones feed saved meals
+FOOD_NUMERIC_FIELDS = ("gramsPerUnit", "caloriesPerUnit", "proteinPerUnit", "carbsPerUnit", "fatPerUnit")
+FOOD_UPDATABLE_FIELDS = ("name", "defaultUnit") + FOOD_NUMERIC_FIELDS
+
+
+def _read_catalog_version():
+    resp = app_state_table.get_item(
+        Key={"stateKey": FOOD_CATALOG_VERSION_KEY},
+        ProjectionExpression="#v",
+        ExpressionAttributeNames={"#v": "version"},
+    )
+    return int(resp.get("Item", {}).get("version", 0))
+
+
+def _bump_catalog_version():
+    """Mark every packaged index built before now as stale."""
+    global _live_version
+    resp = app_state_table.update_item(
+        Key={"stateKey": FOOD_CATALOG_VERSION_KEY},
+        UpdateExpression="ADD #v :one",
+        ExpressionAttributeNames={"#v": "version"},
+        ExpressionAttributeValues={":one": 1},
+        ReturnValues="UPDATED_NEW",
+    )
+    with _catalog_lock:
+        _live_version = int(resp["Attributes"]["version"])
+
+
+def _current_index():
+    """The packaged food index, or None if there is none or the catalog has moved on."""
+    global _live_version, _live_version_checked_at
+
+    index = open_index()
+    if index is None:
+        return None
+
+    now = time.monotonic()
+    with _catalog_lock:
+        due = _live_version is None or now - _live_version_checked_at >= FOOD_INDEX_VERSION_CHECK_SECONDS
+        if due:
+            _live_version_checked_at = now
+    if due:
+        version = _read_catalog_version()
+        with _catalog_lock:
+            _live_version = version
+
+    if index.catalog_version != _live_version:
+        metrics.increment("food_index.stale")
+        return None
+    return index
+
+
 def search_foods(query: str, limit: int = 10):
     """
     Simple search over Foods table.
-    - Scans all items (we only have ~20, so this is fine)
+    - Served from the packaged index when it matches the live catalog
+    - Otherwise scans all items
     - Case-insensitive substring match on 'name' and 'foodId'
     - Returns up to `limit` results
     """
@@ -17,6 +99,15 @@ def search_foods(query: str, limit: int = 10):
 
     q = query.lower()
 
+    index = _current_index()
+    if index is not None:
+        results = index.search(q, limit)
+        if results is not None:
+            metrics.increment("food_index.hit")
+            return results
+        # Mid-word matches (e.g. "ice" in "rice") need the scan
+        metrics.increment("food_index.fallback")
+
     # Scan the table (for small table, this is totally fine)
     resp = foods_table.scan()
     items = resp.get("Items", [])
@@ -38,8 +129,177 @@ def search_foods(query: str, limit: int = 10):
         starts_id = food_id.startswith(q)
         # sort: startswith gets priority, then by name
         return (not (starts_name or starts_id), name)
-    
+
     logger.info(f"Matched {len(matched)} items for query={query!r}")
     matched.sort(key=sort_key)
 
     return matched[:limit]
+
+
+def _load_catalog():
+    """
+    Return the per-container (foodId, name) catalog, refreshing it after the TTL.
+    Taken from the packaged index when it is current; otherwise only the two
+    attributes autocomplete needs are read from the table.
+    """
+    global _catalog, _catalog_loaded_at
+
+    with _catalog_lock:
+        if _catalog is not None and time.monotonic() - _catalog_loaded_at < FOOD_CATALOG_TTL_SECONDS:
+            return _catalog
+
+    # May read the version stamp, so not under the lock
+    index = _current_index()
+
+    with _catalog_lock:
+        # Another thread may have reloaded meanwhile
+        if _catalog is not None and time.monotonic() - _catalog_loaded_at < FOOD_CATALOG_TTL_SECONDS:
+            return _catalog
+
+        if index is not None:
+            entries = index.catalog_entries()
+        else:
+            scan_kwargs = {
+                "ProjectionExpression": "foodId, #n",
+                "ExpressionAttributeNames": {"#n": "name"},
+            }
+            entries = []
+            while True:
+                resp = foods_table.scan(**scan_kwargs)
+                for item in resp.get("Items", []):
+                    food_id = str(item.get("foodId", ""))
+                    name = str(item.get("name", ""))
+                    entries.append((food_id, name, food_id.lower(), name.lower()))
+                last_key = resp.get("LastEvaluatedKey")
+                if not last_key:
+                    break
+                scan_kwargs["ExclusiveStartKey"] = last_key
+
+        _catalog = entries
+        _catalog_loaded_at = time.monotonic()
+        # Cached prefixes were ranked against the old catalog
+        _suggest_cache.clear()
+        logger.info("Loaded food catalog for autocomplete: %s entries (from %s)",
+                    len(entries), "packaged index" if index is not None else "Foods table")
+        return _catalog
+
+
+def _rank(entries, q: str):
+    """Filter entries matching q and order them like search_foods does."""
+    matched = [e for e in entries if q in e[3] or q in e[2]]
+    matched.sort(key=lambda e: (not (e[3].startswith(q) or e[2].startswith(q)), e[3]))
+    return matched
+
+
+def _suggest_candidates(q: str):
+    """
+    Return (candidates, complete) for prefix q from the LRU cache.
+    On a miss, narrow the longest cached shorter prefix instead of the full
+    catalog; a substring match for q always matches every prefix of q.
+    """
+    catalog = _load_catalog()
+
+    with _catalog_lock:
+        cached = _suggest_cache.get(q)
+        if cached is not None:
+            _suggest_cache.move_to_end(q)
+            return cached
+
+        source = catalog
+        for cut in range(len(q) - 1, 0, -1):
+            parent = _suggest_cache.get(q[:cut])
+            # A truncated parent may be missing matches for q, so skip it
+            if parent is not None and parent[1]:
+                source = parent[0]
+                break
+
+    matched = _rank(source, q)
+    complete = len(matched) <= FOOD_SUGGEST_MAX_CANDIDATES
+    entry = (matched[:FOOD_SUGGEST_MAX_CANDIDATES], complete)
+
+    with _catalog_lock:
+        _suggest_cache[q] = entry
+        _suggest_cache.move_to_end(q)
+        while len(_suggest_cache) > FOOD_SUGGEST_CACHE_SIZE:
+            _suggest_cache.popitem(last=False)
+    return entry
+
+
+def suggest_foods(prefix: str, limit: int = FOOD_SUGGEST_LIMIT):
+    """
+    Autocomplete over the Foods catalog for the food picker.
+    - Same matching and ordering as search_foods
+    - Returns only foodId and name, up to `limit` results
+    - Per-prefix results are kept in a bounded LRU cache
+    """
+
+    if not prefix:
+        return []
+
+    q = prefix.strip().lower()
+    if not q:
+        return []
+
+    candidates, _ = _suggest_candidates(q)
+    return [{"foodId": e[0], "name": e[1]} for e in candidates[:limit]]
+
+
+def _reset_catalog():
+    """Force the next autocomplete call to reload the catalog (and drop cached prefixes)."""
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
+        _suggest_cache.clear()
+
+
+def update_food(body: dict):
+    """
+    Update a Foods item.
+    Required fields: foodId, plus at least one of FOOD_UPDATABLE_FIELDS.
+    Saved meals containing the food get their stored macros recomputed.
+    """
+    food_id = body.get("foodId")
+    if not food_id:
+        return 400, {"error": "foodId is required"}
+
+    changes = {k: body[k] for k in FOOD_UPDATABLE_FIELDS if k in body}
+    if not changes:
+        return 400, {"error": f"nothing to update; allowed fields: {', '.join(FOOD_UPDATABLE_FIELDS)}"}
+    for k in FOOD_NUMERIC_FIELDS:
+        if k in changes:
+            try:
+                changes[k] = Decimal(str(changes[k]))
+            except (InvalidOperation, ValueError):
+                return 400, {"error": f"{k} must be a number"}
+            if not changes[k].is_finite():
+                return 400, {"error": f"{k} must be a finite number"}
+            if changes[k] < 0 or (k == "gramsPerUnit" and changes[k] == 0):
+                return 400, {"error": f"{k} must be positive"}
+
+    names = {f"#f{idx}": k for idx, k in enumerate(changes)}
+    values = {f":v{idx}": v for idx, v in enumerate(changes.values())}
+    try:
+        resp = foods_table.update_item(
+            Key={"foodId": food_id},
+            UpdateExpression="SET " + ", ".join(f"#f{idx} = :v{idx}" for idx in range(len(changes))),
+            ConditionExpression="attribute_exists(foodId)",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_NEW",
+        )
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return 404, {"error": f"Food with id '{food_id}' not found"}
+        raise
+    food = resp["Attributes"]
+
+    # Any packaged index now differs from the table
+    _bump_catalog_version()
+    if "name" in changes:
+        _reset_catalog()
+    meals_updated = 0
+    if any(k in changes for k in FOOD_NUMERIC_FIELDS):
+        meals_updated = recompute_meals_for_food(food)
+
+    logger.info("Food updated: food_id=%s fields=%s meals_updated=%s", food_id, sorted(changes), meals_updated)
+    return 200, {"food": food, "mealsUpdated": meals_updated}
@@ -1,12 +1,30 @@
 import json
 import logging
-from utils import build_response, parse_body
-from users import create_user
-from diet_logs import log_diet_entry, get_today_logs
+from datetime import date, timedelta
+import metrics
+import deadlines
+import profiling
+import rate_limit
+from utils import build_response, parse_body, parse_fields, compress_response, get_today_iso_date
+from users import create_user, update_user
+from onboarding import bulk_onboard
+from diet_logs import (
+    log_diet_entry,
+    update_diet_log,
+    delete_diet_log,
+    get_today_logs,
+    get_log_history,
+    DIET_LOG_FIELDS,
+    MAX_HISTORY_DAYS,
+)
 from summaries import get_today_summary
-from foods import search_foods
-from trainers import create_trainer,assign_trainer, unassign_trainer,get_trainer_clients
-from chat import send_message,get_conversation
+from trends import get_summary_trends, MAX_TREND_DAYS, MAX_TREND_WINDOW
+from foods import search_foods, suggest_foods, update_food
+from recent_foods import get_recent_foods, RECENT_FOODS_DEFAULT_LIMIT, RECENT_FOODS_MAX_ENTRIES
+from meals import create_meal, list_meals, log_meal
+from trainers import create_trainer,assign_trainer, unassign_trainer,get_trainer_clients, TRAINER_CLIENT_FIELDS
+from chat import send_message,get_conversation, get_trainer_inbox, mark_conversation_read, decode_cursor, MESSAGE_FIELDS
+from dashboard import get_today_dashboard
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -15,7 +33,8 @@ logger.setLevel(logging.INFO)
 def lambda_handler(event, context):
     """
     Entry point for API Gateway HTTP API (v2) -> Lambda.
-    Routes based on HTTP method + path.
+    Routes based on HTTP method + path, within a deadline derived from the
+    remaining invocation time.
     """
     # Debug log (optional, but useful at first)
     # logger.debug("Event: %s", json.dumps(event))
@@ -24,125 +43,344 @@ def lambda_handler(event, context):
     path = http.get("path") or event.get("rawPath")  # depending on API GW config
     logger.info("Incoming request: method=%s path=%s", method, path)
 
+    token = deadlines.start(context)
     try:
-        # Respond to CORS preflight quickly
-        if method == "OPTIONS":
-            return build_response(204, {})
-
-        # Health check
-        if method == "GET" and path == "/health":
-            logger.debug("Health check invoked.")
-            return build_response(200, {"status": "ok", "service": "diet-api", "message": "Healthy"})
-
-        # Create user
-        if method == "POST" and path == "/users":
-            body = parse_body(event)
-            role = body.get("role")
-            if not role:
-                logger.warning("User creation failed validation: missing role")
-                return build_response(400, {"error": "role ('user' or 'trainer') is required"})
-
-            if role == "user":
-                status, payload = create_user(body)
-            elif role == "trainer":
-                status, payload = create_trainer(body)
-            else:
-                logger.warning("User creation failed validation: role=%s", role)
-                return build_response(400, {"error": "valid role ('user' or 'trainer') are required"})
-
-            logger.info("Create user completed with status=%s", status)
-            return build_response(status, payload)
-
-        # Log diet entry
-        if method == "POST" and path == "/diet-logs":
-            body = parse_body(event)
-            status, payload = log_diet_entry(body)
-            logger.info("Log diet entry completed with status=%s", status)
-            return build_response(status, payload)
-
-        # Get today's logs
-        if method == "GET" and path == "/diet-logs/today":
-            params = event.get("queryStringParameters") or {}
-            user_id = params.get("userId")
-            if not user_id:
-                logger.warning("Missing userId when fetching today's logs.")
-                return build_response(400, {"error": "userId query parameter is required"})
-
-            logger.info("Fetching today's logs for user_id=%s", user_id)
-            items = get_today_logs(user_id)
-            return build_response(200, {"items": items})
-
-        # Get today's summary (macro bar)
-        if method == "GET" and path == "/summary/today":
-            params = event.get("queryStringParameters") or {}
-            user_id = params.get("userId")
-            if not user_id:
-                logger.warning("Missing userId when fetching today's summary.")
-                return build_response(400, {"error": "userId query parameter is required"})
-
-            logger.info("Fetching today's summary for user_id=%s", user_id)
-            summary = get_today_summary(user_id)
-            return build_response(200, {"summary": summary})
-        
-        # Get foods search results
-        if method == "GET" and path == "/foods/search":
-            params = event.get("queryStringParameters") or {}
-            query = params.get("query") or params.get("q")
-            if not query:
-                return build_response(400, {"error": "query parameter is required"})
-
-            logger.info("Searching foods with query=%s", query)
-            results = search_foods(query)
-            return build_response(200, {"items": results})
-        
-        # Assign trainer to user (manual or auto)
-        if method == "POST" and path == "/trainer/assign":
-            body = parse_body(event)
-            status, payload = assign_trainer(body)
-            logger.info("Assign trainer completed with status=%s for user_id=%s trainer_id=%s", status, body.get("userId"), body.get("trainerId"))
-            return build_response(status, payload)
-
-        # Unassign trainer
-        if method == "POST" and path == "/trainer/unassign":
-            body = parse_body(event)
-            status, payload = unassign_trainer(body)
-            logger.info("Unassign trainer completed with status=%s for user_id=%s", status, body.get("userId"))
-            return build_response(status, payload)
-
-        # Get trainer's clients
-        if method == "GET" and path == "/trainer/clients":
-            params = event.get("queryStringParameters") or {}
-            trainer_id = params.get("trainerId")
-            if not trainer_id:
-                return build_response(400, {"error": "trainerId query parameter is required"})
-            logger.info("Fetching trainer clients for trainer_id=%s", trainer_id)
-            clients = get_trainer_clients(trainer_id)
-            return build_response(200, {"clients": clients})
-
-        # Send message between user & trainer
-        if method == "POST" and path == "/messages":
-            body = parse_body(event)
-            status, payload = send_message(body)
-            logger.info("Send message completed with status=%s for user_id=%s trainer_id=%s", status, body.get("userId"), body.get("trainerId"))
-            return build_response(status, payload)
-
-        # Get conversation messages
-        if method == "GET" and path == "/messages":
-            params = event.get("queryStringParameters") or {}
-            user_id = params.get("userId")
-            trainer_id = params.get("trainerId")
-            if not user_id or not trainer_id:
-                return build_response(400, {"error": "userId and trainerId are required"})
-            logger.info("Fetching conversation for user_id=%s trainer_id=%s", user_id, trainer_id)
-            conv = get_conversation(user_id, trainer_id)
-            return build_response(200, {"messages": conv})
-
-
-
-        # Not found
-        logger.warning("No route for %s %s", method, path)
-        return build_response(404, {"error": f"No route for {method} {path}"})
+        if method != "OPTIONS" and not deadlines.has_budget(deadlines.MIN_REQUEST_BUDGET_MS):
+            logger.warning("Shedding %s %s: invocation budget already spent", method, path)
+            metrics.increment("requests.shed")
+            return _service_unavailable()
+
+        retry_after = rate_limit.check(event, method, path)
+        if retry_after is not None:
+            return _too_many_requests(retry_after)
+
+        with profiling.maybe_profile(event, f"{method} {path}"):
+            response = _route(event, method, path)
+        return compress_response(event, response)
+
+    except deadlines.DeadlineExceeded as exc:
+        logger.warning("Deadline exceeded for %s %s: %s", method, path, exc)
+        metrics.increment("requests.shed")
+        return _service_unavailable()
 
     except Exception as exc:
         logger.exception("Unhandled error for %s %s", method, path)
         return build_response(500, {"error": "Internal server error", "detail": str(exc)})
+    finally:
+        deadlines.reset(token)
+        metrics.maybe_emit()
+
+
+def _service_unavailable():
+    """Fast 503 returned instead of letting the Lambda hit its hard timeout."""
+    return build_response(
+        503,
+        {"error": "Service temporarily unavailable; please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
+def _too_many_requests(retry_after: int):
+    """429 for a caller over its rate limit for this route."""
+    return build_response(
+        429,
+        {"error": "Too many requests; please slow down"},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+def _route(event, method, path):
+    """Dispatch a request to the matching domain module."""
+    # Respond to CORS preflight quickly
+    if method == "OPTIONS":
+        return build_response(204, {})
+
+    # Health check
+    if method == "GET" and path == "/health":
+        logger.debug("Health check invoked.")
+        return build_response(200, {"status": "ok", "service": "diet-api", "message": "Healthy"})
+
+    # Create user
+    if method == "POST" and path == "/users":
+        body = parse_body(event)
+        role = body.get("role")
+        if not role:
+            logger.warning("User creation failed validation: missing role")
+            return build_response(400, {"error": "role ('user' or 'trainer') is required"})
+
+        if role == "user":
+            status, payload = create_user(body)
+        elif role == "trainer":
+            status, payload = create_trainer(body)
+        else:
+            logger.warning("User creation failed validation: role=%s", role)
+            return build_response(400, {"error": "valid role ('user' or 'trainer') are required"})
+
+        logger.info("Create user completed with status=%s", status)
+        return build_response(status, payload)
+
+    # Update user profile (recomputes macro targets)
+    if method == "PUT" and path == "/users":
+        body = parse_body(event)
+        status, payload = update_user(body)
+        logger.info("Update user completed with status=%s", status)
+        return build_response(status, payload)
+
+    # Bulk onboarding: create a cohort and auto-assign trainers in one pass
+    if method == "POST" and path == "/users/bulk":
+        body = parse_body(event)
+        status, payload = bulk_onboard(body)
+        logger.info("Bulk onboarding completed with status=%s", status)
+        return build_response(status, payload)
+
+    # Log diet entry
+    if method == "POST" and path == "/diet-logs":
+        body = parse_body(event)
+        status, payload = log_diet_entry(body)
+        logger.info("Log diet entry completed with status=%s", status)
+        return build_response(status, payload)
+
+    # Correct a logged entry
+    if method == "PUT" and path == "/diet-logs":
+        body = parse_body(event)
+        status, payload = update_diet_log(body)
+        logger.info("Update diet log completed with status=%s", status)
+        return build_response(status, payload)
+
+    # Delete a logged entry
+    if method == "DELETE" and path == "/diet-logs":
+        params = event.get("queryStringParameters") or {}
+        status, payload = delete_diet_log(params.get("userId"), params.get("logTimestamp"))
+        logger.info("Delete diet log completed with status=%s", status)
+        return build_response(status, payload)
+
+    # Get today's logs
+    if method == "GET" and path == "/diet-logs/today":
+        params = event.get("queryStringParameters") or {}
+        user_id = params.get("userId")
+        if not user_id:
+            logger.warning("Missing userId when fetching today's logs.")
+            return build_response(400, {"error": "userId query parameter is required"})
+
+        fields, error = parse_fields(params.get("fields"), DIET_LOG_FIELDS)
+        if error:
+            return build_response(400, {"error": error})
+
+        logger.info("Fetching today's logs for user_id=%s", user_id)
+        items = get_today_logs(user_id, fields=fields)
+        return build_response(200, {"items": items})
+
+    # Logs over a date range, archived months included
+    if method == "GET" and path == "/diet-logs/history":
+        params = event.get("queryStringParameters") or {}
+        user_id = params.get("userId")
+        if not user_id:
+            return build_response(400, {"error": "userId query parameter is required"})
+        try:
+            end = date.fromisoformat(params.get("to") or get_today_iso_date())
+            start = date.fromisoformat(params["from"]) if params.get("from") else end - timedelta(days=29)
+        except ValueError:
+            return build_response(400, {"error": "from and to must be dates (YYYY-MM-DD)"})
+        if not 0 <= (end - start).days < MAX_HISTORY_DAYS:
+            return build_response(400, {"error": f"from must be on or before to, at most {MAX_HISTORY_DAYS} days apart"})
+
+        fields, error = parse_fields(params.get("fields"), DIET_LOG_FIELDS)
+        if error:
+            return build_response(400, {"error": error})
+
+        logger.info("Fetching log history for user_id=%s from %s to %s", user_id, start, end)
+        items = get_log_history(user_id, start.isoformat(), end.isoformat(), fields=fields)
+        return build_response(200, {"from": start.isoformat(), "to": end.isoformat(), "items": items})
+
+    # Get today's summary (macro bar)
+    if method == "GET" and path == "/summary/today":
+        params = event.get("queryStringParameters") or {}
+        user_id = params.get("userId")
+        if not user_id:
+            logger.warning("Missing userId when fetching today's summary.")
+            return build_response(400, {"error": "userId query parameter is required"})
+
+        logger.info("Fetching today's summary for user_id=%s", user_id)
+        summary = get_today_summary(user_id)
+        return build_response(200, {"summary": summary})
+    
+    # Client home screen: summary, logs and latest messages in one call
+    if method == "GET" and path == "/dashboard/today":
+        params = event.get("queryStringParameters") or {}
+        user_id = params.get("userId")
+        if not user_id:
+            return build_response(400, {"error": "userId query parameter is required"})
+
+        logger.info("Fetching today's dashboard for user_id=%s", user_id)
+        dashboard = get_today_dashboard(user_id)
+        return build_response(200, dashboard)
+
+    # Rolling trend analytics over daily summaries
+    if method == "GET" and path == "/summary/trends":
+        params = event.get("queryStringParameters") or {}
+        user_id = params.get("userId")
+        if not user_id:
+            return build_response(400, {"error": "userId query parameter is required"})
+        try:
+            window = int(params.get("window") or 7)
+            days = int(params.get("days") or 30)
+        except ValueError:
+            return build_response(400, {"error": "window and days must be integers"})
+        if not 1 <= window <= MAX_TREND_WINDOW or not 1 <= days <= MAX_TREND_DAYS:
+            return build_response(
+                400,
+                {"error": f"window must be 1-{MAX_TREND_WINDOW} and days 1-{MAX_TREND_DAYS}"},
+            )
+
+        logger.info("Fetching summary trends for user_id=%s window=%s days=%s", user_id, window, days)
+        trends = get_summary_trends(user_id, window=window, days=days)
+        return build_response(200, {"trends": trends})
+
+    # Get foods search results
+    if method == "GET" and path == "/foods/search":
+        params = event.get("queryStringParameters") or {}
+        query = params.get("query") or params.get("q")
+        if not query:
+            return build_response(400, {"error": "query parameter is required"})
+
+        logger.info("Searching foods with query=%s", query)
+        results = search_foods(query)
+        return build_response(200, {"items": results})
+
+    # Autocomplete for the food picker (id + name only)
+    if method == "GET" and path == "/foods/suggest":
+        params = event.get("queryStringParameters") or {}
+        prefix = params.get("prefix")
+        if not prefix:
+            return build_response(400, {"error": "prefix parameter is required"})
+
+        logger.debug("Suggesting foods for prefix=%s", prefix)
+        results = suggest_foods(prefix)
+        return build_response(200, {"items": results})
+
+    # The user's recent and frequent foods, for one-tap re-logging
+    if method == "GET" and path == "/foods/recent":
+        params = event.get("queryStringParameters") or {}
+        user_id = params.get("userId")
+        if not user_id:
+            return build_response(400, {"error": "userId query parameter is required"})
+        try:
+            limit = int(params.get("limit") or RECENT_FOODS_DEFAULT_LIMIT)
+        except ValueError:
+            return build_response(400, {"error": "limit must be an integer"})
+        if not 1 <= limit <= RECENT_FOODS_MAX_ENTRIES:
+            return build_response(400, {"error": f"limit must be 1-{RECENT_FOODS_MAX_ENTRIES}"})
+
+        logger.debug("Fetching recent foods for user_id=%s", user_id)
+        results = get_recent_foods(user_id, limit=limit)
+        return build_response(200, {"items": results})
+
+    # Update a food (recomputes saved meals that contain it)
+    if method == "PUT" and path == "/foods":
+        body = parse_body(event)
+        status, payload = update_food(body)
+        logger.info("Update food completed with status=%s for food_id=%s", status, body.get("foodId"))
+        return build_response(status, payload)
+
+    # Save a meal / recipe
+    if method == "POST" and path == "/meals":
+        body = parse_body(event)
+        status, payload = create_meal(body)
+        logger.info("Create meal completed with status=%s", status)
+        return build_response(status, payload)
+
+    # List a user's saved meals
+    if method == "GET" and path == "/meals":
+        params = event.get("queryStringParameters") or {}
+        user_id = params.get("userId")
+        if not user_id:
+            return build_response(400, {"error": "userId query parameter is required"})
+
+        meals = list_meals(user_id)
+        return build_response(200, {"items": meals})
+
+    # Log a saved meal in one write
+    if method == "POST" and path == "/meals/log":
+        body = parse_body(event)
+        status, payload = log_meal(body)
+        logger.info("Log meal completed with status=%s for meal_id=%s", status, body.get("mealId"))
+        return build_response(status, payload)
+    
+    # Assign trainer to user (manual or auto)
+    if method == "POST" and path == "/trainer/assign":
+        body = parse_body(event)
+        status, payload = assign_trainer(body)
+        logger.info("Assign trainer completed with status=%s for user_id=%s trainer_id=%s", status, body.get("userId"), body.get("trainerId"))
+        return build_response(status, payload)
+
+    # Unassign trainer
+    if method == "POST" and path == "/trainer/unassign":
+        body = parse_body(event)
+        status, payload = unassign_trainer(body)
+        logger.info("Unassign trainer completed with status=%s for user_id=%s", status, body.get("userId"))
+        return build_response(status, payload)
+
+    # Get trainer's clients
+    if method == "GET" and path == "/trainer/clients":
+        params = event.get("queryStringParameters") or {}
+        trainer_id = params.get("trainerId")
+        if not trainer_id:
+            return build_response(400, {"error": "trainerId query parameter is required"})
+        fields, error = parse_fields(params.get("fields"), TRAINER_CLIENT_FIELDS)
+        if error:
+            return build_response(400, {"error": error})
+        logger.info("Fetching trainer clients for trainer_id=%s", trainer_id)
+        clients = get_trainer_clients(trainer_id, fields=fields)
+        return build_response(200, {"clients": clients})
+
+    # Send message between user & trainer
+    if method == "POST" and path == "/messages":
+        body = parse_body(event)
+        status, payload = send_message(body)
+        logger.info("Send message completed with status=%s for user_id=%s trainer_id=%s", status, body.get("userId"), body.get("trainerId"))
+        return build_response(status, payload)
+
+    # Get conversation messages
+    if method == "GET" and path == "/messages":
+        params = event.get("queryStringParameters") or {}
+        user_id = params.get("userId")
+        trainer_id = params.get("trainerId")
+        if not user_id or not trainer_id:
+            return build_response(400, {"error": "userId and trainerId are required"})
+        fields, error = parse_fields(params.get("fields"), MESSAGE_FIELDS)
+        if error:
+            return build_response(400, {"error": error})
+        cursor = None
+        if params.get("cursor"):
+            cursor = decode_cursor(params["cursor"])
+            if cursor is None:
+                return build_response(400, {"error": "invalid cursor"})
+        logger.info("Fetching conversation for user_id=%s trainer_id=%s", user_id, trainer_id)
+        conv, next_cursor = get_conversation(user_id, trainer_id, fields=fields, cursor=cursor)
+        return build_response(200, {"messages": conv, "nextCursor": next_cursor})
+
+    # Mark a conversation as read for one side
+    if method == "POST" and path == "/messages/read":
+        body = parse_body(event)
+        status, payload = mark_conversation_read(body)
+        return build_response(status, payload)
+
+    # Trainer inbox: conversations by recency with unread counts
+    if method == "GET" and path == "/trainer/inbox":
+        params = event.get("queryStringParameters") or {}
+        trainer_id = params.get("trainerId")
+        if not trainer_id:
+            return build_response(400, {"error": "trainerId query parameter is required"})
+        try:
+            limit = int(params.get("limit") or 50)
+        except ValueError:
+            return build_response(400, {"error": "limit must be an integer"})
+        logger.info("Fetching inbox for trainer_id=%s", trainer_id)
+        conversations, unread = get_trainer_inbox(trainer_id, limit=limit)
+        return build_response(200, {"conversations": conversations, "unreadCount": unread})
+
+
+
+    # Not found
+    logger.warning("No route for %s %s", method, path)
+    return build_response(404, {"error": f"No route for {method} {path}"})
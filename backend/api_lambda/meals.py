@@ -0,0 +1,267 @@
+import logging
+import os
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from boto3.dynamodb.conditions import Key
+
+from dynamodb_client import (
+    dynamodb,
+    saved_meals_table,
+    meal_foods_table,
+    FOODS_TABLE_NAME,
+)
+from diet_logs import compute_macros, sum_macros, save_log_entries, _round_currency
+from notifications import notify_trainer_user_logged_food
+from utils import get_current_timestamp_iso, _now_iso
+
+logger = logging.getLogger(__name__)
+
+# Every component becomes one log row; in transactional mode they share a
+# TransactWriteItems call with the summary update (100 items max)
+MAX_MEAL_ITEMS = int(os.environ.get("MAX_MEAL_ITEMS", "25"))
+BATCH_GET_MAX_KEYS = 100
+
+
+def _positive_decimal(value):
+    """Parse a positive number as Decimal, or return None."""
+    if value is None or value == "":
+        return None
+    try:
+        number = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return None
+    # NaN cannot be compared and Infinity cannot be stored
+    if not number.is_finite():
+        return None
+    return number if number > 0 else None
+
+
+def _meal_ref(user_id: str, meal_id: str) -> str:
+    return f"{user_id}#{meal_id}"
+
+
+def _batch_get_foods(food_ids):
+    """Fetch Foods items by id with BatchGetItem. Returns {foodId: item}."""
+    foods = {}
+    food_ids = list(dict.fromkeys(food_ids))
+    for start in range(0, len(food_ids), BATCH_GET_MAX_KEYS):
+        request = {
+            FOODS_TABLE_NAME: {"Keys": [{"foodId": f} for f in food_ids[start:start + BATCH_GET_MAX_KEYS]]}
+        }
+        while request:
+            resp = dynamodb.batch_get_item(RequestItems=request)
+            for item in resp.get("Responses", {}).get(FOODS_TABLE_NAME, []):
+                foods[item["foodId"]] = item
+            request = resp.get("UnprocessedKeys") or {}
+    return foods
+
+
+def _build_components(entries, foods):
+    """Resolve (foodId, grams) entries to components carrying their own macros."""
+    components = []
+    for entry in entries:
+        food = foods[entry["foodId"]]
+        grams = Decimal(str(entry["grams"]))
+        components.append({
+            "foodId": entry["foodId"],
+            "foodName": food.get("name"),
+            "grams": grams,
+            **compute_macros(food, grams),
+        })
+    return components
+
+
+def _per_serving(components, servings: Decimal):
+    totals = sum_macros(components)
+    return {k: _round_currency(v / servings) for k, v in totals.items()}
+
+
+def create_meal(body: dict):
+    """
+    Save a named meal or recipe for a user.
+    Expected body:
+    {
+      "userId": "...",
+      "name": "Usual breakfast",
+      "items": [{"foodId": "egg_whole", "grams": 100}, ...],
+      "servings": 1
+    }
+    Macros are computed once here, per component and per serving.
+    """
+    user_id = body.get("userId")
+    name = body.get("name")
+    entries = body.get("items")
+    servings = _positive_decimal(body.get("servings", 1))
+
+    if not user_id or not name:
+        return 400, {"error": "userId and name are required"}
+    if not isinstance(entries, list) or not entries:
+        return 400, {"error": "items must be a non-empty list of {foodId, grams}"}
+    if len(entries) > MAX_MEAL_ITEMS:
+        return 400, {"error": f"a meal can have at most {MAX_MEAL_ITEMS} items"}
+    if servings is None:
+        return 400, {"error": "servings must be a positive number"}
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get("foodId") or _positive_decimal(entry.get("grams")) is None:
+            return 400, {"error": "each item needs a foodId and a positive grams value"}
+
+    foods = _batch_get_foods([e["foodId"] for e in entries])
+    missing = sorted({e["foodId"] for e in entries} - set(foods))
+    if missing:
+        logger.warning("Meal creation for user_id=%s references unknown foods: %s", user_id, missing)
+        return 404, {"error": f"Foods not found: {', '.join(missing)}"}
+
+    components = _build_components(entries, foods)
+    meal_id = str(uuid.uuid4())
+    now = _now_iso()
+    item = {
+        "userId": user_id,
+        "mealId": meal_id,
+        "name": name,
+        "servings": servings,
+        "components": components,
+        "perServing": _per_serving(components, servings),
+        "createdAt": now,
+        "updatedAt": now,
+    }
+    saved_meals_table.put_item(Item=item)
+
+    # Reverse index so a food edit only touches the meals that contain it
+    with meal_foods_table.batch_writer() as batch:
+        for food_id in dict.fromkeys(c["foodId"] for c in components):
+            batch.put_item(Item={
+                "foodId": food_id,
+                "mealRef": _meal_ref(user_id, meal_id),
+                "userId": user_id,
+                "mealId": meal_id,
+            })
+
+    logger.info("Saved meal created: user_id=%s meal_id=%s components=%s", user_id, meal_id, len(components))
+    return 201, {"meal": item}
+
+
+def list_meals(user_id: str):
+    """Return all saved meals for a user."""
+    query_kwargs = {"KeyConditionExpression": Key("userId").eq(user_id)}
+    meals = []
+    while True:
+        resp = saved_meals_table.query(**query_kwargs)
+        meals.extend(resp.get("Items", []))
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        query_kwargs["ExclusiveStartKey"] = last_key
+    return meals
+
+
+def log_meal(body: dict):
+    """
+    Log a saved meal: one DietLogs row per component, written together with
+    a single summary increment, and one trainer notification.
+    Expected body: {"userId": "...", "mealId": "...", "servings": 1, "mealType": "breakfast"}
+    """
+    user_id = body.get("userId")
+    meal_id = body.get("mealId")
+    servings = _positive_decimal(body.get("servings", 1))
+    meal_type = body.get("mealType")
+
+    if not user_id or not meal_id:
+        return 400, {"error": "userId and mealId are required"}
+    if servings is None:
+        return 400, {"error": "servings must be a positive number"}
+
+    resp = saved_meals_table.get_item(Key={"userId": user_id, "mealId": meal_id})
+    meal = resp.get("Item")
+    if not meal:
+        return 404, {"error": f"Meal with id '{meal_id}' not found"}
+
+    # Stored component macros cover the whole recipe; scale to the portion eaten
+    factor = servings / Decimal(str(meal.get("servings", 1)))
+    log_timestamp = get_current_timestamp_iso()
+    date = log_timestamp[:10]
+
+    rows = []
+    for idx, component in enumerate(meal["components"]):
+        rows.append({
+            "userId": user_id,
+            # Suffix keeps the rows distinct under one sort-key instant
+            "logTimestamp": f"{log_timestamp}#{idx:02d}",
+            "date": date,
+            "foodId": component["foodId"],
+            "foodName": component.get("foodName"),
+            "quantity": _round_currency(Decimal(str(component["grams"])) * factor),
+            "unit": "g",
+            "calories": _round_currency(component["calories"] * factor),
+            "protein": _round_currency(component["protein"] * factor),
+            "carbs": _round_currency(component["carbs"] * factor),
+            "fat": _round_currency(component["fat"] * factor),
+            "mealType": meal_type,
+            "mealId": meal_id,
+            "mealName": meal.get("name"),
+        })
+
+    summary = save_log_entries(rows)
+
+    totals = sum_macros(rows)
+    notify_trainer_user_logged_food(user_id, {
+        "logTimestamp": log_timestamp,
+        "date": date,
+        "foodName": meal.get("name"),
+        "quantity": servings,
+        "unit": "serving",
+        "calories": totals["calories"],
+    }, summary)
+
+    logger.info("Meal logged for user_id=%s meal_id=%s rows=%s", user_id, meal_id, len(rows))
+    return 201, {"logs": rows, "updatedSummary": summary}
+
+
+def recompute_meals_for_food(food: dict):
+    """
+    Refresh the stored macros of every saved meal that contains `food`.
+    Called after a Foods item changes; meals without it are not read.
+    Returns the number of meals updated.
+    """
+    food_id = food["foodId"]
+    query_kwargs = {"KeyConditionExpression": Key("foodId").eq(food_id)}
+    refs = []
+    while True:
+        resp = meal_foods_table.query(**query_kwargs)
+        refs.extend(resp.get("Items", []))
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        query_kwargs["ExclusiveStartKey"] = last_key
+
+    updated = 0
+    for ref in refs:
+        resp = saved_meals_table.get_item(Key={"userId": ref["userId"], "mealId": ref["mealId"]})
+        meal = resp.get("Item")
+        if not meal:
+            meal_foods_table.delete_item(Key={"foodId": food_id, "mealRef": ref["mealRef"]})
+            continue
+
+        entries = [{"foodId": c["foodId"], "grams": c["grams"]} for c in meal["components"]]
+        other_ids = [e["foodId"] for e in entries if e["foodId"] != food_id]
+        foods = _batch_get_foods(other_ids) if other_ids else {}
+        # Use the updated item itself; a BatchGetItem read may not see the write yet
+        foods[food_id] = food
+        if any(e["foodId"] not in foods for e in entries):
+            logger.warning("Skipping recompute of meal_id=%s: a component food no longer exists", ref["mealId"])
+            continue
+
+        components = _build_components(entries, foods)
+        saved_meals_table.update_item(
+            Key={"userId": ref["userId"], "mealId": ref["mealId"]},
+            UpdateExpression="SET components = :c, perServing = :p, updatedAt = :now",
+            ExpressionAttributeValues={
+                ":c": components,
+                ":p": _per_serving(components, Decimal(str(meal.get("servings", 1)))),
+                ":now": _now_iso(),
+            },
+        )
+        updated += 1
+
+    logger.info("Recomputed %s saved meals after food_id=%s changed", updated, food_id)
+    return updated
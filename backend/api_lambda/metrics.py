@@ -0,0 +1,63 @@
+"""
+Per-container counters for operational metrics.
+
+Counters are cumulative for the life of the container. `maybe_emit` writes
+the deltas since the last emit as a CloudWatch Embedded Metric Format (EMF)
+log line, which CloudWatch turns into metrics without any API calls.
+"""
+
+import json
+import os
+import threading
+import time
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "DietLogging")
+METRICS_EMIT_INTERVAL_SECONDS = int(os.environ.get("METRICS_EMIT_INTERVAL_SECONDS", "60"))
+
+_lock = threading.Lock()
+_counters = {}
+_emitted = {}
+_last_emit = time.monotonic()
+
+
+def increment(name: str, value: int = 1):
+    """Add `value` to the named counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def snapshot() -> dict:
+    """Return a copy of all counters."""
+    with _lock:
+        return dict(_counters)
+
+
+def maybe_emit(force: bool = False):
+    """Log counter deltas in EMF once per emit interval (or immediately if forced)."""
+    global _last_emit
+
+    with _lock:
+        now = time.monotonic()
+        if not force and now - _last_emit < METRICS_EMIT_INTERVAL_SECONDS:
+            return
+        deltas = {k: v - _emitted.get(k, 0) for k, v in _counters.items() if v != _emitted.get(k, 0)}
+        _emitted.update(_counters)
+        _last_emit = now
+
+    if not deltas:
+        return
+    payload = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [[]],
+                    "Metrics": [{"Name": name, "Unit": "Count"} for name in sorted(deltas)],
+                }
+            ],
+        },
+        **deltas,
+    }
+    # EMF must be a bare JSON line on stdout (the logging prefix would break parsing)
+    print(json.dumps(payload), flush=True)
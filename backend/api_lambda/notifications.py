@@ -1,30 +1,29 @@
 import os
 import json
+import logging
+import time
+from datetime import datetime, timezone
+
 import boto3
 
-from dynamodb_client import trainer_assignments_table
-from utils import _to_serializable
+import metrics
+from deadlines import CLIENT_CONFIG, OPTIONAL_WORK_MIN_BUDGET_MS, has_budget, instrument
+from assignments import resolve_trainer_for_user
+from dynamodb_client import notification_digests_table
+from utils import _to_serializable, _now_iso
+
+logger = logging.getLogger(__name__)
 
-sns = boto3.client("sns")
+sns = instrument(boto3.client("sns", config=CLIENT_CONFIG))
 
 # For now we hardcode topic ARN, but could read from env later.
 TRAINER_NOTIFICATIONS_TOPIC_ARN = os.environ.get("TRAINER_NOTIFICATIONS_TOPIC_ARN")
 
-
-def _find_trainer_for_user(user_id: str):
-    """
-    Find active trainer assignment for a user.
-    MVP: scan TrainerAssignments and pick active one.
-    (Could be optimized with GSI later.)
-    """
-    resp = trainer_assignments_table.scan()
-    items = resp.get("Items", [])
-
-    for it in items:
-        if it.get("userId") == user_id and it.get("status") == "active":
-            return it.get("trainerId")
-
-    return None
+# "immediate": one SNS message per food log (default)
+# "digest": buffer USER_LOGGED_FOOD events per trainer and publish one digest per window
+TRAINER_NOTIFICATION_MODE = os.environ.get("TRAINER_NOTIFICATION_MODE", "immediate")
+DIGEST_WINDOW_SECONDS = int(os.environ.get("DIGEST_WINDOW_SECONDS", "3600"))
+DIGEST_MAX_EVENTS = int(os.environ.get("DIGEST_MAX_EVENTS", "50"))
 
 
 def notify_trainer_user_logged_food(user_id: str, log_item: dict, summary_item: dict):
@@ -37,7 +36,13 @@ def notify_trainer_user_logged_food(user_id: str, log_item: dict, summary_item:
         # Topic ARN not configured in env, skip
         return
 
-    trainer_id = _find_trainer_for_user(user_id)
+    if not has_budget(OPTIONAL_WORK_MIN_BUDGET_MS):
+        # Not worth risking the response for a notification
+        logger.warning("Skipping food-log notification for user_id=%s: request budget nearly spent", user_id)
+        metrics.increment("requests.optional_work_shed")
+        return
+
+    trainer_id = resolve_trainer_for_user(user_id)
     if not trainer_id:
         # User has no trainer; no notification
         return
@@ -66,9 +71,151 @@ def notify_trainer_user_logged_food(user_id: str, log_item: dict, summary_item:
         },
     }
 
+    if TRAINER_NOTIFICATION_MODE == "digest":
+        _buffer_digest_event(trainer_id, msg, log_item.get("logTimestamp"))
+        return
+
     sns.publish(
         TopicArn=TRAINER_NOTIFICATIONS_TOPIC_ARN,
         # Convert Decimal values before serializing
         Message=json.dumps(_to_serializable(msg)),
         Subject="Diet App - User logged food",
     )
+    metrics.increment("notifications.published")
+
+
+def _buffer_digest_event(trainer_id: str, msg: dict, logged_at):
+    """
+    Append a USER_LOGGED_FOOD event to the trainer's pending digest.
+    The digest is flushed by the scheduled digest job once its window closes,
+    or right here once it reaches DIGEST_MAX_EVENTS.
+    """
+    event = {k: v for k, v in msg.items() if k not in ("type", "trainerId")}
+    event["loggedAt"] = logged_at or _now_iso()
+
+    resp = notification_digests_table.update_item(
+        Key={"trainerId": trainer_id},
+        UpdateExpression=(
+            "SET events = list_append(if_not_exists(events, :empty), :event), "
+            "windowStart = if_not_exists(windowStart, :now) "
+            "ADD eventCount :one"
+        ),
+        ExpressionAttributeValues={
+            ":empty": [],
+            ":event": [event],
+            ":now": int(time.time()),
+            ":one": 1,
+        },
+        ReturnValues="UPDATED_NEW",
+    )
+    metrics.increment("notifications.buffered")
+
+    if int(resp.get("Attributes", {}).get("eventCount", 0)) >= DIGEST_MAX_EVENTS:
+        logger.info("Digest for trainer_id=%s reached %s events; flushing", trainer_id, DIGEST_MAX_EVENTS)
+        try:
+            flush_trainer_digest(trainer_id)
+        except Exception:
+            # The food log is already saved; the scheduled job retries the re-buffered digest
+            logger.exception("Inline digest flush failed for trainer_id=%s", trainer_id)
+            metrics.increment("notifications.digest_flush_failed")
+
+
+def _build_digest_message(trainer_id: str, pending: dict):
+    """Group buffered events by client; keep each client's latest running summary."""
+    clients = {}
+    for event in pending.get("events", []):
+        user_id = event.get("userId")
+        client = clients.setdefault(user_id, {"userId": user_id, "entries": [], "latestSummary": None})
+        client["entries"].append({
+            "foodName": event.get("foodName"),
+            "quantity": event.get("quantity"),
+            "unit": event.get("unit"),
+            "calories": event.get("calories"),
+            "date": event.get("date"),
+            "loggedAt": event.get("loggedAt"),
+        })
+        client["latestSummary"] = event.get("summary")
+
+    window_start = pending.get("windowStart")
+    return {
+        "type": "USER_LOGGED_FOOD_DIGEST",
+        "trainerId": trainer_id,
+        "windowStart": datetime.fromtimestamp(int(window_start), timezone.utc).isoformat() if window_start else None,
+        "windowEnd": _now_iso(),
+        "eventCount": len(pending.get("events", [])),
+        "clients": list(clients.values()),
+    }
+
+
+def flush_trainer_digest(trainer_id: str):
+    """
+    Atomically take the trainer's pending digest and publish it as one message.
+    Events buffered after the take start a new digest. Returns events published.
+    """
+    resp = notification_digests_table.delete_item(
+        Key={"trainerId": trainer_id},
+        ReturnValues="ALL_OLD",
+    )
+    pending = resp.get("Attributes")
+    if not pending or not pending.get("events"):
+        return 0
+
+    msg = _build_digest_message(trainer_id, pending)
+    try:
+        sns.publish(
+            TopicArn=TRAINER_NOTIFICATIONS_TOPIC_ARN,
+            Message=json.dumps(_to_serializable(msg)),
+            Subject=f"Diet App - {msg['eventCount']} food logs from {len(msg['clients'])} client(s)",
+        )
+    except Exception:
+        # Put the events back so the next flush retries them
+        logger.exception("Digest publish failed for trainer_id=%s; re-buffering", trainer_id)
+        notification_digests_table.update_item(
+            Key={"trainerId": trainer_id},
+            UpdateExpression=(
+                "SET events = list_append(:events, if_not_exists(events, :empty)), "
+                "windowStart = :start "
+                "ADD eventCount :n"
+            ),
+            ExpressionAttributeValues={
+                ":events": pending["events"],
+                ":empty": [],
+                ":start": pending.get("windowStart") or int(time.time()),
+                ":n": len(pending["events"]),
+            },
+        )
+        raise
+
+    metrics.increment("notifications.published")
+    metrics.increment("notifications.digest_events", msg["eventCount"])
+    return msg["eventCount"]
+
+
+def flush_due_digests(force: bool = False):
+    """
+    Flush every digest whose window has closed (or all of them when forced).
+    A trainer whose flush fails is logged and skipped; its events stay
+    buffered for the next run. Returns (digests_published, events_published).
+    """
+    cutoff = int(time.time()) - DIGEST_WINDOW_SECONDS
+    scan_kwargs = {"ProjectionExpression": "trainerId, windowStart"}
+    digests = events = 0
+    while True:
+        resp = notification_digests_table.scan(**scan_kwargs)
+        for pending in resp.get("Items", []):
+            if not force and int(pending.get("windowStart", 0)) > cutoff:
+                continue
+            try:
+                flushed = flush_trainer_digest(pending["trainerId"])
+            except Exception:
+                logger.exception("Digest flush failed for trainer_id=%s; continuing", pending["trainerId"])
+                metrics.increment("notifications.digest_flush_failed")
+                continue
+            if flushed:
+                digests += 1
+                events += flushed
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        scan_kwargs["ExclusiveStartKey"] = last_key
+    return digests, events
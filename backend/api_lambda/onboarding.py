@@ -0,0 +1,185 @@
+"""
+Bulk onboarding: create a cohort of users and spread them over trainers.
+
+Per-member /users + /trainer/assign calls cost a full Trainers scan and
+sort for every auto-assignment. Here the cohort is written with batch
+writes and assigned in one pass: one Trainers scan, then a min-heap keyed
+on current client count (the same least-loaded rule as assign_trainer),
+never beyond maxClients.
+
+Trainer counts are reserved before any assignment row is written, with one
+conditional ADD per trainer that only succeeds while the trainer still has
+room. A trainer that filled up concurrently gets a re-read and a smaller
+reservation; members that cannot be placed are reported as unassigned and
+can go through /trainer/assign later.
+"""
+
+import heapq
+import logging
+import os
+
+from botocore.exceptions import ClientError
+
+import metrics
+from assignments import record_assignments
+from dynamodb_client import trainer_assignments_table, trainers_table, users_table
+from users import build_user_item
+from utils import _now_iso
+
+logger = logging.getLogger(__name__)
+
+BULK_ONBOARD_MAX_USERS = int(os.environ.get("BULK_ONBOARD_MAX_USERS", "1000"))
+# Reservation attempts per trainer when its count moves under us
+BULK_RESERVE_ATTEMPTS = 3
+
+
+def _load_trainers():
+    scan_kwargs = {
+        "ProjectionExpression": "trainerId, #n, maxClients, currentClientCount",
+        "ExpressionAttributeNames": {"#n": "name"},
+    }
+    trainers = []
+    while True:
+        resp = trainers_table.scan(**scan_kwargs)
+        trainers.extend(resp.get("Items", []))
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        scan_kwargs["ExclusiveStartKey"] = last_key
+    return trainers
+
+
+def plan_assignments(user_ids, trainers):
+    """
+    Least-loaded assignment of `user_ids` over `trainers` in one pass.
+    Returns {trainerId: [userId, ...]}; users beyond total spare capacity
+    are left out.
+    """
+    heap = []
+    for t in trainers:
+        current, max_c = int(t.get("currentClientCount", 0)), int(t.get("maxClients", 0))
+        if current < max_c:
+            heap.append((current, t["trainerId"], max_c))
+    heapq.heapify(heap)
+
+    plan = {}
+    for user_id in user_ids:
+        if not heap:
+            break
+        current, trainer_id, max_c = heapq.heappop(heap)
+        plan.setdefault(trainer_id, []).append(user_id)
+        if current + 1 < max_c:
+            heapq.heappush(heap, (current + 1, trainer_id, max_c))
+    return plan
+
+
+def _reserve(trainer: dict, wanted: int) -> int:
+    """
+    Add up to `wanted` clients to the trainer's count without passing
+    maxClients. Returns how many were reserved.
+    """
+    trainer_id = trainer["trainerId"]
+    max_c = int(trainer.get("maxClients", 0))
+    current = int(trainer.get("currentClientCount", 0))
+    for _ in range(BULK_RESERVE_ATTEMPTS):
+        n = min(wanted, max_c - current)
+        if n <= 0:
+            return 0
+        try:
+            trainers_table.update_item(
+                Key={"trainerId": trainer_id},
+                UpdateExpression="ADD currentClientCount :n",
+                ConditionExpression="attribute_not_exists(currentClientCount) OR currentClientCount <= :room",
+                ExpressionAttributeValues={":n": n, ":room": max_c - n},
+            )
+            return n
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+        metrics.increment("bulk_onboard.reserve_conflict")
+        resp = trainers_table.get_item(Key={"trainerId": trainer_id}, ConsistentRead=True)
+        fresh = resp.get("Item") or {}
+        max_c = int(fresh.get("maxClients", 0))
+        current = int(fresh.get("currentClientCount", 0))
+    return 0
+
+
+def bulk_onboard(body: dict):
+    """
+    Create many users and (by default) auto-assign them to trainers.
+    Body:
+    {
+      "users": [{ same fields as POST /users, role "user" }, ...],
+      "autoAssign": true
+    }
+    All entries are validated before anything is written.
+    """
+    entries = body.get("users")
+    if not isinstance(entries, list) or not entries:
+        return 400, {"error": "users must be a non-empty list"}
+    if len(entries) > BULK_ONBOARD_MAX_USERS:
+        return 400, {"error": f"at most {BULK_ONBOARD_MAX_USERS} users per request"}
+    auto_assign = body.get("autoAssign", True)
+
+    items, invalid = [], []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict) or entry.get("role", "user") != "user":
+            invalid.append({"index": index, "error": "each entry must be an object with role 'user'"})
+            continue
+        item, error = build_user_item({**entry, "role": "user"})
+        if error:
+            invalid.append({"index": index, "error": error})
+        else:
+            items.append(item)
+    if invalid:
+        return 400, {"error": "some users are invalid; nothing was created", "invalid": invalid}
+
+    with users_table.batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+    metrics.increment("bulk_onboard.users_created", len(items))
+    logger.info("Bulk onboarding created %s users", len(items))
+
+    user_ids = [item["userId"] for item in items]
+    assigned = {}
+    distribution = []
+    if auto_assign:
+        trainers = {t["trainerId"]: t for t in _load_trainers()}
+        plan = plan_assignments(user_ids, trainers.values())
+
+        now = _now_iso()
+        with trainer_assignments_table.batch_writer() as batch:
+            for trainer_id, members in plan.items():
+                trainer = trainers[trainer_id]
+                granted = _reserve(trainer, len(members))
+                for user_id in members[:granted]:
+                    batch.put_item(Item={
+                        "userId": user_id,
+                        "trainerId": trainer_id,
+                        "status": "active",
+                        "assignedAt": now,
+                    })
+                    assigned[user_id] = trainer_id
+                if granted:
+                    distribution.append({
+                        "trainerId": trainer_id,
+                        "name": trainer.get("name"),
+                        "added": granted,
+                        "clientCountBefore": int(trainer.get("currentClientCount", 0)),
+                        "maxClients": int(trainer.get("maxClients", 0)),
+                    })
+        record_assignments(list(assigned.items()))
+        metrics.increment("bulk_onboard.assigned", len(assigned))
+
+    unassigned = [user_id for user_id in user_ids if user_id not in assigned]
+    distribution.sort(key=lambda d: -d["added"])
+    return 201, {
+        "created": len(items),
+        "assigned": len(assigned),
+        "users": [
+            {"userId": item["userId"], "email": item["email"], "trainerId": assigned.get(item["userId"])}
+            for item in items
+        ],
+        "unassigned": unassigned if auto_assign else [],
+        "distribution": distribution,
+    }
@@ -0,0 +1,140 @@
+"""
+Opt-in per-request profiling.
+
+Off by default. With PROFILING_MODE set to "cpu", "memory" or "both", a
+PROFILING_SAMPLE_RATE fraction of requests runs under cProfile and/or
+tracemalloc. With PROFILING_ALLOW_HEADER=true a request can also ask for a
+profile through the X-Debug-Profile header (same values). Each profiled
+request logs one JSON line with the top-N functions and allocation sites.
+
+Only one request per container is profiled at a time, and cProfile only
+sees the calling thread.
+"""
+
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+
+import metrics
+from utils import _header
+
+logger = logging.getLogger(__name__)
+
+PROFILING_MODE = os.environ.get("PROFILING_MODE", "off")
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_ALLOW_HEADER = os.environ.get("PROFILING_ALLOW_HEADER", "false").lower() == "true"
+PROFILING_TOP_N = int(os.environ.get("PROFILING_TOP_N", "15"))
+# "cumulative" or "tottime"
+PROFILING_SORT = os.environ.get("PROFILING_SORT", "cumulative")
+PROFILING_HEADER = "x-debug-profile"
+
+# mode -> (cpu, memory)
+_MODES = {"cpu": (True, False), "memory": (False, True), "both": (True, True)}
+_active = threading.Lock()
+# Keep the profilers' own bookkeeping out of the allocation report
+_memory_filters = (
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, cProfile.__file__),
+    tracemalloc.Filter(False, pstats.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+)
+
+
+def _requested_mode(event):
+    """Profiling mode for this request, or None to run it normally."""
+    if PROFILING_ALLOW_HEADER:
+        requested = str(_header(event, PROFILING_HEADER) or "").lower()
+        if requested in _MODES:
+            return requested
+    if PROFILING_MODE in _MODES and random.random() < PROFILING_SAMPLE_RATE:
+        return PROFILING_MODE
+    return None
+
+
+def _top_functions(profiler):
+    stats = pstats.Stats(profiler)
+    stats.sort_stats(PROFILING_SORT)
+    rows = []
+    for func in stats.fcn_list[:PROFILING_TOP_N]:
+        _, ncalls, tottime, cumtime, _ = stats.stats[func]
+        filename, line, name = func
+        rows.append(
+            f"{cumtime * 1000:.1f}ms cum {tottime * 1000:.1f}ms self {ncalls}x "
+            f"{os.path.basename(filename)}:{line}({name})"
+        )
+    return rows
+
+
+def _top_allocations(snapshot, baseline):
+    snapshot = snapshot.filter_traces(_memory_filters)
+    if baseline is not None:
+        stats = snapshot.compare_to(baseline.filter_traces(_memory_filters), "lineno")
+        sizes = [(s.traceback[0], s.size_diff, s.count_diff) for s in stats]
+    else:
+        stats = snapshot.statistics("lineno")
+        sizes = [(s.traceback[0], s.size, s.count) for s in stats]
+    return [
+        f"{size / 1024:.1f}KiB {count} blocks {os.path.basename(frame.filename)}:{frame.lineno}"
+        for frame, size, count in sizes[:PROFILING_TOP_N]
+    ]
+
+
+@contextlib.contextmanager
+def maybe_profile(event, label: str):
+    """Run the enclosed block under the profilers this request opted into."""
+    mode = _requested_mode(event)
+    if mode is None:
+        yield
+        return
+    if not _active.acquire(blocking=False):
+        metrics.increment("profiling.skipped_busy")
+        yield
+        return
+
+    try:
+        cpu, memory = _MODES[mode]
+        profiler = cProfile.Profile() if cpu else None
+        baseline = None
+        started_tracing = False
+        if memory:
+            if tracemalloc.is_tracing():
+                # Someone else is tracing; report the growth during this request
+                baseline = tracemalloc.take_snapshot()
+            else:
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+
+        started = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            summary = {"profile": label, "mode": mode, "elapsedMs": round(elapsed_ms, 1)}
+            if memory:
+                snapshot = tracemalloc.take_snapshot()
+                summary["peakKiB"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+                if started_tracing:
+                    tracemalloc.stop()
+                summary["allocations"] = _top_allocations(snapshot, baseline)
+            if profiler:
+                summary["functions"] = _top_functions(profiler)
+
+            metrics.increment("profiling.sampled")
+            logger.info("Request profile: %s", json.dumps(summary))
+    finally:
+        _active.release()
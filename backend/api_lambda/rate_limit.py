@@ -0,0 +1,155 @@
+"""
+Per-user, per-route rate limiting for the API Lambda.
+
+Every limited request first takes a token from an in-container token bucket
+(bounded LRU keyed by route and caller). That is free and stops a client
+retrying in a tight loop against a warm container. Concurrent containers
+each have their own buckets though, so with RATE_LIMIT_MODE "shared",
+rules marked "shared" also count the request in the RateLimits table: a
+fixed-window counter per route, caller and window, incremented with a
+conditional ADD so the check and the increment are one atomic write. Rows
+expire through the table's TTL.
+
+The caller is the request's userId (query string, then body), falling back
+to the source IP. Rejected requests get 429 with Retry-After.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+
+import metrics
+from deadlines import uncommitted
+from dynamodb_client import rate_limits_table
+from utils import parse_body
+
+logger = logging.getLogger(__name__)
+
+# "off", "local" (in-container buckets only) or "shared" (local, then the RateLimits table)
+RATE_LIMIT_MODE = os.environ.get("RATE_LIMIT_MODE", "off")
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "10000"))
+RATE_LIMIT_SHARED_WINDOW_SECONDS = int(os.environ.get("RATE_LIMIT_SHARED_WINDOW_SECONDS", "60"))
+
+# "METHOD /path" -> rate (tokens per second), burst (bucket size) and whether
+# the shared table is consulted. "*" applies to any other route.
+DEFAULT_RULES = {
+    "GET /foods/search": {"rate": 5, "burst": 20, "shared": True},
+    "GET /foods/suggest": {"rate": 10, "burst": 30},
+    "POST /diet-logs": {"rate": 2, "burst": 10, "shared": True},
+    "POST /meals/log": {"rate": 2, "burst": 10, "shared": True},
+    "POST /messages": {"rate": 2, "burst": 10},
+    "*": {"rate": 20, "burst": 60},
+}
+# JSON object in the same shape; entries replace the defaults for their route
+RATE_LIMIT_RULES = {**DEFAULT_RULES, **json.loads(os.environ.get("RATE_LIMIT_RULES") or "{}")}
+
+# Never limited: preflight and health checks
+EXEMPT_ROUTES = {"GET /health"}
+
+_lock = threading.Lock()
+_buckets = OrderedDict()  # (route, caller) -> [tokens, refilled_at]
+
+
+def _rule_for(route: str):
+    return RATE_LIMIT_RULES.get(route) or RATE_LIMIT_RULES.get("*")
+
+
+def _caller(event) -> str:
+    params = event.get("queryStringParameters") or {}
+    user_id = params.get("userId")
+    if not user_id:
+        body = parse_body(event)
+        user_id = body.get("userId") if isinstance(body, dict) else None
+    if user_id:
+        return f"user:{user_id}"
+    source_ip = event.get("requestContext", {}).get("http", {}).get("sourceIp")
+    return f"ip:{source_ip or 'unknown'}"
+
+
+def _take_local(key, rate: float, burst: float):
+    """Take one token from the container bucket; seconds to wait if it is empty."""
+    now = time.monotonic()
+    with _lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = [burst, now]
+            _buckets[key] = bucket
+            if len(_buckets) > RATE_LIMIT_MAX_KEYS:
+                _buckets.popitem(last=False)
+        else:
+            _buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return None
+        return (1 - bucket[0]) / rate
+
+
+def _take_shared(route: str, caller: str, rate: float, burst: float):
+    """Count the request in this window's shared counter; seconds to wait if it is full."""
+    window = RATE_LIMIT_SHARED_WINDOW_SECONDS
+    now = time.time()
+    window_start = int(now // window) * window
+    # A full window allows the burst plus what the rate refills over it
+    limit = int(burst + rate * window)
+    try:
+        # The counter is not the request's work; it must not stop deadline shedding
+        with uncommitted():
+            rate_limits_table.update_item(
+                Key={"limitKey": f"{route}#{caller}#{window_start}"},
+                UpdateExpression="ADD requestCount :one SET expiresAt = :exp",
+                ConditionExpression="attribute_not_exists(requestCount) OR requestCount < :limit",
+                ExpressionAttributeValues={":one": 1, ":limit": limit, ":exp": window_start + 2 * window},
+            )
+        return None
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return window_start + window - now
+        # Fail open: a throttled or unavailable limiter must not take the API down
+        logger.warning("Shared rate limit check failed for %s: %s", route, exc)
+        metrics.increment("rate_limit.shared_error")
+        return None
+
+
+def _metric_route(route: str) -> str:
+    # "POST /diet-logs" -> "post.diet-logs"
+    method, _, path = route.partition(" ")
+    return f"{method.lower()}.{path.strip('/').replace('/', '_')}"
+
+
+def check(event, method: str, path: str):
+    """
+    Return None when the request may proceed, or the number of whole
+    seconds the caller should wait (for Retry-After) when it is limited.
+    """
+    if RATE_LIMIT_MODE == "off" or method == "OPTIONS":
+        return None
+    route = f"{method} {path}"
+    if route in EXEMPT_ROUTES:
+        return None
+    rule = _rule_for(route)
+    if not rule:
+        return None
+
+    rate, burst = float(rule["rate"]), float(rule["burst"])
+    caller = _caller(event)
+    wait = _take_local((route, caller), rate, burst)
+    if wait is None and RATE_LIMIT_MODE == "shared" and rule.get("shared"):
+        wait = _take_shared(route, caller, rate, burst)
+        if wait is not None:
+            metrics.increment("rate_limit.shared_throttled")
+    if wait is None:
+        return None
+
+    metrics.increment("rate_limit.throttled")
+    metrics.increment(f"rate_limit.throttled.{_metric_route(route)}")
+    logger.info("Rate limited %s for %s; retry in %.2fs", route, caller, wait)
+    return max(1, math.ceil(wait))
@@ -0,0 +1,134 @@
+"""
+Per-user "recent and frequent foods" for the food picker.
+
+Each user has one RecentFoods item holding a bounded map of foodId ->
+decayed use count, last quantity and when it was last logged. Every
+/diet-logs entry folds into it: the entry's old score decays by half every
+RECENT_FOODS_HALF_LIFE_DAYS, gains one, and when the map is full the entry
+with the lowest decayed score is dropped. So a food eaten daily stays on
+top, and one eaten a lot last month fades out on its own.
+
+The map is rewritten with a put conditioned on the revision that was read,
+so two concurrent logs for the same user cannot drop each other's update.
+GET /foods/recent is then a single key read instead of a DietLogs scan.
+"""
+
+import logging
+import os
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+import metrics
+from dynamodb_client import recent_foods_table
+from utils import _now_iso
+
+logger = logging.getLogger(__name__)
+
+RECENT_FOODS_MAX_ENTRIES = int(os.environ.get("RECENT_FOODS_MAX_ENTRIES", "25"))
+RECENT_FOODS_HALF_LIFE_DAYS = float(os.environ.get("RECENT_FOODS_HALF_LIFE_DAYS", "14"))
+RECENT_FOODS_DEFAULT_LIMIT = min(10, RECENT_FOODS_MAX_ENTRIES)
+# Conditional put attempts when another log for the user lands in between
+RECENT_FOODS_MAX_ATTEMPTS = 3
+
+_SCORE_PLACES = Decimal("0.0001")
+
+
+def _decayed(score, scored_at: str, now: datetime) -> float:
+    """`score` (as of `scored_at`) decayed to `now`."""
+    age_days = (now - datetime.fromisoformat(scored_at)).total_seconds() / 86400.0
+    return float(score) * 0.5 ** (max(age_days, 0.0) / RECENT_FOODS_HALF_LIFE_DAYS)
+
+
+def _fold(foods: dict, log_item: dict, now: datetime) -> dict:
+    """Return `foods` with one use of the logged food added, trimmed to the cap."""
+    food_id = log_item["foodId"]
+    previous = foods.get(food_id)
+    score = 1.0
+    if previous:
+        score += _decayed(previous["score"], previous["lastUsedAt"], now)
+
+    updated = dict(foods)
+    updated[food_id] = {
+        "score": Decimal(str(score)).quantize(_SCORE_PLACES),
+        "lastUsedAt": log_item["logTimestamp"],
+        "lastQuantity": log_item.get("quantity"),
+        "unit": log_item.get("unit"),
+        "name": log_item.get("foodName"),
+        "mealType": log_item.get("mealType"),
+    }
+    while len(updated) > RECENT_FOODS_MAX_ENTRIES:
+        weakest = min(
+            (fid for fid in updated if fid != food_id),
+            key=lambda fid: _decayed(updated[fid]["score"], updated[fid]["lastUsedAt"], now),
+        )
+        del updated[weakest]
+    return updated
+
+
+def record_recent_food(log_item: dict):
+    """
+    Fold one DietLogs entry into the user's recent foods. Best effort: the
+    log is already saved, so failures are logged and counted, not raised.
+    """
+    user_id = log_item["userId"]
+    now = datetime.fromisoformat(log_item["logTimestamp"])
+    try:
+        for _ in range(RECENT_FOODS_MAX_ATTEMPTS):
+            resp = recent_foods_table.get_item(Key={"userId": user_id}, ConsistentRead=True)
+            current = resp.get("Item") or {}
+            revision = int(current.get("revision", 0))
+
+            if revision:
+                condition = {
+                    "ConditionExpression": "#rev = :rev",
+                    "ExpressionAttributeNames": {"#rev": "revision"},
+                    "ExpressionAttributeValues": {":rev": revision},
+                }
+            else:
+                condition = {"ConditionExpression": "attribute_not_exists(userId)"}
+            try:
+                recent_foods_table.put_item(
+                    Item={
+                        "userId": user_id,
+                        "foods": _fold(current.get("foods") or {}, log_item, now),
+                        "revision": revision + 1,
+                        "updatedAt": _now_iso(),
+                    },
+                    **condition,
+                )
+                return
+            except ClientError as exc:
+                if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+            metrics.increment("recent_foods.conflict")
+        logger.warning("Gave up updating recent foods for user_id=%s after %s attempts", user_id, RECENT_FOODS_MAX_ATTEMPTS)
+        metrics.increment("recent_foods.dropped")
+    except Exception:
+        logger.exception("Failed to update recent foods for user_id=%s", user_id)
+        metrics.increment("recent_foods.error")
+
+
+def get_recent_foods(user_id: str, limit: int = RECENT_FOODS_DEFAULT_LIMIT):
+    """
+    The user's most used foods right now, best first, each with the last
+    quantity logged so the picker can re-log it in one tap.
+    """
+    resp = recent_foods_table.get_item(Key={"userId": user_id})
+    foods = (resp.get("Item") or {}).get("foods") or {}
+
+    now = datetime.now(timezone.utc)
+    ranked = []
+    for food_id, entry in foods.items():
+        ranked.append({
+            "foodId": food_id,
+            "name": entry.get("name"),
+            "lastQuantity": entry.get("lastQuantity"),
+            "unit": entry.get("unit"),
+            "mealType": entry.get("mealType"),
+            "lastUsedAt": entry.get("lastUsedAt"),
+            "score": round(_decayed(entry["score"], entry["lastUsedAt"], now), 4),
+        })
+    ranked.sort(key=lambda r: (-r["score"], r["foodId"]))
+    return ranked[:limit]
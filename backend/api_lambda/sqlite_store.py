@@ -0,0 +1,506 @@
+"""
+SQLite storage backend for running the API on a single node.
+
+Domain modules only touch storage through the handles dynamodb_client hands
+out: Table.get_item/put_item/update_item/delete_item/query/scan/batch_writer,
+resource.batch_get_item and client.transact_write_items. With
+STORAGE_BACKEND=sqlite those handles come from SQLiteResource instead of
+boto3, so handlers run unchanged. Conditions, updates and projections are
+evaluated by expressions.py exactly as for the in-memory stand-ins.
+
+Each table is one SQL table holding the item as DynamoDB-typed JSON, plus
+indexed columns for its primary key, every GSI key (TABLE_SCHEMAS) and the
+attributes in SQLITE_EXTRA_INDEXES. Key conditions become index range scans;
+top-level equality filters on indexed columns are pushed into the WHERE
+clause (and still re-checked in Python).
+
+Every write runs in a BEGIN IMMEDIATE transaction, so a condition check and
+the write it guards are atomic across threads and processes. The database
+runs in WAL mode so reads never wait for writers, and each thread keeps its
+own connection for the life of the process.
+
+DynamoDB Streams are not emulated: DIET_LOG_WRITE_MODE=stream needs DynamoDB.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from boto3.dynamodb.types import Binary, TypeDeserializer, TypeSerializer
+
+from expressions import (
+    apply_update,
+    client_error,
+    copy_item,
+    copy_value,
+    evaluate_parsed,
+    normalize,
+    parse_condition,
+    project,
+)
+from table_schemas import TABLE_SCHEMAS
+
+logger = logging.getLogger(__name__)
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Operations a batch_writer applies per transaction
+SQLITE_BATCH_FLUSH_SIZE = int(os.environ.get("SQLITE_BATCH_FLUSH_SIZE", "100"))
+
+# Indexed columns for attributes that scans filter on, beyond keys and GSIs
+SQLITE_EXTRA_INDEXES = {
+    "DietLogs": [("userId", "date")],
+    "TrainerAssignments": [("trainerId", "status")],
+}
+
+_ITEM_COLUMN = "_item"
+# Sorts after any character DynamoDB allows in a string, for begins_with ranges
+_MAX_CHAR = "\U0010ffff"
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _sql_value(value):
+    """Column value for an attribute: scalars only; anything else is not indexed."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (bytes, Binary)):
+        return bytes(value)
+    return None
+
+
+def _encode(item: dict) -> str:
+    typed = {}
+    for key, value in item.items():
+        attr = _serializer.serialize(value)
+        if "B" in attr:
+            attr = {"B": bytes(attr["B"]).hex()}
+        typed[key] = attr
+    return json.dumps(typed, separators=(",", ":"))
+
+
+def _decode(raw: str) -> dict:
+    item = {}
+    for key, attr in json.loads(raw).items():
+        if "B" in attr:
+            attr = {"B": bytes.fromhex(attr["B"])}
+        item[key] = _deserializer.deserialize(attr)
+    return item
+
+
+def _conjuncts(node):
+    """Top-level AND terms of a parsed condition."""
+    if node[0] == "and":
+        return _conjuncts(node[1]) + _conjuncts(node[2])
+    return [node]
+
+
+def _path_attr(node):
+    """Attribute name for a single-segment path operand, else None."""
+    if node[0] == "path" and len(node[1]) == 1 and isinstance(node[1][0], str):
+        return node[1][0]
+    return None
+
+
+class _Meta:
+    def __init__(self, client):
+        self.client = client
+
+
+class _BatchWriter:
+    """Buffers puts and deletes and applies them in chunked transactions."""
+
+    def __init__(self, table):
+        self.table = table
+        self._ops = {}  # key tuple -> (action, item or key); later writes to a key win
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._flush()
+        return False
+
+    def put_item(self, Item):
+        item = copy_item(Item)
+        self._ops[self.table._key_tuple(item)] = ("put", item)
+        self._maybe_flush()
+
+    def delete_item(self, Key):
+        self._ops[self.table._key_tuple(Key)] = ("delete", Key)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self._ops) >= SQLITE_BATCH_FLUSH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if not self._ops:
+            return
+        with self.table.resource.transaction() as conn:
+            for action, payload in self._ops.values():
+                if action == "put":
+                    self.table._store(conn, payload)
+                else:
+                    self.table._remove(conn, payload)
+        self._ops.clear()
+
+
+class SQLiteTable:
+    """boto3 Table subset over one SQL table."""
+
+    def __init__(self, resource, name, schema):
+        self.resource = resource
+        self.name = self.table_name = name
+        self.hash_key = schema["hash"]
+        self.range_key = schema.get("range")
+        self.indexes = schema.get("indexes", {})
+        self.meta = _Meta(resource.meta.client)
+
+        self.key_attrs = [self.hash_key] + ([self.range_key] if self.range_key else [])
+        extra = SQLITE_EXTRA_INDEXES.get(name, [])
+        columns = list(self.key_attrs)
+        for index in list(self.indexes.values()):
+            columns += [index["hash"]] + ([index["range"]] if index.get("range") else [])
+        for attrs in extra:
+            columns += list(attrs)
+        self.columns = list(dict.fromkeys(columns))
+        self._extra_indexes = extra
+        self._table = _quote(name)
+
+    # -- schema -------------------------------------------------------------
+
+    def create(self, conn):
+        column_defs = ", ".join(_quote(c) for c in self.columns)
+        primary_key = ", ".join(_quote(k) for k in self.key_attrs)
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._table} ({column_defs}, "
+            f"{_quote(_ITEM_COLUMN)} TEXT NOT NULL, PRIMARY KEY ({primary_key})) WITHOUT ROWID"
+        )
+        for index_name, index in self.indexes.items():
+            attrs = [index["hash"]] + ([index["range"]] if index.get("range") else [])
+            self._create_index(conn, index_name, attrs + self.key_attrs)
+        for attrs in self._extra_indexes:
+            self._create_index(conn, "_".join(attrs), list(attrs) + self.key_attrs)
+
+    def _create_index(self, conn, suffix, attrs):
+        cols = ", ".join(_quote(a) for a in dict.fromkeys(attrs))
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote(f'{self.name}__{suffix}')} ON {self._table} ({cols})")
+
+    # -- row helpers --------------------------------------------------------
+
+    def _key_tuple(self, item):
+        try:
+            return tuple(_sql_value(item[k]) for k in self.key_attrs)
+        except KeyError as exc:
+            raise client_error(
+                "ValidationException", f"The provided key element does not match the schema: {exc}", "Key"
+            ) from None
+
+    def _key_dict(self, item, attrs):
+        return {k: item[k] for k in attrs if k in item}
+
+    def _load(self, conn, key):
+        where = " AND ".join(f"{_quote(k)} = ?" for k in self.key_attrs)
+        row = conn.execute(
+            f"SELECT {_quote(_ITEM_COLUMN)} FROM {self._table} WHERE {where}", self._key_tuple(key)
+        ).fetchone()
+        return _decode(row[0]) if row else None
+
+    def _store(self, conn, item):
+        self._key_tuple(item)  # validates the key is present
+        names = ", ".join(_quote(c) for c in self.columns + [_ITEM_COLUMN])
+        marks = ", ".join("?" for _ in range(len(self.columns) + 1))
+        values = [_sql_value(item.get(c)) for c in self.columns] + [_encode(item)]
+        conn.execute(f"INSERT OR REPLACE INTO {self._table} ({names}) VALUES ({marks})", values)
+
+    def _remove(self, conn, key):
+        where = " AND ".join(f"{_quote(k)} = ?" for k in self.key_attrs)
+        conn.execute(f"DELETE FROM {self._table} WHERE {where}", self._key_tuple(key))
+
+    @staticmethod
+    def _check(condition, current, names, values, operation):
+        if condition is None:
+            return
+        if not evaluate_parsed(parse_condition(condition, names, values), current or {}):
+            raise client_error("ConditionalCheckFailedException", "The conditional request failed", operation)
+
+    # -- item operations ----------------------------------------------------
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, ConsistentRead=False):
+        item = self._load(self.resource.connection(), Key)
+        if item is None:
+            return {}
+        return {"Item": project(item, ProjectionExpression, ExpressionAttributeNames)}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnValues="NONE"):
+        new_item = copy_item(Item)
+        with self.resource.transaction() as conn:
+            old = self._load(conn, new_item) if ConditionExpression or ReturnValues == "ALL_OLD" else None
+            self._check(ConditionExpression, old, ExpressionAttributeNames, ExpressionAttributeValues, "PutItem")
+            self._store(conn, new_item)
+        if ReturnValues == "ALL_OLD" and old:
+            return {"Attributes": old}
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues="NONE"):
+        with self.resource.transaction() as conn:
+            old = self._load(conn, Key)
+            self._check(ConditionExpression, old, ExpressionAttributeNames, ExpressionAttributeValues, "UpdateItem")
+            item = copy_item(old) if old else copy_item(Key)
+            touched = apply_update(item, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+            self._store(conn, item)
+        if ReturnValues == "ALL_NEW":
+            return {"Attributes": copy_item(item)}
+        if ReturnValues == "UPDATED_NEW":
+            return {"Attributes": {k: copy_value(item[k]) for k in touched if k in item}}
+        if ReturnValues == "ALL_OLD" and old:
+            return {"Attributes": old}
+        if ReturnValues == "UPDATED_OLD" and old:
+            return {"Attributes": {k: old[k] for k in touched if k in old}}
+        return {}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues="NONE"):
+        with self.resource.transaction() as conn:
+            old = self._load(conn, Key)
+            self._check(ConditionExpression, old, ExpressionAttributeNames, ExpressionAttributeValues, "DeleteItem")
+            self._remove(conn, Key)
+        if ReturnValues == "ALL_OLD" and old:
+            return {"Attributes": old}
+        return {}
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _BatchWriter(self)
+
+    # -- reads --------------------------------------------------------------
+
+    def _index_keys(self, index_name):
+        if not index_name:
+            return self.hash_key, self.range_key
+        if index_name not in self.indexes:
+            raise client_error("ValidationException", f"The table does not have the specified index: {index_name}", "Query")
+        index = self.indexes[index_name]
+        return index["hash"], index.get("range")
+
+    def _key_condition_sql(self, node, hash_key, range_key):
+        """WHERE terms for a parsed key condition (hash equality plus optional range condition)."""
+        clauses, params = [], []
+        for term in _conjuncts(node):
+            kind = term[0]
+            if kind == "cmp" and _path_attr(term[2]) in (hash_key, range_key) and term[3][0] == "value":
+                attr, op, value = _path_attr(term[2]), term[1], term[3][1]
+                if attr == hash_key and op != "=":
+                    break
+                clauses.append(f"{_quote(attr)} {op} ?")
+                params.append(_sql_value(value))
+            elif kind == "between" and _path_attr(term[1]) == range_key:
+                clauses.append(f"{_quote(range_key)} BETWEEN ? AND ?")
+                params += [_sql_value(term[2][1]), _sql_value(term[3][1])]
+            elif kind == "bool" and term[1][1] == "begins_with" and _path_attr(term[1][2][0]) == range_key:
+                prefix = term[1][2][1][1]
+                clauses.append(f"{_quote(range_key)} >= ? AND {_quote(range_key)} < ?")
+                upper = prefix + _MAX_CHAR if isinstance(prefix, str) else bytes(prefix) + b"\xff"
+                params += [_sql_value(prefix), upper]
+            else:
+                break
+        else:
+            return clauses, params
+        raise client_error("ValidationException", "Query key condition not supported", "Query")
+
+    def _filter_pushdown(self, node):
+        """Equality terms of a filter that hit indexed columns, as WHERE terms."""
+        clauses, params = [], []
+        for term in _conjuncts(node):
+            if term[0] == "cmp" and term[1] == "=" and term[3][0] == "value":
+                attr, value = _path_attr(term[2]), _sql_value(term[3][1])
+                if attr in self.columns and value is not None:
+                    clauses.append(f"{_quote(attr)} = ?")
+                    params.append(value)
+        return clauses, params
+
+    def _select(self, where, params, order_attrs, descending, Limit, ExclusiveStartKey, FilterExpression,
+                ProjectionExpression, names, values, Select):
+        clauses, params = list(where), list(params)
+        filter_node = None
+        if FilterExpression is not None:
+            filter_node = parse_condition(FilterExpression, names, values)
+            pushed, pushed_params = self._filter_pushdown(filter_node)
+            clauses += pushed
+            params += pushed_params
+        if ExclusiveStartKey:
+            cols = ", ".join(_quote(a) for a in order_attrs)
+            marks = ", ".join("?" for _ in order_attrs)
+            clauses.append(f"({cols}) {'<' if descending else '>'} ({marks})")
+            params += [_sql_value(ExclusiveStartKey.get(a)) for a in order_attrs]
+
+        sql = f"SELECT {_quote(_ITEM_COLUMN)} FROM {self._table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        direction = " DESC" if descending else ""
+        sql += " ORDER BY " + ", ".join(f"{_quote(a)}{direction}" for a in order_attrs)
+        if Limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(Limit) + 1)
+        rows = self.resource.connection().execute(sql, params).fetchall()
+
+        last_key = None
+        if Limit is not None and len(rows) > Limit:
+            rows = rows[:Limit]
+            last_key = self._key_dict(_decode(rows[-1][0]), order_attrs)
+        out = []
+        for (raw,) in rows:
+            item = _decode(raw)
+            if filter_node is not None and not evaluate_parsed(filter_node, item):
+                continue
+            out.append(project(item, ProjectionExpression, names))
+        resp = {"Count": len(out), "ScannedCount": len(rows)}
+        if Select != "COUNT":
+            resp["Items"] = out
+        if last_key:
+            resp["LastEvaluatedKey"] = last_key
+        return resp
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None, ProjectionExpression=None,
+              ExpressionAttributeNames=None, ExpressionAttributeValues=None, Limit=None,
+              ScanIndexForward=True, ExclusiveStartKey=None, ConsistentRead=False, Select=None):
+        hash_key, range_key = self._index_keys(IndexName)
+        node = parse_condition(KeyConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues,
+                               is_key_condition=True)
+        where, params = self._key_condition_sql(node, hash_key, range_key)
+        if range_key:
+            where.append(f"{_quote(range_key)} IS NOT NULL")
+        order_attrs = list(dict.fromkeys(([range_key] if range_key else []) + self.key_attrs))
+        # boto3 condition objects carry their own placeholders; resolve the
+        # filter and projection of this call against the merged set
+        _, names, values = normalize(KeyConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues,
+                                     is_key_condition=True)
+        return self._select(where, params, order_attrs, not ScanIndexForward, Limit, ExclusiveStartKey,
+                            FilterExpression, ProjectionExpression, names, values, Select)
+
+    def scan(self, FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+             ExpressionAttributeValues=None, Limit=None, ExclusiveStartKey=None, IndexName=None,
+             ConsistentRead=False, Select=None):
+        hash_key, range_key = self._index_keys(IndexName)
+        where = [f"{_quote(hash_key)} IS NOT NULL"]
+        order_attrs = list(dict.fromkeys([hash_key] + ([range_key] if range_key else []) + self.key_attrs))
+        return self._select(where, [], order_attrs, False, Limit, ExclusiveStartKey, FilterExpression,
+                            ProjectionExpression, ExpressionAttributeNames, ExpressionAttributeValues, Select)
+
+
+class SQLiteClient:
+    """Low-level client calls used by the domain modules (typed attribute values)."""
+
+    def __init__(self, resource):
+        self.resource = resource
+
+    @staticmethod
+    def _plain(attrs):
+        return {k: _deserializer.deserialize(v) for k, v in (attrs or {}).items()}
+
+    def transact_write_items(self, TransactItems, ClientRequestToken=None):
+        with self.resource.transaction() as conn:
+            staged, reasons, failed = [], [], False
+            for entry in TransactItems:
+                (action, spec), = entry.items()
+                table = self.resource.Table(spec["TableName"])
+                names = spec.get("ExpressionAttributeNames")
+                values = self._plain(spec.get("ExpressionAttributeValues"))
+                if action == "Put":
+                    new_item = self._plain(spec["Item"])
+                    key = new_item
+                else:
+                    new_item = None
+                    key = self._plain(spec["Key"])
+                current = table._load(conn, key)
+                condition = spec.get("ConditionExpression")
+                if condition and not evaluate_parsed(parse_condition(condition, names, values), current or {}):
+                    reasons.append({"Code": "ConditionalCheckFailed"})
+                    failed = True
+                    continue
+                reasons.append({"Code": "None"})
+                if action == "Update":
+                    new_item = copy_item(current) if current else key
+                    apply_update(new_item, spec["UpdateExpression"], names, values)
+                staged.append((table, action, key, new_item))
+            if failed:
+                err = client_error("TransactionCanceledException", "Transaction cancelled", "TransactWriteItems")
+                err.response["CancellationReasons"] = reasons
+                raise err
+            for table, action, key, new_item in staged:
+                if action == "Delete":
+                    table._remove(conn, key)
+                elif action in ("Put", "Update"):
+                    table._store(conn, new_item)
+        return {}
+
+
+class SQLiteResource:
+    """boto3 DynamoDB service resource subset over one SQLite database file."""
+
+    def __init__(self, path: str, schemas=None):
+        self.path = path
+        self.schemas = schemas or TABLE_SCHEMAS
+        self.meta = _Meta(SQLiteClient(self))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._tables = {}
+        logger.info("Using SQLite storage at %s", path)
+
+    def connection(self):
+        """This thread's connection, opened once and reused."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Serialize a read-check-write with other writers (threads and processes)."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def Table(self, name):
+        with self._lock:
+            table = self._tables.get(name)
+            if table is None:
+                if name not in self.schemas:
+                    raise client_error("ResourceNotFoundException", f"Requested resource not found: {name}", "DescribeTable")
+                table = SQLiteTable(self, name, self.schemas[name])
+                table.create(self.connection())
+                self._tables[name] = table
+            return table
+
+    def batch_get_item(self, RequestItems):
+        conn = self.connection()
+        responses = {}
+        for name, spec in RequestItems.items():
+            table = self.Table(name)
+            found = []
+            for key in spec["Keys"]:
+                item = table._load(conn, key)
+                if item is not None:
+                    found.append(project(item, spec.get("ProjectionExpression"), spec.get("ExpressionAttributeNames")))
+            responses[name] = found
+        return {"Responses": responses, "UnprocessedKeys": {}}
@@ -1,7 +1,7 @@
 import logging
 from decimal import Decimal
 
-from dynamodb_client import daily_summaries_table
+from dynamodb_client import dynamodb, daily_summaries_table, DAILY_SUMMARIES_TABLE_NAME, USERS_TABLE_NAME
 from utils import get_today_iso_date
 
 logger = logging.getLogger(__name__)
@@ -13,34 +13,159 @@ def _to_decimal(value, default="0"):
         return Decimal(default)
     return Decimal(str(value))
 
-def get_today_summary(user_id: str):
-    """Fetch or construct today's summary for the given user."""
-    date = get_today_iso_date()
+# mealType values with their own subtotals; anything else (or none) is "other"
+MEAL_TYPES = ("breakfast", "lunch", "dinner", "snack")
+OTHER_MEAL = "other"
+# DietLogs macro attribute -> running total in DailySummaries
+MACRO_TOTALS = {
+    "calories": "totalCalories",
+    "protein": "totalProtein",
+    "carbs": "totalCarbs",
+    "fat": "totalFat",
+}
+# Per-meal subtotals are flat attributes (meal_lunch_totalCalories, ...) so
+# the same ADD that bumps the day totals can create them; ADD cannot create
+# a path inside a map that does not exist yet.
+MEAL_ATTR_PREFIX = "meal_"
+MEAL_SUBTOTALS = tuple(MACRO_TOTALS.values()) + ("entryCount",)
+MEAL_SUMMARY_ATTRS = tuple(
+    f"{MEAL_ATTR_PREFIX}{meal}_{total}" for meal in MEAL_TYPES + (OTHER_MEAL,) for total in MEAL_SUBTOTALS
+)
+
+
+def meal_key(meal_type) -> str:
+    return meal_type if meal_type in MEAL_TYPES else OTHER_MEAL
+
+
+def _zero_subtotal() -> dict:
+    subtotal = {macro: Decimal("0") for macro in MACRO_TOTALS}
+    subtotal["entryCount"] = 0
+    return subtotal
+
+
+def meal_subtotals(items, sign: int = 1) -> dict:
+    """
+    Per-meal macros and entry counts over DietLogs rows, times `sign`:
+    {meal: {"calories", "protein", "carbs", "fat", "entryCount"}}.
+    """
+    subtotals = {}
+    for item in items:
+        acc = subtotals.setdefault(meal_key(item.get("mealType")), _zero_subtotal())
+        for macro in MACRO_TOTALS:
+            acc[macro] += sign * _to_decimal(item.get(macro))
+        acc["entryCount"] += sign
+    return subtotals
+
+
+def merge_meal_subtotals(into: dict, other: dict) -> dict:
+    """Add `other` into `into` (both from meal_subtotals) and return `into`."""
+    for meal, values in other.items():
+        acc = into.setdefault(meal, _zero_subtotal())
+        for key, value in values.items():
+            acc[key] += value
+    return into
+
+
+def shape_summary(item: dict) -> dict:
+    """
+    Move the flat meal_* subtotals of a summary row into a `meals` map.
+    The four standard meals are always present, with zeros if nothing was logged.
+    """
+    meals = {meal: {total: 0 for total in MEAL_SUBTOTALS} for meal in MEAL_TYPES}
+    for attr in [a for a in item if a.startswith(MEAL_ATTR_PREFIX)]:
+        meal, _, total = attr[len(MEAL_ATTR_PREFIX):].partition("_")
+        meals.setdefault(meal, {t: 0 for t in MEAL_SUBTOTALS})[total] = item.pop(attr)
+    item["meals"] = meals
+    return item
+
+
+def _empty_summary(user_id: str, date: str):
+    return shape_summary({
+        "userId": user_id,
+        "date": date,
+        "totalCalories": 0,
+        "totalProtein": 0,
+        "totalCarbs": 0,
+        "totalFat": 0,
+        "entryCount": 0,
+    })
+
+def get_summary(user_id: str, date: str, consistent_read: bool = False):
+    """
+    Fetch the summary row for a user/date (meal subtotals under `meals`),
+    or an empty summary if none exists.
+    """
     resp = daily_summaries_table.get_item(
         Key={
             "userId": user_id,
             "date": date,
-        }
+        },
+        ConsistentRead=consistent_read,
     )
     item = resp.get("Item")
-    if not item:
-        # Default empty summary
-        logger.info("No summary found for user_id=%s date=%s; returning empty summary", user_id, date)
-        item = {
-            "userId": user_id,
-            "date": date,
-            "totalCalories": 0,
-            "totalProtein": 0,
-            "totalCarbs": 0,
-            "totalFat": 0,
-            "entryCount": 0,
+    return shape_summary(item) if item else _empty_summary(user_id, date)
+
+# target key in Users.targets -> running total in DailySummaries
+TARGET_TOTALS = MACRO_TOTALS
+
+
+def build_progress(summary: dict, targets: dict):
+    """Consumed vs. target for each macro; remaining never goes below zero."""
+    progress = {}
+    for key, total_attr in TARGET_TOTALS.items():
+        consumed = _to_decimal(summary.get(total_attr))
+        target = _to_decimal(targets.get(key))
+        progress[key] = {
+            "consumed": consumed,
+            "target": target,
+            "remaining": max(target - consumed, Decimal("0")),
+            "percent": int((consumed * 100 / target).to_integral_value()) if target > 0 else None,
         }
+    return progress
+
+
+def get_today_summary(user_id: str):
+    """
+    Fetch or construct today's summary for the given user, with its
+    per-meal breakdown, the user's stored targets and progress against them. Both rows come back from a
+    single BatchGetItem so the macro bar needs no second request.
+    """
+    date = get_today_iso_date()
+    request = {
+        USERS_TABLE_NAME: {
+            "Keys": [{"userId": user_id}],
+            "ProjectionExpression": "userId, targets",
+        },
+        DAILY_SUMMARIES_TABLE_NAME: {
+            "Keys": [{"userId": user_id, "date": date}],
+        },
+    }
+    responses = {USERS_TABLE_NAME: [], DAILY_SUMMARIES_TABLE_NAME: []}
+    while request:
+        resp = dynamodb.batch_get_item(RequestItems=request)
+        for name, items in resp.get("Responses", {}).items():
+            responses[name].extend(items)
+        request = resp.get("UnprocessedKeys") or {}
+
+    summaries = responses[DAILY_SUMMARIES_TABLE_NAME]
+    if summaries:
+        item = shape_summary(summaries[0])
+    else:
+        logger.info("No summary found for user_id=%s date=%s; returning empty summary", user_id, date)
+        item = _empty_summary(user_id, date)
+
+    users = responses[USERS_TABLE_NAME]
+    targets = users[0].get("targets") if users else None
+    if targets:
+        item["targets"] = targets
+        item["progress"] = build_progress(item, targets)
     return item
 
-def update_daily_summary(user_id: str, date: str, calories, protein, carbs, fat):
+def update_daily_summary(user_id: str, date: str, calories, protein, carbs, fat, entry_count: int = 1, meals=None):
     """
     MVP implementation: read current summary, add values, write back.
     (Not concurrency-safe for heavy load, but fine for this project.)
+    `meals` is a meal_subtotals result to add to the per-meal subtotals.
     """
     logger.info(
         "Updating daily summary for user_id=%s date=%s with calories=%s protein=%s carbs=%s fat=%s",
@@ -73,8 +198,47 @@ def update_daily_summary(user_id: str, date: str, calories, protein, carbs, fat)
     item["totalProtein"] = _to_decimal(item.get("totalProtein")) + _to_decimal(protein)
     item["totalCarbs"] = _to_decimal(item.get("totalCarbs")) + _to_decimal(carbs)
     item["totalFat"] = _to_decimal(item.get("totalFat")) + _to_decimal(fat)
-    item["entryCount"] = int(item.get("entryCount", 0)) + 1
+    item["entryCount"] = int(item.get("entryCount", 0)) + entry_count
+    for meal, values in (meals or {}).items():
+        for macro, total in MACRO_TOTALS.items():
+            attr = f"{MEAL_ATTR_PREFIX}{meal}_{total}"
+            item[attr] = _to_decimal(item.get(attr)) + values[macro]
+        attr = f"{MEAL_ATTR_PREFIX}{meal}_entryCount"
+        item[attr] = int(item.get(attr, 0)) + values["entryCount"]
 
     daily_summaries_table.put_item(Item=item)
     logger.debug("Persisted daily summary for user_id=%s date=%s: %s", user_id, date, item)
-    return item
+    return shape_summary(item)
+
+
+def build_summary_increment(user_id: str, date: str, calories, protein, carbs, fat, entry_count: int = 1, meals=None):
+    """
+    Build an atomic ADD update for the summary row (creates it if missing).
+    Returned as update_item kwargs plus TableName, so it can be used directly
+    or as the Update part of a TransactWriteItems request. `meals` (a
+    meal_subtotals result) adds to the per-meal subtotals in the same update.
+    """
+    clauses = [
+        "totalCalories :cal", "totalProtein :pro", "totalCarbs :carbs", "totalFat :fat", "entryCount :n",
+    ]
+    values = {
+        ":cal": _to_decimal(calories),
+        ":pro": _to_decimal(protein),
+        ":carbs": _to_decimal(carbs),
+        ":fat": _to_decimal(fat),
+        ":n": entry_count,
+    }
+    for meal, subtotal in sorted((meals or {}).items()):
+        for key, value in subtotal.items():
+            if not value:
+                continue
+            total = MACRO_TOTALS.get(key, key)
+            placeholder = f":{meal}_{total}"
+            clauses.append(f"{MEAL_ATTR_PREFIX}{meal}_{total} {placeholder}")
+            values[placeholder] = value if key == "entryCount" else _to_decimal(value)
+    return {
+        "TableName": DAILY_SUMMARIES_TABLE_NAME,
+        "Key": {"userId": user_id, "date": date},
+        "UpdateExpression": "ADD " + ", ".join(clauses),
+        "ExpressionAttributeValues": values,
+    }
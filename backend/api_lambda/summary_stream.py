@@ -0,0 +1,139 @@
+"""
+DynamoDB Streams consumer that keeps DailySummaries in step with DietLogs.
+
+Used when DIET_LOG_WRITE_MODE is "stream": the API only writes DietLogs and
+this handler folds each batch of INSERT/MODIFY/REMOVE records per
+(userId, date) into a single ADD update per summary row, day totals and
+per-meal subtotals together.
+
+Rows deleted by the compaction job carry `archived` and their REMOVE
+records are ignored: archiving a month must not change its summaries.
+
+Lambda retries a failed batch, so updates must be idempotent. Each update
+is conditioned on the row's streamSeq being older than the newest record
+folded into it, and sets streamSeq to that record. Rows already applied by
+an earlier attempt fail the condition and are skipped. This relies on
+records for one userId arriving in order, which Streams guarantees because
+userId is the table's partition key.
+"""
+
+import logging
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+import metrics
+from dynamodb_client import daily_summaries_table
+from summaries import build_summary_increment, meal_subtotals, merge_meal_subtotals
+
+logger = logging.getLogger(__name__)
+
+# Sequence numbers are 21-40 digit strings; pad so string order is numeric order
+SEQUENCE_WIDTH = 40
+
+_deserializer = TypeDeserializer()
+
+# DietLogs attributes, also the build_summary_increment argument names
+_MACROS = ("calories", "protein", "carbs", "fat")
+
+
+def _image(raw):
+    if not raw:
+        return None
+    return {k: _deserializer.deserialize(v) for k, v in raw.items()}
+
+
+def fold_records(records):
+    """
+    Net change per (userId, date) across a batch of stream records.
+    Returns {(userId, date): {"calories", "protein", "carbs", "fat", "entryCount", "meals", "seq"}}.
+    """
+    folded = {}
+    for record in records:
+        change = record.get("dynamodb") or {}
+        event_name = record.get("eventName")
+        new = _image(change.get("NewImage"))
+        old = _image(change.get("OldImage"))
+        if event_name == "INSERT":
+            deltas = ((new, 1),)
+        elif event_name == "REMOVE" and old and old.get("archived"):
+            # Deleted by compaction.py after archiving; the day's totals stand
+            metrics.increment("summary_stream.archived_skipped")
+            continue
+        elif event_name == "REMOVE":
+            deltas = ((old, -1),)
+        elif event_name == "MODIFY":
+            deltas = ((old, -1), (new, 1))
+        else:
+            continue
+
+        seq = str(change.get("SequenceNumber", "")).zfill(SEQUENCE_WIDTH)
+        for image, sign in deltas:
+            if image is None:
+                # Stream must be NEW_AND_OLD_IMAGES for the consumer to see macros
+                logger.warning("Stream record %s has no image; skipping", record.get("eventID"))
+                metrics.increment("summary_stream.missing_image")
+                continue
+            key = (image["userId"], image["date"])
+            acc = folded.setdefault(key, {m: Decimal("0") for m in _MACROS})
+            acc.setdefault("entryCount", 0)
+            acc.setdefault("meals", {})
+            for macro in _MACROS:
+                acc[macro] += sign * Decimal(str(image.get(macro, 0)))
+            acc["entryCount"] += sign
+            merge_meal_subtotals(acc["meals"], meal_subtotals([image], sign=sign))
+            acc["seq"] = max(acc.get("seq", ""), seq)
+    return folded
+
+
+def apply_fold(user_id: str, date: str, acc: dict) -> bool:
+    """Apply one folded increment; False if this batch already reached the row."""
+    increment = build_summary_increment(
+        user_id=user_id,
+        date=date,
+        calories=acc["calories"],
+        protein=acc["protein"],
+        carbs=acc["carbs"],
+        fat=acc["fat"],
+        entry_count=acc["entryCount"],
+        meals=acc["meals"],
+    )
+    try:
+        daily_summaries_table.update_item(
+            Key=increment["Key"],
+            UpdateExpression=increment["UpdateExpression"] + " SET streamSeq = :seq",
+            ConditionExpression="attribute_not_exists(streamSeq) OR streamSeq < :seq",
+            ExpressionAttributeValues={**increment["ExpressionAttributeValues"], ":seq": acc["seq"]},
+        )
+        return True
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def lambda_handler(event, context):
+    """Entry point for the DietLogs stream event source mapping."""
+    records = (event or {}).get("Records", [])
+    folded = fold_records(records)
+
+    applied = skipped = 0
+    for (user_id, date), acc in folded.items():
+        meals_changed = any(v for values in acc["meals"].values() for v in values.values())
+        if acc["entryCount"] == 0 and not any(acc[m] for m in _MACROS) and not meals_changed:
+            # e.g. a MODIFY that only touched the revision or updatedAt
+            continue
+        if apply_fold(user_id, date, acc):
+            applied += 1
+        else:
+            skipped += 1
+            logger.info("Summary for user_id=%s date=%s already includes seq %s; skipping",
+                        user_id, date, acc["seq"])
+
+    metrics.increment("summary_stream.records", len(records))
+    metrics.increment("summary_stream.updates", applied)
+    if skipped:
+        metrics.increment("summary_stream.duplicate_skipped", skipped)
+    metrics.maybe_emit(force=True)
+    return {"records": len(records), "summaries": applied, "skipped": skipped}
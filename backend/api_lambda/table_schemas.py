@@ -0,0 +1,35 @@
+"""
+Key schemas of every table, mirroring infra/terraform/main.tf.
+
+DynamoDB itself never reads this; the SQLite backend and the in-memory
+stand-ins use it to know each table's keys, secondary indexes and whether
+it has a stream. Keep it in step with Terraform when tables change.
+"""
+
+# "hash"/"range": primary key attributes; "indexes": GSIs by name;
+# "stream": DynamoDB Streams enabled (NEW_AND_OLD_IMAGES)
+TABLE_SCHEMAS = {
+    "Users": {"hash": "userId"},
+    "DietLogs": {"hash": "userId", "range": "logTimestamp", "stream": True},
+    "DailySummaries": {
+        "hash": "userId",
+        "range": "date",
+        "indexes": {"date-index": {"hash": "date", "range": "userId"}},
+    },
+    "Foods": {"hash": "foodId"},
+    "Trainers": {"hash": "trainerId"},
+    "TrainerAssignments": {"hash": "userId", "range": "trainerId"},
+    "Messages": {"hash": "conversationId", "range": "timestamp"},
+    "AppState": {"hash": "stateKey"},
+    "NotificationDigests": {"hash": "trainerId"},
+    "SavedMeals": {"hash": "userId", "range": "mealId"},
+    "MealFoods": {"hash": "foodId", "range": "mealRef"},
+    "ConversationIndex": {
+        "hash": "trainerId",
+        "range": "conversationId",
+        "indexes": {"trainer-recency-index": {"hash": "trainerId", "range": "lastMessageAt"}},
+    },
+    "RateLimits": {"hash": "limitKey"},
+    "RecentFoods": {"hash": "userId"},
+    "DietLogArchives": {"hash": "userId", "range": "month"},
+}
@@ -1,14 +1,16 @@
 import uuid
 import os
 import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
 
 from dynamodb_client import trainers_table, trainer_assignments_table
+from assignments import record_assignment, record_unassignment
+from deadlines import CLIENT_CONFIG, instrument
 
-from utils import _now_iso
+from utils import _now_iso, projection_kwargs
 
 
-sns = boto3.client("sns")
+sns = instrument(boto3.client("sns", config=CLIENT_CONFIG))
 TRAINER_NOTIFICATIONS_TOPIC_ARN = os.environ.get("TRAINER_NOTIFICATIONS_TOPIC_ARN")
 
 def create_trainer(body: dict):
@@ -115,6 +117,7 @@ def assign_trainer(body: dict):
         "assignedAt": _now_iso(),
     }
     trainer_assignments_table.put_item(Item=assignment_item)
+    record_assignment(user_id, trainer_id)
 
     # Increment trainer's currentClientCount (MVP: no concurrency handling)
     curr_c = int(assigned_trainer.get("currentClientCount", 0))
@@ -178,23 +181,35 @@ def unassign_trainer(body: dict):
                 ExpressionAttributeValues={":c": new_count},
             )
 
+    record_unassignment(user_id)
+
     return 200, {"message": "Trainer unassigned for user", "userId": user_id}
 
 
-def get_trainer_clients(trainer_id: str):
+# Attributes a client may request via `fields=` on /trainer/clients
+TRAINER_CLIENT_FIELDS = {"userId", "trainerId", "status", "assignedAt"}
+
+
+def get_trainer_clients(trainer_id: str, fields=None):
     """
     Get list of users assigned to a trainer.
     MVP approach:
       - Scan TrainerAssignments table and filter by trainerId & status == 'active'
+        server-side, so only matching (and, with `fields`, projected) items come back
       (Later we could add a GSI for trainerId)
     """
 
-    resp = trainer_assignments_table.scan()
-    items = resp.get("Items", [])
-
-    clients = [
-        it for it in items
-        if it.get("trainerId") == trainer_id and it.get("status") == "active"
-    ]
+    scan_kwargs = {
+        "FilterExpression": Attr("trainerId").eq(trainer_id) & Attr("status").eq("active"),
+        **projection_kwargs(fields),
+    }
+    clients = []
+    while True:
+        resp = trainer_assignments_table.scan(**scan_kwargs)
+        clients.extend(resp.get("Items", []))
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        scan_kwargs["ExclusiveStartKey"] = last_key
 
     return clients
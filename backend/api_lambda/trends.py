@@ -0,0 +1,167 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date as date_cls, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from boto3.dynamodb.conditions import Key
+
+from dynamodb_client import daily_summaries_table
+from summaries import shape_summary, MEAL_SUMMARY_ATTRS
+from utils import get_today_iso_date
+
+logger = logging.getLogger(__name__)
+
+TRENDS_CACHE_MAX_ENTRIES = int(os.environ.get("TRENDS_CACHE_MAX_ENTRIES", "512"))
+TRENDS_CACHE_TTL_SECONDS = int(os.environ.get("TRENDS_CACHE_TTL_SECONDS", "300"))
+MAX_TREND_DAYS = 365
+MAX_TREND_WINDOW = 90
+
+# summary attribute -> short name used in the trends payload
+TREND_METRICS = {
+    "totalCalories": "calories",
+    "totalProtein": "protein",
+    "totalCarbs": "carbs",
+    "totalFat": "fat",
+}
+
+_cache_lock = threading.Lock()
+# (userId, start, end, window) -> (result, expires_at)
+_trends_cache = OrderedDict()
+
+
+def _round(value: Decimal) -> Decimal:
+    return value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def _load_summaries(user_id: str, start: str, end: str):
+    """All DailySummaries rows for the user between start and end (inclusive), in one query."""
+    query_kwargs = {
+        "KeyConditionExpression": Key("userId").eq(user_id) & Key("date").between(start, end),
+        "ProjectionExpression": ", ".join(
+            ("#d", "totalCalories", "totalProtein", "totalCarbs", "totalFat", "entryCount") + MEAL_SUMMARY_ATTRS
+        ),
+        "ExpressionAttributeNames": {"#d": "date"},
+    }
+    rows = {}
+    while True:
+        resp = daily_summaries_table.query(**query_kwargs)
+        for item in resp.get("Items", []):
+            rows[item["date"]] = item
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            return rows
+        query_kwargs["ExclusiveStartKey"] = last_key
+
+
+def _meal_breakdown(row: dict) -> dict:
+    """Per-meal values of a summary row, under the same short names as the day totals."""
+    meals = shape_summary(dict(row))["meals"]
+    return {
+        meal: {TREND_METRICS.get(attr, attr): value for attr, value in values.items()}
+        for meal, values in meals.items()
+    }
+
+
+def _compute_trends(rows: dict, first_day: date_cls, range_start: date_cls, end_day: date_cls, window: int):
+    """
+    Single pass over the dense day series: running window sums give the
+    rolling averages without re-summing each window, and deltas/streaks
+    fall out of the same loop. Days without a summary count as zero.
+    """
+    window_sums = {metric: Decimal(0) for metric in TREND_METRICS}
+    history = []  # dense per-day values, used to drop the day leaving the window
+    days = []
+    longest_streak = running_streak = streak_before_day = 0
+    previous = None
+
+    day = first_day
+    while day <= end_day:
+        row = rows.get(day.isoformat(), {})
+        values = {metric: Decimal(str(row.get(metric, 0))) for metric in TREND_METRICS}
+        logged = int(row.get("entryCount", 0)) > 0
+        history.append(values)
+
+        for metric in TREND_METRICS:
+            window_sums[metric] += values[metric]
+            if len(history) > window:
+                window_sums[metric] -= history[-window - 1][metric]
+
+        streak_before_day = running_streak
+        running_streak = running_streak + 1 if logged else 0
+
+        if day >= range_start:
+            longest_streak = max(longest_streak, running_streak)
+            divisor = Decimal(min(len(history), window))
+            days.append({
+                "date": day.isoformat(),
+                "entryCount": int(row.get("entryCount", 0)),
+                **{short: values[metric] for metric, short in TREND_METRICS.items()},
+                "meals": _meal_breakdown(row),
+                "rollingAverage": {
+                    short: _round(window_sums[metric] / divisor) for metric, short in TREND_METRICS.items()
+                },
+                "delta": {
+                    short: (values[metric] - previous[metric]) if previous is not None else None
+                    for metric, short in TREND_METRICS.items()
+                },
+            })
+        previous = values
+        day += timedelta(days=1)
+
+    # Today without logs yet should not break a streak that ran through yesterday
+    current_streak = running_streak or streak_before_day
+
+    return days, current_streak, longest_streak
+
+
+def get_summary_trends(user_id: str, window: int = 7, days: int = 30):
+    """
+    Rolling averages, day-over-day deltas and logging streaks over the last
+    `days` days (ending today), with a rolling window of `window` days.
+    Results are cached per (user, range, window) until a new log in the
+    range invalidates them, or the TTL bounds staleness from other containers.
+    """
+    end_day = date_cls.fromisoformat(get_today_iso_date())
+    range_start = end_day - timedelta(days=days - 1)
+    # Read window-1 extra days so the first rolling average is a full window
+    first_day = range_start - timedelta(days=window - 1)
+
+    cache_key = (user_id, range_start.isoformat(), end_day.isoformat(), window)
+    with _cache_lock:
+        cached = _trends_cache.get(cache_key)
+        if cached and cached[1] > time.monotonic():
+            _trends_cache.move_to_end(cache_key)
+            return cached[0]
+
+    rows = _load_summaries(user_id, first_day.isoformat(), end_day.isoformat())
+    series, current_streak, longest_streak = _compute_trends(rows, first_day, range_start, end_day, window)
+    result = {
+        "userId": user_id,
+        "window": window,
+        "from": range_start.isoformat(),
+        "to": end_day.isoformat(),
+        "days": series,
+        "currentStreak": current_streak,
+        "longestStreak": longest_streak,
+    }
+    logger.debug("Computed trends for user_id=%s over %s days (%s summaries read)", user_id, days, len(rows))
+
+    with _cache_lock:
+        _trends_cache[cache_key] = (result, time.monotonic() + TRENDS_CACHE_TTL_SECONDS)
+        _trends_cache.move_to_end(cache_key)
+        while len(_trends_cache) > TRENDS_CACHE_MAX_ENTRIES:
+            _trends_cache.popitem(last=False)
+    return result
+
+
+def invalidate_trends(user_id: str, date: str):
+    """Drop cached trends for this user whose range (including lead-in days) covers `date`."""
+    with _cache_lock:
+        for key in list(_trends_cache):
+            cached_user, start, end, window = key
+            lead_in_start = (date_cls.fromisoformat(start) - timedelta(days=window - 1)).isoformat()
+            if cached_user == user_id and lead_in_start <= date <= end:
+                del _trends_cache[key]
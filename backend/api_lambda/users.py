@@ -1,50 +1,217 @@
 import logging
 import uuid
 from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+
+from botocore.exceptions import ClientError
 
 from dynamodb_client import users_table
 
 logger = logging.getLogger(__name__)
 
+# TDEE multipliers for the Mifflin-St Jeor BMR
+ACTIVITY_FACTORS = {
+    "sedentary": Decimal("1.2"),
+    "light": Decimal("1.375"),
+    "moderate": Decimal("1.55"),
+    "active": Decimal("1.725"),
+    "very_active": Decimal("1.9"),
+}
+DEFAULT_ACTIVITY_LEVEL = "light"
 
-def create_user(body: dict):
+# Daily calorie adjustment applied to TDEE per goal
+GOAL_ADJUSTMENTS = {
+    "lose": Decimal("-500"),
+    "maintain": Decimal("0"),
+    "gain": Decimal("300"),
+}
+DEFAULT_GOAL = "maintain"
+
+MIN_CALORIE_TARGET = Decimal("1200")
+PROTEIN_GRAMS_PER_LB = Decimal("0.8")
+FAT_CALORIE_SHARE = Decimal("0.25")
+
+# Profile fields a PUT /users may change; role and createdAt are fixed
+UPDATABLE_FIELDS = (
+    "name", "email", "weightLbs", "heightFeet", "heightInches",
+    "gender", "age", "activityLevel", "goal",
+)
+NUMERIC_FIELDS = ("weightLbs", "heightFeet", "heightInches", "age")
+
+
+def _to_number(value):
+    """DynamoDB rejects floats, so numeric profile fields are stored as Decimal."""
+    if value is None or value == "":
+        return None
+    try:
+        number = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return None
+    # NaN cannot be compared and Infinity cannot be stored
+    return number if number.is_finite() else None
+
+
+def _invalid_numeric_field(body: dict):
+    """Error message for the first numeric profile field that is set but not a finite number."""
+    for k in NUMERIC_FIELDS:
+        value = body.get(k)
+        if value is not None and value != "" and _to_number(value) is None:
+            return f"{k} must be a finite number"
+    return None
+
+
+def compute_macro_targets(item: dict):
     """
-    Create a new user or trainer.
-    Required fields: name, role, weightLbs, heightFeet, heightInches, age.
+    Daily calorie and macro targets for a user profile, or None when the
+    profile is missing weight, height or age.
+    - BMR: Mifflin-St Jeor (gender-neutral constant when gender is unknown)
+    - TDEE: BMR x activity factor, then adjusted for the goal
+    - Protein by bodyweight, 25% of calories from fat, carbs take the rest
     """
+    weight_lbs = _to_number(item.get("weightLbs"))
+    height_feet = _to_number(item.get("heightFeet"))
+    height_inches = _to_number(item.get("heightInches")) or Decimal("0")
+    age = _to_number(item.get("age"))
+    if not weight_lbs or height_feet is None or not age:
+        return None
 
-    logger.info("Creating user with payload keys: %s", list(body.keys()))
+    weight_kg = weight_lbs * Decimal("0.45359237")
+    height_cm = (height_feet * 12 + height_inches) * Decimal("2.54")
+    gender = str(item.get("gender") or "").lower()
+    if gender in ("male", "m"):
+        offset = Decimal("5")
+    elif gender in ("female", "f"):
+        offset = Decimal("-161")
+    else:
+        offset = Decimal("-78")
+    bmr = 10 * weight_kg + Decimal("6.25") * height_cm - 5 * age + offset
+
+    activity_level = item.get("activityLevel")
+    if activity_level not in ACTIVITY_FACTORS:
+        activity_level = DEFAULT_ACTIVITY_LEVEL
+    goal = item.get("goal")
+    if goal not in GOAL_ADJUSTMENTS:
+        goal = DEFAULT_GOAL
+
+    tdee = bmr * ACTIVITY_FACTORS[activity_level]
+    calories = max(tdee + GOAL_ADJUSTMENTS[goal], MIN_CALORIE_TARGET)
+    protein = weight_lbs * PROTEIN_GRAMS_PER_LB
+    fat = calories * FAT_CALORIE_SHARE / 9
+    carbs = max((calories - protein * 4 - fat * 9) / 4, Decimal("0"))
+
+    return {
+        "calories": int(calories.to_integral_value()),
+        "protein": int(protein.to_integral_value()),
+        "carbs": int(carbs.to_integral_value()),
+        "fat": int(fat.to_integral_value()),
+        "bmr": int(bmr.to_integral_value()),
+        "tdee": int(tdee.to_integral_value()),
+        "activityLevel": activity_level,
+        "goal": goal,
+    }
+
+
+def build_user_item(body: dict):
+    """
+    Validate a create payload and build the Users item (with targets).
+    Returns (item, None) or (None, error message).
+    """
     name = body.get("name")
     role = body.get("role")  # "user" or "trainer"
     email = body.get("email")
-    weight_lbs = body.get("weightLbs")
-    height_feet = body.get("heightFeet")
-    height_inches = body.get("heightInches")
-    gender = body.get("gender")
-    age = body.get("age")
+    activity_level = body.get("activityLevel")
+    goal = body.get("goal")
 
     # Basic validation (MVP-level)
     if not name or role not in ("user", "trainer") or not email:
         logger.warning("User creation failed validation: name=%s role=%s email=%s", name, role, email)
-        return 400, {"error": "name and valid role ('user' or 'trainer') email are mandatory"}
-
-    user_id = str(uuid.uuid4())
-    created_at = datetime.now(timezone.utc).isoformat()
+        return None, "name and valid role ('user' or 'trainer') email are mandatory"
+    error = _invalid_numeric_field(body)
+    if error:
+        return None, error
 
     item = {
-        "userId": user_id,
+        "userId": str(uuid.uuid4()),
         "name": name,
         "role": role,
         "email":email,
-        "weightLbs": weight_lbs,
-        "heightFeet": height_feet,
-        "heightInches": height_inches,
-        "gender": gender,
-        "age": age,
-        "createdAt": created_at,
+        "weightLbs": _to_number(body.get("weightLbs")),
+        "heightFeet": _to_number(body.get("heightFeet")),
+        "heightInches": _to_number(body.get("heightInches")),
+        "gender": body.get("gender"),
+        "age": _to_number(body.get("age")),
+        "createdAt": datetime.now(timezone.utc).isoformat(),
     }
+    if activity_level:
+        item["activityLevel"] = activity_level
+    if goal:
+        item["goal"] = goal
+
+    # Targets are computed once here so the macro bar never has to
+    targets = compute_macro_targets(item)
+    if targets:
+        item["targets"] = targets
+    return item, None
+
+
+def create_user(body: dict):
+    """
+    Create a new user or trainer.
+    Required fields: name, role, weightLbs, heightFeet, heightInches, age.
+    """
+
+    logger.info("Creating user with payload keys: %s", list(body.keys()))
+    item, error = build_user_item(body)
+    if error:
+        return 400, {"error": error}
 
     users_table.put_item(Item=item)
 
-    logger.info("User created successfully: user_id=%s role=%s email=%s", user_id, role, email)
-    return 201, {"userId": user_id, "user": item}
+    logger.info("User created successfully: user_id=%s role=%s email=%s", item["userId"], item["role"], item["email"])
+    return 201, {"userId": item["userId"], "user": item}
+
+
+def update_user(body: dict):
+    """
+    Update profile fields of an existing user and recompute their targets.
+    Required fields: userId, plus at least one of UPDATABLE_FIELDS.
+    """
+    user_id = body.get("userId")
+    if not user_id:
+        return 400, {"error": "userId is required"}
+
+    changes = {k: body[k] for k in UPDATABLE_FIELDS if k in body}
+    if not changes:
+        return 400, {"error": f"nothing to update; allowed fields: {', '.join(UPDATABLE_FIELDS)}"}
+    error = _invalid_numeric_field(changes)
+    if error:
+        return 400, {"error": error}
+    for k in NUMERIC_FIELDS:
+        if k in changes:
+            changes[k] = _to_number(changes[k])
+
+    resp = users_table.get_item(Key={"userId": user_id})
+    item = resp.get("Item")
+    if not item:
+        return 404, {"error": "user not found"}
+
+    item.update(changes)
+    targets = compute_macro_targets(item)
+    if targets:
+        item["targets"] = targets
+    else:
+        item.pop("targets", None)
+    item["updatedAt"] = datetime.now(timezone.utc).isoformat()
+
+    try:
+        users_table.put_item(
+            Item=item,
+            ConditionExpression="attribute_exists(userId)",
+        )
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return 404, {"error": "user not found"}
+        raise
+
+    logger.info("User updated: user_id=%s fields=%s", user_id, sorted(changes))
+    return 200, {"userId": user_id, "user": item}
@@ -1,10 +1,17 @@
+import base64
+import gzip
 import json
 import logging
+import os
 from datetime import datetime, timezone
 from decimal import Decimal
 
 logger = logging.getLogger(__name__)
 
+# Responses smaller than this are not worth compressing
+GZIP_MIN_BYTES = int(os.environ.get("GZIP_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "5"))
+
 
 def _to_serializable(value):
     """Recursively convert Decimals to int/float for JSON encoding."""
@@ -18,19 +25,85 @@ def _to_serializable(value):
     return value
 
 
-def build_response(status_code: int, body: dict):
+def build_response(status_code: int, body: dict, headers: dict = None):
     """Build a shared HTTP response shape for API Gateway -> Lambda."""
+    response_headers = {
+        "Content-Type": "application/json",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Headers": "Content-Type",
+        "Access-Control-Allow-Methods": "GET,POST,PUT,DELETE,OPTIONS"
+    }
+    if headers:
+        response_headers.update(headers)
     return {
         "statusCode": status_code,
-        "headers": {
-            "Content-Type": "application/json",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "Content-Type",
-            "Access-Control-Allow-Methods": "GET,POST,OPTIONS"
-        },
+        "headers": response_headers,
         "body": json.dumps(_to_serializable(body)),
     }
 
+def _header(event, name: str):
+    """Case-insensitive request header lookup (API Gateway v2 lowercases names)."""
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def compress_response(event, response: dict):
+    """
+    Gzip the response body when the client accepts it and it is big enough.
+    API Gateway needs binary bodies base64-encoded with isBase64Encoded set.
+    """
+    body = response.get("body")
+    if not body or response.get("isBase64Encoded"):
+        return response
+
+    accept = (_header(event, "accept-encoding") or "").lower()
+    if "gzip" not in [part.split(";")[0].strip() for part in accept.split(",")]:
+        return response
+
+    raw = body.encode("utf-8")
+    if len(raw) < GZIP_MIN_BYTES:
+        return response
+
+    compressed = gzip.compress(raw, compresslevel=GZIP_LEVEL)
+    response["body"] = base64.b64encode(compressed).decode("ascii")
+    response["isBase64Encoded"] = True
+    response["headers"] = {
+        **response.get("headers", {}),
+        "Content-Encoding": "gzip",
+        "Vary": "Accept-Encoding",
+    }
+    logger.debug("Compressed response body %s -> %s bytes", len(raw), len(compressed))
+    return response
+
+
+def parse_fields(raw_fields, allowed):
+    """
+    Parse a `fields=a,b,c` query parameter against an allow-list.
+    Returns (fields or None, error message or None).
+    """
+    if not raw_fields:
+        return None, None
+    fields = [f.strip() for f in raw_fields.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        return None, f"unknown fields: {', '.join(unknown)} (allowed: {', '.join(sorted(allowed))})"
+    # keep order, drop duplicates
+    return list(dict.fromkeys(fields)), None
+
+
+def projection_kwargs(fields):
+    """Map a list of attribute names to ProjectionExpression kwargs for a query/scan."""
+    if not fields:
+        return {}
+    names = {f"#p{idx}": field for idx, field in enumerate(fields)}
+    return {
+        "ProjectionExpression": ", ".join(names),
+        "ExpressionAttributeNames": names,
+    }
+
+
 def parse_body(event):
     """Safely parse the JSON body from an API Gateway event."""
     raw_body = event.get("body")
@@ -5,7 +5,7 @@
       import { PieChart } from '@mui/x-charts/PieChart';
 import { useEffect, useState } from "react";
 import { getUserId, getUserTrainerId } from "@/lib/storage";
-import { getTodaySummary, getTodayLogs } from "@/lib/apiClient";
+import { getTodayDashboard } from "@/lib/apiClient";
 import MacroBar from "@/components/MacroBar";
 import FoodSearch from "@/components/FoodSearch";
 import MealTimeline from "@/components/MealTimeline";
@@ -38,11 +38,10 @@ export default function UserDashboard() {
 
     async function loadData() {
       try {
-        const summaryRes = await getTodaySummary(id);
-        const logsRes = await getTodayLogs(id);
+        const dashboard = await getTodayDashboard(id);
 
-        setSummary(summaryRes.summary || null);
-        setLogs(logsRes.items || []);
+        setSummary(dashboard.summary || null);
+        setLogs(dashboard.items || []);
       } finally {
         setLoading(false);
       }
@@ -90,6 +90,24 @@ export async function getTodayLogs(userId: string) {
   return res.json();
 }
 
+/** Logs between two dates (YYYY-MM-DD, inclusive), archived months included. */
+export async function getLogHistory(userId: string, from: string, to: string) {
+  const res = await fetch(
+    `${API_BASE}/diet-logs/history?userId=${encodeURIComponent(userId)}&from=${from}&to=${to}`
+  );
+  if (!res.ok) throw new Error("Failed to get log history");
+  return res.json();
+}
+
+// DASHBOARD ---------------------------------------
+
+/** Today's summary, logs and latest trainer messages in a single request. */
+export async function getTodayDashboard(userId: string) {
+  const res = await fetch(`${API_BASE}/dashboard/today?userId=${userId}`);
+  if (!res.ok) throw new Error("Failed to get today's dashboard");
+  return res.json();
+}
+
 // FOOD SEARCH -------------------------------------
 
 /** Perform a basic foods table search via backend proxy. */
@@ -99,6 +117,15 @@ export async function searchFoods(query: string) {
   return res.json();
 }
 
+/** The user's recent and frequent foods, with the last quantity logged. */
+export async function getRecentFoods(userId: string, limit = 10) {
+  const res = await fetch(
+    `${API_BASE}/foods/recent?userId=${encodeURIComponent(userId)}&limit=${limit}`
+  );
+  if (!res.ok) throw new Error("Failed to get recent foods");
+  return res.json();
+}
+
 // LOG FOOD ----------------------------------------
 
 /** Log a meal along with macros. */
@@ -87,6 +87,17 @@ resource "aws_lambda_function" "health_check" {
   environment {
     variables = {
       TRAINER_NOTIFICATIONS_TOPIC_ARN = aws_sns_topic.trainer_notifications.arn
+      TRAINER_NOTIFICATION_MODE       = var.trainer_notification_mode
+      DIGEST_WINDOW_SECONDS           = var.digest_window_seconds
+      PROFILING_MODE                  = var.profiling_mode
+      PROFILING_SAMPLE_RATE           = var.profiling_sample_rate
+      PROFILING_ALLOW_HEADER          = var.profiling_allow_header
+      DIET_LOG_WRITE_MODE             = var.diet_log_write_mode
+      MESSAGE_PARTITIONING            = var.message_partitioning
+      MESSAGE_LEGACY_FALLBACK         = var.message_legacy_fallback
+      RATE_LIMIT_MODE                 = var.rate_limit_mode
+      RATE_LIMIT_RULES                = var.rate_limit_rules
+      DIET_LOG_RETENTION_DAYS         = var.diet_log_retention_days
     }
   }
 }
@@ -107,10 +118,160 @@ resource "aws_lambda_function" "daily_summary" {
   environment {
     variables = {
       TRAINER_NOTIFICATIONS_TOPIC_ARN = aws_sns_topic.trainer_notifications.arn
+      DAILY_SUMMARY_CHUNK_SIZE        = 100
+      DAILY_SUMMARY_HANDOFF_MS        = 8000
+      MESSAGE_PARTITIONING            = var.message_partitioning
     }
   }
 }
 
+# The daily summary job re-invokes itself to continue past the Lambda timeout
+resource "aws_iam_role_policy" "lambda_daily_summary_self_invoke" {
+  name = "lambda-daily-summary-self-invoke"
+  role = aws_iam_role.lambda_exec_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = ["lambda:InvokeFunction"]
+        Resource = aws_lambda_function.daily_summary.arn
+      }
+    ]
+  })
+}
+
+# --- Trainer Notification Digest Lambda Function-----
+
+resource "aws_lambda_function" "notification_digest" {
+  function_name = "diet_logging_notification_digest"
+  role          = aws_iam_role.lambda_exec_role.arn
+  handler       = "digest_flush.lambda_handler"
+  runtime       = "python3.11"
+
+  filename         = "/Users/gokul/Desktop/Diet_Logging/health_lambda.zip"
+  source_code_hash = filebase64sha256("/Users/gokul/Desktop/Diet_Logging/health_lambda.zip")
+
+  timeout = 30
+
+  environment {
+    variables = {
+      TRAINER_NOTIFICATIONS_TOPIC_ARN = aws_sns_topic.trainer_notifications.arn
+      TRAINER_NOTIFICATION_MODE       = var.trainer_notification_mode
+      DIGEST_WINDOW_SECONDS           = var.digest_window_seconds
+    }
+  }
+}
+
+resource "aws_cloudwatch_event_rule" "notification_digest_rule" {
+  name                = "diet-logging-notification-digest"
+  description         = "Flush buffered trainer notification digests"
+  schedule_expression = "rate(15 minutes)"
+}
+
+resource "aws_cloudwatch_event_target" "notification_digest_target" {
+  rule      = aws_cloudwatch_event_rule.notification_digest_rule.name
+  target_id = "notification-digest-lambda"
+  arn       = aws_lambda_function.notification_digest.arn
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_to_invoke_notification_digest" {
+  statement_id  = "AllowExecutionFromEventBridgeNotificationDigest"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.notification_digest.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.notification_digest_rule.arn
+}
+
+# --- Summary Stream Lambda Function-----
+
+resource "aws_lambda_function" "summary_stream" {
+  function_name = "diet_logging_summary_stream"
+  role          = aws_iam_role.lambda_exec_role.arn
+  handler       = "summary_stream.lambda_handler"
+  runtime       = "python3.11"
+
+  filename         = "/Users/gokul/Desktop/Diet_Logging/health_lambda.zip"
+  source_code_hash = filebase64sha256("/Users/gokul/Desktop/Diet_Logging/health_lambda.zip")
+
+  timeout = 60
+}
+
+# Only wired up in stream mode; otherwise the API updates summaries itself
+resource "aws_lambda_event_source_mapping" "diet_logs_stream" {
+  count = var.diet_log_write_mode == "stream" ? 1 : 0
+
+  event_source_arn                   = aws_dynamodb_table.diet_logs.stream_arn
+  function_name                      = aws_lambda_function.summary_stream.arn
+  starting_position                  = "LATEST"
+  batch_size                         = 100
+  maximum_batching_window_in_seconds = 5
+  bisect_batch_on_function_error     = true
+  maximum_retry_attempts             = 10
+}
+
+# --- DietLogs Compaction Lambda Function-----
+
+resource "aws_lambda_function" "compaction" {
+  function_name = "diet_logging_compaction"
+  role          = aws_iam_role.lambda_exec_role.arn
+  handler       = "compaction.lambda_handler"
+  runtime       = "python3.11"
+
+  filename         = "/Users/gokul/Desktop/Diet_Logging/health_lambda.zip"
+  source_code_hash = filebase64sha256("/Users/gokul/Desktop/Diet_Logging/health_lambda.zip")
+
+  timeout = 300
+
+  environment {
+    variables = {
+      DIET_LOG_RETENTION_DAYS = var.diet_log_retention_days
+      # Rows are tagged before deletion in stream mode
+      DIET_LOG_WRITE_MODE   = var.diet_log_write_mode
+      COMPACTION_HANDOFF_MS = 30000
+    }
+  }
+}
+
+# The compaction job re-invokes itself to continue past the Lambda timeout
+resource "aws_iam_role_policy" "lambda_compaction_self_invoke" {
+  name = "lambda-compaction-self-invoke"
+  role = aws_iam_role.lambda_exec_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = ["lambda:InvokeFunction"]
+        Resource = aws_lambda_function.compaction.arn
+      }
+    ]
+  })
+}
+
+resource "aws_cloudwatch_event_rule" "compaction_rule" {
+  name                = "diet-logging-compaction"
+  description         = "Archive DietLogs months past the retention window"
+  schedule_expression = "cron(0 3 * * ? *)"
+  # Daily at 03:00 UTC; a no-op once the current cutoff month is done
+}
+
+resource "aws_cloudwatch_event_target" "compaction_target" {
+  rule      = aws_cloudwatch_event_rule.compaction_rule.name
+  target_id = "compaction-lambda"
+  arn       = aws_lambda_function.compaction.arn
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_to_invoke_compaction" {
+  statement_id  = "AllowExecutionFromEventBridgeCompaction"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.compaction.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.compaction_rule.arn
+}
+
 # ---- Event Bridge rule + target ------
 
 resource "aws_cloudwatch_event_rule" "daily_summary_rule" {
@@ -144,7 +305,7 @@ resource "aws_apigatewayv2_api" "http_api" {
     allow_origins = [
       "http://localhost:3000"
     ]
-    allow_methods = ["GET", "POST", "OPTIONS"]
+    allow_methods = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
     allow_headers = ["content-type"]
     expose_headers = ["content-type"]
     max_age = 300
@@ -230,6 +391,10 @@ resource "aws_dynamodb_table" "diet_logs" {
     type = "S"
   }
 
+  # Consumed by the summary stream Lambda when diet_log_write_mode = "stream"
+  stream_enabled   = true
+  stream_view_type = "NEW_AND_OLD_IMAGES"
+
   tags = {
     Project = "diet-logging"
     Table   = "diet-logs"
@@ -254,6 +419,14 @@ resource "aws_dynamodb_table" "daily_summaries" {
     type = "S"
   }
 
+  # Lets the nightly job page through one day's summaries instead of scanning
+  global_secondary_index {
+    name            = "date-index"
+    hash_key        = "date"
+    range_key       = "userId"
+    projection_type = "ALL"
+  }
+
   tags = {
     Project = "diet-logging"
     Table   = "daily-summaries"
@@ -347,3 +520,194 @@ resource "aws_dynamodb_table" "messages" {
     Table   = "messages"
   }
 }
+
+# ---- App State (version stamps, job cursors) ----
+
+resource "aws_dynamodb_table" "app_state" {
+  name         = "AppState"
+  billing_mode = "PAY_PER_REQUEST"
+
+  hash_key = "stateKey"
+
+  attribute {
+    name = "stateKey"
+    type = "S"
+  }
+
+  tags = {
+    Project = "diet-logging"
+    Table   = "app-state"
+  }
+}
+
+# ---- Pending trainer notification digests ----
+
+resource "aws_dynamodb_table" "notification_digests" {
+  name         = "NotificationDigests"
+  billing_mode = "PAY_PER_REQUEST"
+
+  hash_key = "trainerId"
+
+  attribute {
+    name = "trainerId"
+    type = "S"
+  }
+
+  tags = {
+    Project = "diet-logging"
+    Table   = "notification-digests"
+  }
+}
+
+resource "aws_dynamodb_table" "saved_meals" {
+  name         = "SavedMeals"
+  billing_mode = "PAY_PER_REQUEST"
+
+  hash_key  = "userId"
+  range_key = "mealId"
+
+  attribute {
+    name = "userId"
+    type = "S"
+  }
+
+  attribute {
+    name = "mealId"
+    type = "S"
+  }
+
+  tags = {
+    Project = "diet-logging"
+    Table   = "saved-meals"
+  }
+}
+
+# Reverse index: which saved meals contain a food
+resource "aws_dynamodb_table" "meal_foods" {
+  name         = "MealFoods"
+  billing_mode = "PAY_PER_REQUEST"
+
+  hash_key  = "foodId"
+  range_key = "mealRef"
+
+  attribute {
+    name = "foodId"
+    type = "S"
+  }
+
+  attribute {
+    name = "mealRef"
+    type = "S"
+  }
+
+  tags = {
+    Project = "diet-logging"
+    Table   = "meal-foods"
+  }
+}
+
+# One row per conversation: last message preview and per-side unread counts
+resource "aws_dynamodb_table" "conversation_index" {
+  name         = "ConversationIndex"
+  billing_mode = "PAY_PER_REQUEST"
+
+  hash_key  = "trainerId"
+  range_key = "conversationId"
+
+  attribute {
+    name = "trainerId"
+    type = "S"
+  }
+
+  attribute {
+    name = "conversationId"
+    type = "S"
+  }
+
+  attribute {
+    name = "lastMessageAt"
+    type = "S"
+  }
+
+  # Trainer inbox sorted by recency in one query
+  global_secondary_index {
+    name            = "trainer-recency-index"
+    hash_key        = "trainerId"
+    range_key       = "lastMessageAt"
+    projection_type = "ALL"
+  }
+
+  tags = {
+    Project = "diet-logging"
+    Table   = "conversation-index"
+  }
+}
+
+# ---- Shared rate limit counters (RATE_LIMIT_MODE = "shared") ----
+
+resource "aws_dynamodb_table" "rate_limits" {
+  name         = "RateLimits"
+  billing_mode = "PAY_PER_REQUEST"
+
+  hash_key = "limitKey"
+
+  attribute {
+    name = "limitKey"
+    type = "S"
+  }
+
+  # One row per route, caller and window; expired windows are deleted for free
+  ttl {
+    attribute_name = "expiresAt"
+    enabled        = true
+  }
+
+  tags = {
+    Project = "diet-logging"
+    Table   = "rate-limits"
+  }
+}
+
+# ---- Per-user recent and frequent foods (one item per user) ----
+
+resource "aws_dynamodb_table" "recent_foods" {
+  name         = "RecentFoods"
+  billing_mode = "PAY_PER_REQUEST"
+
+  hash_key = "userId"
+
+  attribute {
+    name = "userId"
+    type = "S"
+  }
+
+  tags = {
+    Project = "diet-logging"
+    Table   = "recent-foods"
+  }
+}
+
+# ---- Monthly DietLogs archives (written by the compaction job) ----
+
+resource "aws_dynamodb_table" "diet_log_archives" {
+  name         = "DietLogArchives"
+  billing_mode = "PAY_PER_REQUEST"
+
+  hash_key  = "userId"
+  range_key = "month"
+
+  attribute {
+    name = "userId"
+    type = "S"
+  }
+
+  attribute {
+    name = "month"
+    type = "S"
+  }
+
+  tags = {
+    Project = "diet-logging"
+    Table   = "diet-log-archives"
+  }
+}
@@ -3,3 +3,69 @@ variable "aws_region" {
   type        = string
   default     = "us-east-1"
 }
+
+variable "trainer_notification_mode" {
+  description = "How food-log notifications reach trainers: immediate (one per log) or digest"
+  type        = string
+  default     = "immediate"
+}
+
+variable "digest_window_seconds" {
+  description = "How long food-log events are buffered before a trainer digest is sent"
+  type        = number
+  default     = 3600
+}
+
+variable "profiling_mode" {
+  description = "Per-request profiling for the API Lambda: off, cpu, memory or both"
+  type        = string
+  default     = "off"
+}
+
+variable "profiling_sample_rate" {
+  description = "Fraction of API requests profiled when profiling_mode is not off"
+  type        = number
+  default     = 0
+}
+
+variable "profiling_allow_header" {
+  description = "Let requests opt into profiling with the X-Debug-Profile header"
+  type        = bool
+  default     = false
+}
+
+variable "diet_log_write_mode" {
+  description = "How diet logs update daily summaries: separate, transactional or stream (DietLogs stream consumer)"
+  type        = string
+  default     = "separate"
+}
+
+variable "message_partitioning" {
+  description = "Messages partitioning: none (one partition per conversation) or monthly (one per conversation and month; run scripts/migrate_message_buckets.py after switching)"
+  type        = string
+  default     = "none"
+}
+
+variable "message_legacy_fallback" {
+  description = "In monthly partitioning, also read the pre-bucketing partition of each conversation; set to false once scripts/migrate_message_buckets.py has run"
+  type        = string
+  default     = "true"
+}
+
+variable "rate_limit_mode" {
+  description = "API rate limiting: off, local (per-container token buckets) or shared (also counted in the RateLimits table)"
+  type        = string
+  default     = "local"
+}
+
+variable "rate_limit_rules" {
+  description = "JSON overrides for rate limit rules, e.g. {\"GET /foods/search\": {\"rate\": 5, \"burst\": 20, \"shared\": true}}"
+  type        = string
+  default     = ""
+}
+
+variable "diet_log_retention_days" {
+  description = "DietLogs rows are compacted into monthly archives once their whole month is older than this many days"
+  type        = number
+  default     = 90
+}
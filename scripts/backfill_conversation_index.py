@@ -0,0 +1,92 @@
+import boto3
+
+# Same named profile as seed_foods.py
+session = boto3.Session(profile_name="diet-app")
+dynamodb = session.resource("dynamodb")
+
+MESSAGES_TABLE_NAME = "Messages"
+CONVERSATION_INDEX_TABLE_NAME = "ConversationIndex"
+PREVIEW_LENGTH = 120
+# Must match chat.py
+UNREAD_TOTALS_ID = "#totals"
+
+
+def backfill_conversation_index():
+    """
+    One-off: build ConversationIndex rows for conversations that predate it.
+    Unread counters start at zero; existing rows are left untouched.
+    """
+    messages = dynamodb.Table(MESSAGES_TABLE_NAME)
+    index = dynamodb.Table(CONVERSATION_INDEX_TABLE_NAME)
+
+    latest = {}
+    oldest = {}
+    scan_kwargs = {}
+    while True:
+        resp = messages.scan(**scan_kwargs)
+        for item in resp.get("Items", []):
+            # Index rows use user#trainer even when messages are month-bucketed
+            conv_id = f"{item['userId']}#{item['trainerId']}"
+            if conv_id not in latest or item["timestamp"] > latest[conv_id]["timestamp"]:
+                latest[conv_id] = item
+            if conv_id not in oldest or item["timestamp"] < oldest[conv_id]:
+                oldest[conv_id] = item["timestamp"]
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        scan_kwargs["ExclusiveStartKey"] = last_key
+
+    created = 0
+    for conv_id, item in latest.items():
+        try:
+            index.put_item(
+                Item={
+                    "trainerId": item["trainerId"],
+                    "conversationId": conv_id,
+                    "userId": item["userId"],
+                    "lastMessageAt": item["timestamp"],
+                    "lastMessagePreview": str(item.get("message", ""))[:PREVIEW_LENGTH],
+                    "lastSenderRole": item.get("senderRole"),
+                    "firstBucket": oldest[conv_id][:7],
+                    "unreadByTrainer": 0,
+                    "unreadByUser": 0,
+                },
+                ConditionExpression="attribute_not_exists(conversationId)",
+            )
+            created += 1
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            print(f"Skipping {conv_id}: already indexed")
+    print(f"Done. Indexed {created} of {len(latest)} conversations.")
+
+
+def rebuild_unread_totals():
+    """
+    One-off: set each trainer's UNREAD_TOTALS_ID row to the sum of
+    unreadByTrainer over their conversations, for rows indexed before the
+    total was kept. Messages sent during the run can leave it off by a few;
+    run it while traffic is quiet.
+    """
+    index = dynamodb.Table(CONVERSATION_INDEX_TABLE_NAME)
+
+    totals = {}
+    scan_kwargs = {}
+    while True:
+        resp = index.scan(**scan_kwargs)
+        for item in resp.get("Items", []):
+            if item["conversationId"] == UNREAD_TOTALS_ID:
+                totals.setdefault(item["trainerId"], 0)
+                continue
+            totals[item["trainerId"]] = totals.get(item["trainerId"], 0) + int(item.get("unreadByTrainer", 0))
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        scan_kwargs["ExclusiveStartKey"] = last_key
+
+    for trainer_id, unread in totals.items():
+        index.put_item(Item={"trainerId": trainer_id, "conversationId": UNREAD_TOTALS_ID, "unreadByTrainer": unread})
+    print(f"Done. Rebuilt unread totals for {len(totals)} trainers.")
+
+
+if __name__ == "__main__":
+    backfill_conversation_index()
+    rebuild_unread_totals()
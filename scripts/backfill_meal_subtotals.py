@@ -0,0 +1,77 @@
+from collections import defaultdict
+from decimal import Decimal
+
+import boto3
+from botocore.exceptions import ClientError
+
+# Same named profile as seed_foods.py
+session = boto3.Session(profile_name="diet-app")
+dynamodb = session.resource("dynamodb")
+
+DIET_LOGS_TABLE_NAME = "DietLogs"
+DAILY_SUMMARIES_TABLE_NAME = "DailySummaries"
+
+# Must match summaries.py
+MEAL_TYPES = ("breakfast", "lunch", "dinner", "snack")
+OTHER_MEAL = "other"
+MACRO_TOTALS = {
+    "calories": "totalCalories",
+    "protein": "totalProtein",
+    "carbs": "totalCarbs",
+    "fat": "totalFat",
+}
+
+
+def backfill_meal_subtotals():
+    """
+    One-off: write the per-meal subtotals (meal_<meal>_<total>) of summary
+    rows that predate them, recomputed from DietLogs. A row is only written
+    if its entryCount still matches the logs scanned, so a day that received
+    a log during the scan is skipped; run again to pick those up.
+    """
+    logs = dynamodb.Table(DIET_LOGS_TABLE_NAME)
+    summaries = dynamodb.Table(DAILY_SUMMARIES_TABLE_NAME)
+
+    days = defaultdict(lambda: defaultdict(lambda: defaultdict(Decimal)))
+    counts = defaultdict(int)
+    scan_kwargs = {}
+    while True:
+        resp = logs.scan(**scan_kwargs)
+        for item in resp.get("Items", []):
+            key = (item["userId"], item["date"])
+            meal = item.get("mealType") if item.get("mealType") in MEAL_TYPES else OTHER_MEAL
+            acc = days[key][meal]
+            for macro, total in MACRO_TOTALS.items():
+                acc[total] += Decimal(str(item.get(macro, 0)))
+            acc["entryCount"] += 1
+            counts[key] += 1
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        scan_kwargs["ExclusiveStartKey"] = last_key
+
+    updated = 0
+    for (user_id, date), meals in days.items():
+        assignments, values = [], {":n": counts[(user_id, date)]}
+        for meal, subtotal in meals.items():
+            for total, value in subtotal.items():
+                placeholder = f":{meal}_{total}"
+                assignments.append(f"meal_{meal}_{total} = {placeholder}")
+                values[placeholder] = int(value) if total == "entryCount" else value
+        try:
+            summaries.update_item(
+                Key={"userId": user_id, "date": date},
+                UpdateExpression="SET " + ", ".join(assignments),
+                ConditionExpression="entryCount = :n",
+                ExpressionAttributeValues=values,
+            )
+            updated += 1
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            print(f"Skipping {user_id} {date}: summary changed during the scan")
+    print(f"Done. Backfilled {updated} of {len(days)} daily summaries.")
+
+
+if __name__ == "__main__":
+    backfill_meal_subtotals()
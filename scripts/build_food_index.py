@@ -0,0 +1,63 @@
+"""
+Compile the Foods table into the binary search index shipped with the API Lambda.
+
+Run before zipping backend/api_lambda:
+
+    python scripts/build_food_index.py [--profile diet-app] [--output PATH]
+
+The current food-catalog-version stamp from AppState is baked into the
+file; once a food changes the stamp moves on and the Lambda falls back to
+the live table until the index is rebuilt and redeployed.
+"""
+
+import argparse
+import os
+import sys
+
+import boto3
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "api_lambda")
+sys.path.insert(0, LAMBDA_DIR)
+
+from food_index import FOOD_CATALOG_VERSION_KEY, write_index  # noqa: E402
+
+FOODS_TABLE_NAME = "Foods"
+APP_STATE_TABLE_NAME = "AppState"
+
+
+def read_catalog(dynamodb):
+    """Return (catalog version, all Foods items)."""
+    # Read the stamp first: a food edited mid-scan then shows up as stale
+    resp = dynamodb.Table(APP_STATE_TABLE_NAME).get_item(
+        Key={"stateKey": FOOD_CATALOG_VERSION_KEY}, ConsistentRead=True
+    )
+    version = int(resp.get("Item", {}).get("version", 0))
+
+    foods = []
+    scan_kwargs = {"ConsistentRead": True}
+    table = dynamodb.Table(FOODS_TABLE_NAME)
+    while True:
+        resp = table.scan(**scan_kwargs)
+        foods.extend(resp.get("Items", []))
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        scan_kwargs["ExclusiveStartKey"] = last_key
+    return version, foods
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profile", default="diet-app", help="AWS named profile (empty for the default chain)")
+    parser.add_argument("--output", default=os.path.join(LAMBDA_DIR, "food_index.bin"))
+    args = parser.parse_args()
+
+    session = boto3.Session(profile_name=args.profile or None)
+    version, foods = read_catalog(session.resource("dynamodb"))
+    stats = write_index(args.output, foods, version)
+    print(f"Wrote {args.output}: catalog version {version}, {stats['foods']} foods, "
+          f"{stats['tokens']} tokens, {stats['bytes']} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,499 @@
+"""
+Load-replay harness for the API Lambda.
+
+Drives `handler.lambda_handler` with API Gateway HTTP API (v2) events at a
+target rate from a pool of threads, against in-memory DynamoDB/SNS
+stand-ins (see local_dynamo.py), then reports throughput, latency
+percentiles, error rates and data-consistency checks:
+
+  - every DailySummaries row equals the sum of that user's DietLogs for the day
+  - no trainer's currentClientCount exceeds maxClients
+  - currentClientCount matches the number of active assignments
+  - no user has more than one active assignment
+
+Usage:
+    python scripts/load_replay.py --users 50 --trainers 5 --requests 2000 --rate 200 --threads 16
+    python scripts/load_replay.py --record events.jsonl ...   # save the generated stream
+    python scripts/load_replay.py --replay events.jsonl ...   # replay a recorded stream
+
+With --write-mode stream, a pump thread feeds DietLogs stream records to
+summary_stream.lambda_handler in batches during the run (re-delivering a
+fraction of batches to exercise idempotency) and drains the rest before
+the consistency checks.
+
+With --storage sqlite the tables live in a SQLite file (sqlite_store.py)
+instead of the in-memory stand-ins; --latency-ms then has no effect and
+stream mode is unavailable.
+
+Recorded streams are JSON lines, one API Gateway v2 event per line. The
+stand-ins live in this process, so concurrency comes from threads; use
+--latency-ms to model the DynamoDB round trip that opens race windows.
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from local_dynamo import install_stand_ins  # noqa: E402
+
+FOODS = [
+    ("chicken_breast", "Chicken Breast, Cooked", 165, 31, 0, 3.6),
+    ("egg_whole", "Egg, Whole, Cooked", 155, 13, 1.1, 11),
+    ("whole_milk", "Whole Milk", 61, 3.2, 4.8, 3.3),
+    ("greek_yogurt_plain", "Greek Yogurt, Plain", 59, 10, 3.6, 0.4),
+    ("white_rice_cooked", "White Rice, Cooked", 130, 2.7, 28, 0.3),
+    ("brown_rice_cooked", "Brown Rice, Cooked", 123, 2.6, 25.6, 1),
+    ("oatmeal_dry", "Oats, Dry", 389, 16.9, 66.3, 6.9),
+    ("banana", "Banana", 89, 1.1, 22.8, 0.3),
+    ("white_bread", "White Bread", 265, 9, 49, 3.2),
+    ("cheddar_cheese", "Cheddar Cheese", 403, 25, 1.3, 33),
+]
+
+# Relative weights of generated request types
+DEFAULT_MIX = {
+    "log_food": 40,
+    "today_summary": 15,
+    "today_logs": 10,
+    "dashboard": 5,
+    "search": 10,
+    "suggest": 10,
+    "recent_foods": 5,
+    "assign": 5,
+    "unassign": 2,
+    "send_message": 5,
+    "get_messages": 3,
+}
+
+
+class LocalContext:
+    """Minimal Lambda context object with a wall-clock deadline."""
+
+    function_name = "diet-logging-local"
+
+    def __init__(self, timeout_ms):
+        self.aws_request_id = str(uuid.uuid4())
+        self._deadline = time.monotonic() + timeout_ms / 1000.0
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def make_event(method, path, query=None, body=None, source_ip="127.0.0.1"):
+    """Build an API Gateway HTTP API (v2) proxy event."""
+    return {
+        "version": "2.0",
+        "routeKey": "$default",
+        "rawPath": path,
+        "rawQueryString": "&".join(f"{k}={v}" for k, v in (query or {}).items()),
+        "headers": {"content-type": "application/json", "accept-encoding": "gzip"},
+        "queryStringParameters": query,
+        "requestContext": {
+            "http": {"method": method, "path": path, "sourceIp": source_ip},
+            "requestId": str(uuid.uuid4()),
+        },
+        "body": json.dumps(body) if body is not None else None,
+        "isBase64Encoded": False,
+    }
+
+
+def response_json(response):
+    """Decode a Lambda proxy response body, undoing gzip/base64 if applied."""
+    body = response.get("body") or "null"
+    if response.get("isBase64Encoded"):
+        body = gzip.decompress(base64.b64decode(body)).decode("utf-8")
+    return json.loads(body)
+
+
+def invoke(handler, event, timeout_ms):
+    response = handler.lambda_handler(event, LocalContext(timeout_ms))
+    return response.get("statusCode", 500), response
+
+
+SEED_TIMEOUT_MS = 30000
+
+
+def _table(name):
+    """The table handle the Lambda modules use, on whichever backend is installed."""
+    import dynamodb_client
+
+    return dynamodb_client.dynamodb.Table(name)
+
+
+def _all_items(name):
+    table = _table(name)
+    scan_kwargs = {}
+    while True:
+        resp = table.scan(**scan_kwargs)
+        yield from resp.get("Items", [])
+        if not resp.get("LastEvaluatedKey"):
+            return
+        scan_kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def seed(handler, store, args):
+    """Create foods, trainers and users through the public API where possible."""
+    foods_table = _table("Foods")
+    for food_id, name, cal, pro, carbs, fat in FOODS:
+        foods_table.put_item(Item={
+            "foodId": food_id,
+            "name": name,
+            "defaultUnit": "g",
+            "gramsPerUnit": Decimal("100"),
+            "caloriesPerUnit": Decimal(str(cal)),
+            "proteinPerUnit": Decimal(str(pro)),
+            "carbsPerUnit": Decimal(str(carbs)),
+            "fatPerUnit": Decimal(str(fat)),
+        })
+
+    trainer_ids = []
+    for idx in range(args.trainers):
+        status, resp = invoke(handler, make_event("POST", "/users", body={
+            "role": "trainer",
+            "name": f"Trainer {idx}",
+            "email": f"trainer{idx}@example.com",
+            "maxClients": args.max_clients,
+        }), SEED_TIMEOUT_MS)
+        trainer_ids.append(response_json(resp)["trainerId"])
+
+    user_ids = []
+    for idx in range(args.users):
+        status, resp = invoke(handler, make_event("POST", "/users", body={
+            "role": "user",
+            "name": f"User {idx}",
+            "email": f"user{idx}@example.com",
+            "weightLbs": 170,
+            "heightFeet": 5,
+            "heightInches": 10,
+            "gender": "male",
+            "age": 30,
+        }), SEED_TIMEOUT_MS)
+        user_ids.append(response_json(resp)["userId"])
+    return user_ids, trainer_ids
+
+
+def generate_events(user_ids, trainer_ids, count, rng):
+    """Yield a randomized request mix against the seeded users and trainers."""
+    kinds = list(DEFAULT_MIX)
+    weights = [DEFAULT_MIX[k] for k in kinds]
+    meals = ["breakfast", "lunch", "dinner", "snack"]
+    for _ in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        user_id = rng.choice(user_ids)
+        trainer_id = rng.choice(trainer_ids) if trainer_ids else None
+        food_id = rng.choice(FOODS)[0]
+        if kind == "log_food":
+            yield make_event("POST", "/diet-logs", body={
+                "userId": user_id,
+                "foodId": food_id,
+                "quantity": rng.choice([50, 100, 150, 200, 250]),
+                "unit": "g",
+                "mealType": rng.choice(meals),
+            })
+        elif kind == "today_summary":
+            yield make_event("GET", "/summary/today", query={"userId": user_id})
+        elif kind == "today_logs":
+            yield make_event("GET", "/diet-logs/today", query={"userId": user_id})
+        elif kind == "dashboard":
+            yield make_event("GET", "/dashboard/today", query={"userId": user_id})
+        elif kind == "search":
+            yield make_event("GET", "/foods/search", query={"query": food_id[: rng.randint(2, 5)]})
+        elif kind == "suggest":
+            yield make_event("GET", "/foods/suggest", query={"prefix": food_id[: rng.randint(1, 4)]})
+        elif kind == "recent_foods":
+            yield make_event("GET", "/foods/recent", query={"userId": user_id})
+        elif kind == "assign":
+            yield make_event("POST", "/trainer/assign", body={"userId": user_id})
+        elif kind == "unassign":
+            yield make_event("POST", "/trainer/unassign", body={"userId": user_id})
+        elif kind == "send_message" and trainer_id:
+            yield make_event("POST", "/messages", body={
+                "userId": user_id,
+                "trainerId": trainer_id,
+                "senderRole": rng.choice(["user", "trainer"]),
+                "message": "How is it going?",
+            })
+        elif trainer_id:
+            yield make_event("GET", "/messages", query={"userId": user_id, "trainerId": trainer_id})
+
+
+def run(handler, events, args):
+    """Fire events at the target rate; return per-request (route, status, latency_s, lag_s)."""
+    results = []
+    results_lock = threading.Lock()
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+
+    def worker(event, scheduled_at):
+        started = time.perf_counter()
+        route = f"{event['requestContext']['http']['method']} {event['requestContext']['http']['path']}"
+        try:
+            status, _ = invoke(handler, event, args.timeout_ms)
+        except Exception:  # a crash in the handler itself, not a 5xx response
+            status = "exception"
+        finished = time.perf_counter()
+        with results_lock:
+            results.append((route, status, finished - started, started - scheduled_at))
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        for idx, event in enumerate(events):
+            scheduled_at = started_at + idx * interval
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(worker, event, scheduled_at)
+    elapsed = time.perf_counter() - started_at
+    return results, elapsed
+
+
+class StreamPump:
+    """Background stand-in for the DietLogs -> summary_stream event source mapping."""
+
+    def __init__(self, store, batch_size, interval_s, redeliver, rng):
+        import summary_stream
+
+        self.consumer = summary_stream
+        self.store = store
+        self.batch_size = batch_size
+        self.interval_s = interval_s
+        self.redeliver = redeliver
+        self.rng = rng
+        self.batches = 0
+        self.redelivered = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _deliver(self, records):
+        event = {"Records": records}
+        self.consumer.lambda_handler(event, LocalContext(SEED_TIMEOUT_MS))
+        self.batches += 1
+        if self.rng.random() < self.redeliver:
+            # Lambda retries whole batches; the second delivery must be a no-op
+            self.consumer.lambda_handler(event, LocalContext(SEED_TIMEOUT_MS))
+            self.redelivered += 1
+
+    def _loop(self):
+        while not self._stop.is_set():
+            records = self.store.drain_stream("DietLogs", self.batch_size)
+            if records:
+                self._deliver(records)
+            else:
+                self._stop.wait(self.interval_s)
+
+    def finish(self):
+        """Stop polling and deliver everything still pending."""
+        self._stop.set()
+        self._thread.join()
+        while True:
+            records = self.store.drain_stream("DietLogs", self.batch_size)
+            if not records:
+                break
+            self._deliver(records)
+        print(f"stream:         {self.batches} batch(es), {self.redelivered} redelivered")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def consistency_checks():
+    """Return a list of human-readable violations found in the tables."""
+    from summaries import MACRO_TOTALS, MEAL_ATTR_PREFIX, meal_subtotals
+
+    violations = []
+
+    totals = defaultdict(lambda: {"calories": Decimal(0), "protein": Decimal(0), "carbs": Decimal(0),
+                                  "fat": Decimal(0), "count": 0})
+    logs_by_day = defaultdict(list)
+    for log in _all_items("DietLogs"):
+        acc = totals[(log["userId"], log["date"])]
+        acc["calories"] += log.get("calories", 0)
+        acc["protein"] += log.get("protein", 0)
+        acc["carbs"] += log.get("carbs", 0)
+        acc["fat"] += log.get("fat", 0)
+        acc["count"] += 1
+        logs_by_day[(log["userId"], log["date"])].append(log)
+
+    summaries = {(s["userId"], s["date"]): s for s in _all_items("DailySummaries")}
+    for (user_id, date), acc in totals.items():
+        summary = summaries.get((user_id, date))
+        if not summary:
+            violations.append(f"summary missing for user={user_id} date={date} ({acc['count']} logs)")
+            continue
+        expected = {
+            "totalCalories": acc["calories"],
+            "totalProtein": acc["protein"],
+            "totalCarbs": acc["carbs"],
+            "totalFat": acc["fat"],
+            "entryCount": acc["count"],
+        }
+        for meal, subtotal in meal_subtotals(logs_by_day[(user_id, date)]).items():
+            for key, value in subtotal.items():
+                expected[f"{MEAL_ATTR_PREFIX}{meal}_{MACRO_TOTALS.get(key, key)}"] = value
+        for field, value in expected.items():
+            if Decimal(str(summary.get(field, 0))) != Decimal(str(value)):
+                violations.append(
+                    f"summary {field} mismatch for user={user_id} date={date}: "
+                    f"stored={summary.get(field)} expected={value}"
+                )
+
+    active = defaultdict(list)
+    for assignment in _all_items("TrainerAssignments"):
+        if assignment.get("status") == "active":
+            active[assignment["trainerId"]].append(assignment["userId"])
+
+    per_user = Counter(u for users in active.values() for u in users)
+    for user_id, count in per_user.items():
+        if count > 1:
+            violations.append(f"user={user_id} has {count} active trainer assignments")
+
+    for trainer in _all_items("Trainers"):
+        trainer_id = trainer["trainerId"]
+        current = int(trainer.get("currentClientCount", 0))
+        maximum = int(trainer.get("maxClients", 0))
+        if current > maximum:
+            violations.append(f"trainer={trainer_id} currentClientCount={current} exceeds maxClients={maximum}")
+        if current != len(active[trainer_id]):
+            violations.append(
+                f"trainer={trainer_id} currentClientCount={current} but {len(active[trainer_id])} active assignments"
+            )
+    return violations
+
+
+def report(results, elapsed, store, sns):
+    total = len(results)
+    latencies = sorted(r[2] for r in results)
+    lags = sorted(r[3] for r in results)
+    statuses = Counter(r[1] for r in results)
+    errors = sum(n for s, n in statuses.items() if s == "exception" or s >= 500)
+
+    print(f"requests:    {total} in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.1f} req/s)")
+    print("latency ms:  p50={:.1f} p90={:.1f} p99={:.1f} max={:.1f}".format(
+        *(percentile(latencies, p) * 1000 for p in (50, 90, 99, 100))))
+    print("queue lag ms: p50={:.1f} p99={:.1f}".format(*(percentile(lags, p) * 1000 for p in (50, 99))))
+    print(f"errors:      {errors} ({(errors / total * 100) if total else 0:.2f}%)")
+    print("statuses:    " + ", ".join(f"{s}={n}" for s, n in sorted(statuses.items(), key=str)))
+
+    print("per route:")
+    by_route = defaultdict(list)
+    for route, status, latency, _ in results:
+        by_route[route].append(latency)
+    for route, values in sorted(by_route.items()):
+        values.sort()
+        print(f"  {route:28s} n={len(values):6d} p50={percentile(values, 50) * 1000:7.1f}ms "
+              f"p99={percentile(values, 99) * 1000:7.1f}ms mean={statistics.mean(values) * 1000:7.1f}ms")
+
+    print("dynamodb calls: " + ", ".join(f"{op}={n}" for op, n in sorted(store.call_counts.items())))
+    print(f"sns publishes:  {len(sns.published)}")
+
+    import metrics
+    counters = metrics.snapshot()
+    if counters:
+        print("metrics:        " + ", ".join(f"{k}={v}" for k, v in sorted(counters.items())))
+
+    violations = consistency_checks()
+    print(f"consistency:    {len(violations)} violation(s)")
+    for line in violations[:20]:
+        print("  - " + line)
+    if len(violations) > 20:
+        print(f"  ... {len(violations) - 20} more")
+    return violations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--trainers", type=int, default=5)
+    parser.add_argument("--max-clients", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=200.0, help="target requests per second (0 = unthrottled)")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="simulated DynamoDB/SNS round trip")
+    parser.add_argument("--jitter-ms", type=float, default=2.0)
+    parser.add_argument("--timeout-ms", type=int, default=5000, help="simulated Lambda timeout per request")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--record", help="write the generated event stream to this JSONL file")
+    parser.add_argument("--replay", help="replay API Gateway v2 events from this JSONL file")
+    parser.add_argument("--write-mode", choices=["separate", "transactional", "stream"], default=None,
+                        help="DIET_LOG_WRITE_MODE for POST /diet-logs")
+    parser.add_argument("--stream-batch-size", type=int, default=100,
+                        help="records per summary_stream invocation in stream mode")
+    parser.add_argument("--stream-redeliver", type=float, default=0.1,
+                        help="fraction of stream batches delivered twice in stream mode")
+    parser.add_argument("--notification-mode", choices=["immediate", "digest"], default=None,
+                        help="TRAINER_NOTIFICATION_MODE; digests are flushed once after the run")
+    parser.add_argument("--storage", choices=["memory", "sqlite"], default="memory",
+                        help="in-memory stand-ins or the SQLite backend (STORAGE_BACKEND=sqlite)")
+    parser.add_argument("--sqlite-path", help="SQLite file for --storage sqlite (default: a fresh temp file)")
+    parser.add_argument("--log-level", default="ERROR", help="log level for the Lambda modules")
+    args = parser.parse_args(argv)
+
+    if args.write_mode:
+        os.environ["DIET_LOG_WRITE_MODE"] = args.write_mode
+    if args.notification_mode:
+        os.environ["TRAINER_NOTIFICATION_MODE"] = args.notification_mode
+    if args.storage == "sqlite":
+        if args.write_mode == "stream":
+            parser.error("--write-mode stream needs the in-memory stand-ins")
+        os.environ["STORAGE_BACKEND"] = "sqlite"
+        os.environ["SQLITE_PATH"] = args.sqlite_path or os.path.join(tempfile.mkdtemp(), "load_replay.sqlite3")
+
+    store, sns = install_stand_ins(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    import handler
+
+    # The Lambda modules raise the root logger to INFO on import
+    logging.basicConfig()
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    user_ids, trainer_ids = seed(handler, store, args)
+
+    if args.replay:
+        with open(args.replay) as fh:
+            events = [json.loads(line) for line in fh if line.strip()]
+    else:
+        rng = random.Random(args.seed)
+        events = list(generate_events(user_ids, trainer_ids, args.requests, rng))
+        if args.record:
+            with open(args.record, "w") as fh:
+                for event in events:
+                    fh.write(json.dumps(event) + "\n")
+
+    store.call_counts.clear()
+    sns.published.clear()
+    pump = None
+    if args.write_mode == "stream":
+        pump = StreamPump(store, args.stream_batch_size, 0.05, args.stream_redeliver, random.Random(args.seed))
+        pump.start()
+    results, elapsed = run(handler, events, args)
+    if pump:
+        pump.finish()
+    if args.notification_mode == "digest":
+        import digest_flush
+        digest_flush.lambda_handler({"force": True}, None)
+    violations = report(results, elapsed, store, sns)
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
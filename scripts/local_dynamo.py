@@ -0,0 +1,449 @@
+"""
+In-memory DynamoDB / SNS stand-ins for running the API Lambda locally.
+
+The stand-ins speak the same boto3 resource interface the domain modules use
+(Table.get_item/put_item/update_item/delete_item/query/scan/batch_writer,
+resource.batch_get_item and client.transact_write_items), including
+condition, update and projection expressions, so handler code runs unchanged.
+
+    from local_dynamo import install_stand_ins
+    store = install_stand_ins(latency_ms=5)
+    import handler  # already patched
+
+An optional per-call latency widens the window between a read and the
+following write, which is what exposes lost updates under concurrency.
+
+Tables marked "stream" in TABLE_SCHEMAS record every change as a DynamoDB
+Streams record (NEW_AND_OLD_IMAGES); `store.drain_stream(name)` hands them
+out in order, shaped like the Records of a Lambda stream event.
+"""
+
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+LAMBDA_DIR = Path(__file__).resolve().parent.parent / "backend" / "api_lambda"
+if str(LAMBDA_DIR) not in sys.path:
+    sys.path.insert(0, str(LAMBDA_DIR))
+
+from expressions import (  # noqa: E402
+    apply_update,
+    client_error,
+    copy_item,
+    copy_value,
+    evaluate_condition,
+    normalize,
+    project,
+)
+from table_schemas import TABLE_SCHEMAS  # noqa: E402
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+# ---------------------------------------------------------------------------
+# Tables, resource, client, SNS
+# ---------------------------------------------------------------------------
+
+
+class StandInStore:
+    """Shared state for every stand-in table; one lock keeps writes atomic."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0):
+        self.lock = threading.RLock()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tables = {}
+        self.call_counts = {}
+        self.streams = {}
+        self._sequence = 0
+
+    def table(self, name):
+        with self.lock:
+            if name not in self.tables:
+                schema = TABLE_SCHEMAS.get(name, {"hash": "pk"})
+                self.tables[name] = StandInTable(self, name, schema)
+            return self.tables[name]
+
+    def record_change(self, table, old, new):
+        """Append a stream record for a write to `table` (caller holds the lock)."""
+        if not table.stream or (old is None and new is None):
+            return
+        self._sequence += 1
+        change = {
+            "Keys": {k: _serializer.serialize(v) for k, v in table._key_dict(new or old).items()},
+            "SequenceNumber": str(10 ** 20 + self._sequence),
+            "StreamViewType": "NEW_AND_OLD_IMAGES",
+        }
+        if new is not None:
+            change["NewImage"] = {k: _serializer.serialize(v) for k, v in new.items()}
+        if old is not None:
+            change["OldImage"] = {k: _serializer.serialize(v) for k, v in old.items()}
+        self.streams.setdefault(table.name, []).append({
+            "eventID": str(self._sequence),
+            "eventName": "INSERT" if old is None else "REMOVE" if new is None else "MODIFY",
+            "eventSource": "aws:dynamodb",
+            "dynamodb": change,
+        })
+
+    def drain_stream(self, name, limit=None):
+        """Remove and return up to `limit` pending stream records for a table, oldest first."""
+        with self.lock:
+            pending = self.streams.get(name, [])
+            batch = pending[:limit] if limit else list(pending)
+            del pending[:len(batch)]
+            return batch
+
+    def network_delay(self, operation):
+        # The real clients are instrumented with the request deadline; keep that behaviour
+        deadlines = sys.modules.get("deadlines")
+        if deadlines is not None:
+            deadlines.check(operation)
+        with self.lock:
+            self.call_counts[operation] = self.call_counts.get(operation, 0) + 1
+        if self.latency_ms or self.jitter_ms:
+            time.sleep((self.latency_ms + random.random() * self.jitter_ms) / 1000.0)
+
+    def call_succeeded(self, operation):
+        # Mirrors the real clients' after-call hook: a completed write commits the request
+        deadlines = sys.modules.get("deadlines")
+        if deadlines is not None:
+            deadlines.record_success(operation)
+
+
+class _BatchWriter:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def put_item(self, Item):
+        self.table.put_item(Item=Item)
+
+    def delete_item(self, Key):
+        self.table.delete_item(Key=Key)
+
+
+class _Meta:
+    def __init__(self, client):
+        self.client = client
+
+
+class StandInTable:
+    """Subset of boto3's Table resource backed by a dict."""
+
+    def __init__(self, store, name, schema):
+        self.store = store
+        self.name = self.table_name = name
+        self.hash_key = schema["hash"]
+        self.range_key = schema.get("range")
+        self.indexes = schema.get("indexes", {})
+        self.stream = schema.get("stream", False)
+        self.items = {}
+        self.meta = _Meta(StandInClient(store))
+
+    # -- helpers ------------------------------------------------------------
+
+    def key_of(self, item):
+        key = (item[self.hash_key],)
+        if self.range_key:
+            key += (item[self.range_key],)
+        return key
+
+    def _key_dict(self, item, hash_key=None, range_key=None):
+        keys = [self.hash_key, self.range_key, hash_key, range_key]
+        return {k: item[k] for k in keys if k and k in item}
+
+    def _check(self, condition, current, names, values, operation):
+        if condition is not None and not evaluate_condition(condition, current or {}, names, values):
+            raise client_error("ConditionalCheckFailedException", "The conditional request failed", operation)
+
+    # -- item operations ----------------------------------------------------
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, ConsistentRead=False):
+        self.store.network_delay("GetItem")
+        with self.store.lock:
+            item = self.items.get(self.key_of(Key))
+            if item is None:
+                return {}
+            return {"Item": project(copy_item(item), ProjectionExpression, ExpressionAttributeNames)}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnValues="NONE"):
+        self.store.network_delay("PutItem")
+        new_item = copy_item(Item)
+        with self.store.lock:
+            key = self.key_of(new_item)
+            old = self.items.get(key)
+            self._check(ConditionExpression, old, ExpressionAttributeNames, ExpressionAttributeValues, "PutItem")
+            self.items[key] = new_item
+            self.store.record_change(self, old, new_item)
+        self.store.call_succeeded("PutItem")
+        if ReturnValues == "ALL_OLD" and old:
+            return {"Attributes": copy_item(old)}
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues="NONE"):
+        self.store.network_delay("UpdateItem")
+        with self.store.lock:
+            key = self.key_of(Key)
+            old = self.items.get(key)
+            self._check(ConditionExpression, old, ExpressionAttributeNames, ExpressionAttributeValues, "UpdateItem")
+            item = copy_item(old) if old else copy_item(Key)
+            touched = apply_update(item, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+            self.items[key] = item
+            self.store.record_change(self, old, item)
+        self.store.call_succeeded("UpdateItem")
+        if ReturnValues == "ALL_NEW":
+            return {"Attributes": copy_item(item)}
+        if ReturnValues == "UPDATED_NEW":
+            return {"Attributes": {k: copy_value(item[k]) for k in touched if k in item}}
+        if ReturnValues == "ALL_OLD" and old:
+            return {"Attributes": copy_item(old)}
+        if ReturnValues == "UPDATED_OLD" and old:
+            return {"Attributes": {k: copy_value(old[k]) for k in touched if k in old}}
+        return {}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues="NONE"):
+        self.store.network_delay("DeleteItem")
+        with self.store.lock:
+            key = self.key_of(Key)
+            old = self.items.get(key)
+            self._check(ConditionExpression, old, ExpressionAttributeNames, ExpressionAttributeValues, "DeleteItem")
+            self.items.pop(key, None)
+            self.store.record_change(self, old, None)
+        self.store.call_succeeded("DeleteItem")
+        if ReturnValues == "ALL_OLD" and old:
+            return {"Attributes": copy_item(old)}
+        return {}
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _BatchWriter(self)
+
+    # -- reads --------------------------------------------------------------
+
+    def _page(self, candidates, hash_key, range_key, Limit, ExclusiveStartKey, FilterExpression,
+              ProjectionExpression, ExpressionAttributeNames, ExpressionAttributeValues, Select=None):
+        start = 0
+        if ExclusiveStartKey:
+            marker = self._key_dict(ExclusiveStartKey, hash_key, range_key)
+            for idx, item in enumerate(candidates):
+                if self._key_dict(item, hash_key, range_key) == marker:
+                    start = idx + 1
+                    break
+        window = candidates[start:]
+        last_key = None
+        if Limit is not None and len(window) > Limit:
+            window = window[:Limit]
+            last_key = self._key_dict(window[-1], hash_key, range_key)
+        out = []
+        for item in window:
+            if FilterExpression is not None and not evaluate_condition(
+                FilterExpression, item, ExpressionAttributeNames, ExpressionAttributeValues
+            ):
+                continue
+            out.append(project(copy_item(item), ProjectionExpression, ExpressionAttributeNames))
+        resp = {"Count": len(out), "ScannedCount": len(window)}
+        if Select != "COUNT":
+            resp["Items"] = out
+        if last_key:
+            resp["LastEvaluatedKey"] = copy_item(last_key)
+        return resp
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None, ProjectionExpression=None,
+              ExpressionAttributeNames=None, ExpressionAttributeValues=None, Limit=None,
+              ScanIndexForward=True, ExclusiveStartKey=None, ConsistentRead=False, Select=None):
+        self.store.network_delay("Query")
+        hash_key, range_key = self.hash_key, self.range_key
+        if IndexName:
+            index = self.indexes[IndexName]
+            hash_key, range_key = index["hash"], index.get("range")
+        key_expr, names, values = normalize(
+            KeyConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues, is_key_condition=True
+        )
+        with self.store.lock:
+            candidates = [
+                it for it in self.items.values()
+                if hash_key in it and (not range_key or range_key in it)
+                and evaluate_condition(key_expr, it, names, values)
+            ]
+            if range_key:
+                candidates.sort(key=lambda it: it[range_key], reverse=not ScanIndexForward)
+            return self._page(candidates, hash_key, range_key, Limit, ExclusiveStartKey, FilterExpression,
+                              ProjectionExpression, names, values, Select)
+
+    def scan(self, FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+             ExpressionAttributeValues=None, Limit=None, ExclusiveStartKey=None, IndexName=None,
+             ConsistentRead=False, Select=None):
+        self.store.network_delay("Scan")
+        hash_key, range_key = self.hash_key, self.range_key
+        if IndexName:
+            index = self.indexes[IndexName]
+            hash_key, range_key = index["hash"], index.get("range")
+        with self.store.lock:
+            candidates = [it for it in self.items.values() if hash_key in it]
+            return self._page(candidates, hash_key, range_key, Limit, ExclusiveStartKey, FilterExpression,
+                              ProjectionExpression, ExpressionAttributeNames, ExpressionAttributeValues, Select)
+
+
+class StandInClient:
+    """Low-level client calls used by the domain modules (typed attribute values)."""
+
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def _plain(attrs):
+        return {k: _deserializer.deserialize(v) for k, v in (attrs or {}).items()}
+
+    def transact_write_items(self, TransactItems, ClientRequestToken=None):
+        self.store.network_delay("TransactWriteItems")
+        with self.store.lock:
+            staged = []
+            reasons = []
+            failed = False
+            for entry in TransactItems:
+                (action, spec), = entry.items()
+                table = self.store.table(spec["TableName"])
+                names = spec.get("ExpressionAttributeNames")
+                values = self._plain(spec.get("ExpressionAttributeValues"))
+                if action == "Put":
+                    new_item = self._plain(spec["Item"])
+                    key = table.key_of(new_item)
+                else:
+                    new_item = None
+                    key = table.key_of(self._plain(spec["Key"]))
+                current = table.items.get(key)
+                condition = spec.get("ConditionExpression")
+                if condition and not evaluate_condition(condition, current or {}, names, values):
+                    reasons.append({"Code": "ConditionalCheckFailed"})
+                    failed = True
+                    continue
+                reasons.append({"Code": "None"})
+                if action == "Update":
+                    new_item = copy_item(current) if current else self._plain(spec["Key"])
+                    apply_update(new_item, spec["UpdateExpression"], names, values)
+                staged.append((table, key, action, new_item))
+            if failed:
+                err = client_error("TransactionCanceledException", "Transaction cancelled", "TransactWriteItems")
+                err.response["CancellationReasons"] = reasons
+                raise err
+            for table, key, action, new_item in staged:
+                old = table.items.get(key)
+                if action == "Delete":
+                    table.items.pop(key, None)
+                    self.store.record_change(table, old, None)
+                elif action in ("Put", "Update"):
+                    table.items[key] = new_item
+                    self.store.record_change(table, old, new_item)
+        self.store.call_succeeded("TransactWriteItems")
+        return {}
+
+
+class StandInResource:
+    """Subset of boto3's DynamoDB service resource."""
+
+    def __init__(self, store):
+        self.store = store
+        self.meta = _Meta(StandInClient(store))
+
+    def Table(self, name):
+        return self.store.table(name)
+
+    def batch_get_item(self, RequestItems):
+        self.store.network_delay("BatchGetItem")
+        responses = {}
+        for name, spec in RequestItems.items():
+            table = self.store.table(name)
+            found = []
+            with self.store.lock:
+                for key in spec["Keys"]:
+                    item = table.items.get(table.key_of(key))
+                    if item is not None:
+                        found.append(project(copy_item(item), spec.get("ProjectionExpression"),
+                                             spec.get("ExpressionAttributeNames")))
+            responses[name] = found
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+
+class StandInSNS:
+    """Records published messages instead of sending them."""
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self.published = []
+        self.subscriptions = []
+
+    def publish(self, TopicArn, Message, Subject=None, **kwargs):
+        self.store.network_delay("Publish")
+        with self.lock:
+            self.published.append({"TopicArn": TopicArn, "Subject": Subject, "Message": Message})
+            message_id = str(len(self.published))
+        self.store.call_succeeded("Publish")
+        return {"MessageId": message_id}
+
+    def subscribe(self, TopicArn, Protocol, Endpoint, **kwargs):
+        with self.lock:
+            self.subscriptions.append({"TopicArn": TopicArn, "Protocol": Protocol, "Endpoint": Endpoint})
+        return {"SubscriptionArn": "pending confirmation"}
+
+
+def install_stand_ins(latency_ms=0.0, jitter_ms=0.0):
+    """
+    Import every Lambda module and swap every DynamoDB table, resource and SNS
+    client handle for an in-memory stand-in. Returns (store, sns).
+    With STORAGE_BACKEND=sqlite the tables stay on SQLite and only SNS is
+    replaced.
+    """
+    import os
+
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("TRAINER_NOTIFICATIONS_TOPIC_ARN", "arn:aws:sns:local:000000000000:trainer-notifications")
+    if str(LAMBDA_DIR) not in sys.path:
+        sys.path.insert(0, str(LAMBDA_DIR))
+
+    import importlib
+
+    import dynamodb_client
+
+    # Import every Lambda module (API and scheduled handlers) so all get patched
+    for source in sorted(LAMBDA_DIR.glob("*.py")):
+        importlib.import_module(source.stem)
+
+    store = StandInStore(latency_ms=latency_ms, jitter_ms=jitter_ms)
+    sns = StandInSNS(store)
+    resource = StandInResource(store)
+
+    replacements = {}
+    if dynamodb_client.STORAGE_BACKEND != "sqlite":
+        replacements[id(dynamodb_client.dynamodb)] = resource
+        for attr, value in vars(dynamodb_client).items():
+            if attr.endswith("_TABLE_NAME"):
+                table_attr = attr[: -len("_NAME")].lower()
+                original = getattr(dynamodb_client, table_attr, None)
+                if original is not None:
+                    replacements[id(original)] = store.table(value)
+        original_client = dynamodb_client.dynamodb.meta.client
+        replacements[id(original_client)] = resource.meta.client
+
+    for module in list(sys.modules.values()):
+        module_file = getattr(module, "__file__", None)
+        if not module_file or Path(module_file).resolve().parent != LAMBDA_DIR:
+            continue
+        for attr, value in list(vars(module).items()):
+            if id(value) in replacements:
+                setattr(module, attr, replacements[id(value)])
+            elif attr == "sns" and hasattr(value, "publish"):
+                setattr(module, attr, sns)
+    return store, sns
@@ -0,0 +1,89 @@
+import argparse
+import re
+
+import boto3
+from botocore.exceptions import ClientError
+
+# Same named profile as seed_foods.py
+session = boto3.Session(profile_name="diet-app")
+dynamodb = session.resource("dynamodb")
+
+MESSAGES_TABLE_NAME = "Messages"
+CONVERSATION_INDEX_TABLE_NAME = "ConversationIndex"
+# Bucketed conversation ids end in #YYYY-MM
+BUCKETED_RE = re.compile(r"#\d{4}-\d{2}$")
+
+
+def migrate_message_buckets(dry_run: bool = False):
+    """
+    One-off, after switching MESSAGE_PARTITIONING to "monthly": move every
+    message from its user#trainer partition to user#trainer#YYYY-MM, and
+    record each conversation's oldest bucket in ConversationIndex.
+
+    Cut-over order:
+      1. Deploy with MESSAGE_PARTITIONING=monthly. New messages go to month
+         buckets; reads still see the legacy partition through the fallback
+         (MESSAGE_LEGACY_FALLBACK), so no history disappears.
+      2. Run this script. Everything still in a legacy partition is moved,
+         including messages written before the deploy finished.
+      3. Optionally set MESSAGE_LEGACY_FALLBACK=false to drop the extra query.
+    Do not run it while the API is still in "none" mode: those reads only
+    look at the legacy partition and would lose the moved history.
+
+    firstBucket is lowered before a message is moved and each message is
+    copied before its original is deleted, so an interrupted run can simply
+    be started again; already-bucketed messages are skipped.
+    """
+    messages = dynamodb.Table(MESSAGES_TABLE_NAME)
+    index = dynamodb.Table(CONVERSATION_INDEX_TABLE_NAME)
+
+    # (trainerId, user#trainer) -> oldest bucket recorded by this run
+    first_buckets = {}
+    moved = 0
+    scan_kwargs = {}
+    while True:
+        resp = messages.scan(**scan_kwargs)
+        for item in resp.get("Items", []):
+            conv_id = item["conversationId"]
+            if BUCKETED_RE.search(conv_id):
+                continue
+            bucket = item["timestamp"][:7]
+            key = (item["trainerId"], conv_id)
+            if key not in first_buckets or bucket < first_buckets[key]:
+                first_buckets[key] = bucket
+                if not dry_run:
+                    # Before the move, so a run interrupted after it still reads back this far
+                    _lower_first_bucket(index, item["trainerId"], conv_id, bucket)
+            if not dry_run:
+                messages.put_item(Item={**item, "conversationId": f"{conv_id}#{bucket}"})
+                messages.delete_item(Key={"conversationId": conv_id, "timestamp": item["timestamp"]})
+            moved += 1
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            break
+        scan_kwargs["ExclusiveStartKey"] = last_key
+
+    action = "Would move" if dry_run else "Moved"
+    print(f"Done. {action} {moved} messages across {len(first_buckets)} conversations.")
+
+
+def _lower_first_bucket(index, trainer_id: str, conv_id: str, bucket: str):
+    """Move the conversation's firstBucket back to `bucket` if it starts later."""
+    try:
+        index.update_item(
+            Key={"trainerId": trainer_id, "conversationId": conv_id},
+            UpdateExpression="SET firstBucket = :b",
+            ConditionExpression="attribute_not_exists(firstBucket) OR firstBucket > :b",
+            ExpressionAttributeValues={":b": bucket},
+        )
+    except ClientError as exc:
+        # Already starts at or before this bucket
+        if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move Messages into monthly conversation buckets")
+    parser.add_argument("--dry-run", action="store_true", help="report what would move without writing")
+    args = parser.parse_args()
+    migrate_message_buckets(dry_run=args.dry_run)
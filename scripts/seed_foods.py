@@ -222,6 +222,13 @@ def seed_foods():
         for k in NUM_FIELDS:
             item[k] = Decimal(str(item[k]))
         table.put_item(Item=item)
+    # Any packaged food index built before this no longer matches the table
+    dynamodb.Table("AppState").update_item(
+        Key={"stateKey": "food-catalog-version"},
+        UpdateExpression="ADD #v :one",
+        ExpressionAttributeNames={"#v": "version"},
+        ExpressionAttributeValues={":one": 1},
+    )
     print("Done seeding Foods table.")
 
 if __name__ == "__main__":